@@ -9,6 +9,23 @@
 # specific language governing permissions and limitations under the License.
 #
 
+from ._audio import *
+from ._compressed_metadata import *
+from ._corpus import *
+from ._dedup import *
+from ._engine_registry import *
 from ._factory import *
+from ._fork_server import *
 from ._octopus import *
+from ._pipeline import *
+from ._pool import *
+from ._query import *
+from ._residency import *
+from ._results import *
+from ._scheduler import *
+from ._shared_memory import *
+from ._standing_queries import *
+from ._tailing import *
+from ._tiered_store import *
+from ._trace import *
 from ._util import *
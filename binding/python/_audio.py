@@ -0,0 +1,127 @@
+#
+# Copyright 2023 Picovoice Inc.
+#
+# You may not use this file except in compliance with the license. A copy of the license is located in the "LICENSE"
+# file accompanying this source.
+#
+# Unless required by applicable law or agreed to in writing, software distributed under the License is distributed on
+# an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the License for the
+# specific language governing permissions and limitations under the License.
+#
+
+import io
+import math
+import os
+import sys
+import wave
+from array import array
+from typing import Any, List, Sequence, Union
+
+from ._octopus import OctopusInvalidArgumentError, OctopusIOError
+
+
+def _open_wav(path: str) -> wave.Wave_read:
+    if not os.path.exists(path):
+        raise OctopusIOError("Couldn't find input file at `%s`." % path)
+    try:
+        f = wave.open(path, 'rb')
+    except (wave.Error, EOFError) as e:
+        raise OctopusIOError("Couldn't read WAV file at `%s`: %s" % (path, e))
+    if f.getsampwidth() != 2:
+        f.close()
+        raise OctopusInvalidArgumentError("Audio file should be 16-bit")
+    return f
+
+
+def _to_clip(frames: bytes, params: Any, as_wav: bool) -> Union[array, bytes]:
+    if as_wav:
+        wav_bytes = io.BytesIO()
+        with wave.open(wav_bytes, 'wb') as f:
+            f.setnchannels(params.nchannels)
+            f.setsampwidth(params.sampwidth)
+            f.setframerate(params.framerate)
+            f.writeframes(frames)
+        return wav_bytes.getvalue()
+
+    pcm = array('h')
+    pcm.frombytes(frames)
+    if sys.byteorder != 'little':
+        pcm.byteswap()
+    return pcm
+
+
+def extract_clips(
+        path: str,
+        matches: Sequence[Any],
+        pad_sec: float = 0.5,
+        as_wav: bool = False,
+        max_gap_sec: float = 1.0) -> List[Union[array, bytes]]:
+    """
+    Reads the audio of several matches from a 16-bit WAV file without decoding the rest of it. Clips are read in order
+    of their position in the file, and clips that overlap or are at most `max_gap_sec` apart are served by a single
+    read.
+
+    :param path: Absolute path to the WAV file that was indexed.
+    :param matches: Objects with `start_sec` and `end_sec` (e.g. `Octopus.Match`).
+    :param pad_sec: Audio to include before and after each match in seconds.
+    :param as_wav: Return each clip as the bytes of a WAV file instead of 16-bit samples.
+    :param max_gap_sec: Largest gap between two clips that is read through rather than skipped.
+    :return: Clips in the order of `matches`. Samples are returned as `array('h')`, interleaved if the file has several
+    channels.
+    """
+
+    if pad_sec < 0 or max_gap_sec < 0:
+        raise OctopusInvalidArgumentError("`pad_sec` and `max_gap_sec` cannot be negative.")
+
+    with _open_wav(path) as f:
+        params = f.getparams()
+        frame_size = params.nchannels * params.sampwidth
+
+        spans = list()
+        for i, match in enumerate(matches):
+            start = max(0, math.floor((match.start_sec - pad_sec) * params.framerate))
+            end = min(params.nframes, math.ceil((match.end_sec + pad_sec) * params.framerate))
+            spans.append((start, max(start, end), i))
+        spans.sort()
+
+        max_gap = math.ceil(max_gap_sec * params.framerate)
+        clips = [None] * len(spans)
+        position = 0
+        while position < len(spans):
+            group_start, group_end, _ = spans[position]
+            group = position
+            while group < len(spans) and spans[group][0] <= group_end + max_gap:
+                group_end = max(group_end, spans[group][1])
+                group += 1
+
+            if group_end > group_start:
+                f.setpos(min(group_start, params.nframes - 1))
+                frames = f.readframes(group_end - group_start)
+            else:
+                frames = b''
+            for start, end, i in spans[position:group]:
+                clip_frames = frames[(start - group_start) * frame_size:(end - group_start) * frame_size]
+                clips[i] = _to_clip(clip_frames, params, as_wav)
+            position = group
+
+    return clips
+
+
+def extract_clip(path: str, match: Any, pad_sec: float = 0.5, as_wav: bool = False) -> Union[array, bytes]:
+    """
+    Reads the audio of a match from a 16-bit WAV file without decoding the rest of it.
+
+    :param path: Absolute path to the WAV file that was indexed.
+    :param match: An object with `start_sec` and `end_sec` (e.g. `Octopus.Match`).
+    :param pad_sec: Audio to include before and after the match in seconds.
+    :param as_wav: Return the clip as the bytes of a WAV file instead of 16-bit samples.
+    :return: Samples as `array('h')`, interleaved if the file has several channels, or WAV file bytes.
+    """
+
+    return extract_clips(path, [match], pad_sec=pad_sec, as_wav=as_wav)[0]
+
+
+__all__ = [
+    'extract_clip',
+    'extract_clips',
+]
@@ -0,0 +1,235 @@
+#
+# Copyright 2023 Picovoice Inc.
+#
+# You may not use this file except in compliance with the license. A copy of the license is located in the "LICENSE"
+# file accompanying this source.
+#
+# Unless required by applicable law or agreed to in writing, software distributed under the License is distributed on
+# an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the License for the
+# specific language governing permissions and limitations under the License.
+#
+
+import bz2
+import lzma
+import struct
+import zlib
+from typing import Optional, Sequence
+
+from ._octopus import OctopusInvalidArgumentError, OctopusIOError, OctopusMetadata
+
+COMPRESSED_METADATA_FILE_EXTENSION = '.oifz'
+
+_MAGIC = b'PVOZ'
+_VERSION = 1
+# magic, version, codec, level, block size, uncompressed size, number of blocks
+_HEADER_STRUCT = struct.Struct('<4sBBBxIQI')
+# compressed size, CRC-32 of the uncompressed block
+_BLOCK_STRUCT = struct.Struct('<II')
+
+_CODECS = {
+    'zlib': (1, range(0, 10), lambda data, level: zlib.compress(data, level), zlib.decompress),
+    'bz2': (2, range(1, 10), lambda data, level: bz2.compress(data, level), bz2.decompress),
+    'lzma': (3, range(0, 10), lambda data, level: lzma.compress(data, preset=level), lzma.decompress),
+}
+
+_CODEC_NAMES = {x[0]: name for name, x in _CODECS.items()}
+
+COMPRESSION_CODECS = tuple(_CODECS.keys())
+
+
+class OctopusCompressedMetadata(object):
+    """
+    Metadata compressed with a standard library codec for storage. The metadata is split into blocks that are compressed
+    independently, so a damaged block is detected on its own and decompression works one bounded block at a time.
+
+    Searching requires the uncompressed metadata. `.decompress()` restores it right before a search, optionally into an
+    `OctopusDecompressionBuffer` that is reused across documents.
+    """
+
+    DEFAULT_BLOCK_SIZE = 256 * 1024
+
+    def __init__(
+            self,
+            codec: str,
+            level: int,
+            block_size: int,
+            size: int,
+            blocks: Sequence[bytes],
+            checksums: Sequence[int]) -> None:
+        self._codec = codec
+        self._level = level
+        self._block_size = block_size
+        self._size = size
+        self._blocks = tuple(blocks)
+        self._checksums = tuple(checksums)
+
+    @classmethod
+    def compress(
+            cls,
+            metadata: OctopusMetadata,
+            codec: str = 'zlib',
+            level: int = 6,
+            block_size: int = DEFAULT_BLOCK_SIZE) -> 'OctopusCompressedMetadata':
+        """
+        Compresses a metadata object.
+
+        :param metadata: Metadata object.
+        :param codec: One of `COMPRESSION_CODECS`.
+        :param level: Compression level of the codec. `zlib` and `lzma` accept 0 to 9 and `bz2` accepts 1 to 9.
+        :param block_size: Number of uncompressed bytes per block.
+        :return: Compressed metadata.
+        """
+
+        if codec not in _CODECS:
+            raise OctopusInvalidArgumentError("`codec` should be one of %s." % ', '.join(COMPRESSION_CODECS))
+        if not isinstance(level, int) or isinstance(level, bool) or level not in _CODECS[codec][1]:
+            raise OctopusInvalidArgumentError("Invalid compression level `%s` for `%s`." % (level, codec))
+        if not isinstance(block_size, int) or block_size < 1:
+            raise OctopusInvalidArgumentError("`block_size` should be a positive integer.")
+
+        compress_func = _CODECS[codec][2]
+        data = memoryview(metadata.to_bytes())
+        blocks = list()
+        checksums = list()
+        for offset in range(0, len(data), block_size):
+            block = data[offset:offset + block_size]
+            blocks.append(compress_func(block, level))
+            checksums.append(zlib.crc32(block))
+
+        return cls(codec, level, block_size, len(data), blocks, checksums)
+
+    def to_bytes(self) -> bytes:
+        header = _HEADER_STRUCT.pack(
+            _MAGIC,
+            _VERSION,
+            _CODECS[self._codec][0],
+            self._level,
+            self._block_size,
+            self._size,
+            len(self._blocks))
+        table = b''.join(_BLOCK_STRUCT.pack(len(x), y) for x, y in zip(self._blocks, self._checksums))
+        return header + table + b''.join(self._blocks)
+
+    @classmethod
+    def from_bytes(cls, compressed_bytes: bytes) -> 'OctopusCompressedMetadata':
+        data = memoryview(compressed_bytes)
+        if len(data) < _HEADER_STRUCT.size:
+            raise OctopusIOError("Compressed metadata is truncated.")
+
+        magic, version, codec_id, level, block_size, size, num_blocks = _HEADER_STRUCT.unpack_from(data)
+        if magic != _MAGIC:
+            raise OctopusIOError("Not a compressed metadata container.")
+        if version != _VERSION:
+            raise OctopusIOError("Unsupported compressed metadata version `%d`." % version)
+        if codec_id not in _CODEC_NAMES:
+            raise OctopusIOError("Unknown compression codec `%d`." % codec_id)
+        if block_size == 0 or num_blocks != (size + block_size - 1) // block_size:
+            raise OctopusIOError("Compressed metadata has an invalid block layout.")
+
+        offset = _HEADER_STRUCT.size + num_blocks * _BLOCK_STRUCT.size
+        if len(data) < offset:
+            raise OctopusIOError("Compressed metadata is truncated.")
+
+        blocks = list()
+        checksums = list()
+        for compressed_size, checksum in _BLOCK_STRUCT.iter_unpack(data[_HEADER_STRUCT.size:offset]):
+            if len(data) < offset + compressed_size:
+                raise OctopusIOError("Compressed metadata is truncated.")
+            blocks.append(bytes(data[offset:offset + compressed_size]))
+            checksums.append(checksum)
+            offset += compressed_size
+
+        return cls(_CODEC_NAMES[codec_id], level, block_size, size, blocks, checksums)
+
+    @property
+    def codec(self) -> str:
+        return self._codec
+
+    @property
+    def level(self) -> int:
+        return self._level
+
+    @property
+    def size(self) -> int:
+        """Size of the uncompressed metadata in bytes."""
+
+        return self._size
+
+    @property
+    def compressed_size(self) -> int:
+        """Size of the compressed blocks in bytes."""
+
+        return sum(len(x) for x in self._blocks)
+
+    @property
+    def num_blocks(self) -> int:
+        return len(self._blocks)
+
+    def decompress_block(self, index: int) -> bytes:
+        """
+        Decompresses a single block.
+
+        :param index: Index of the block.
+        :return: Uncompressed bytes of the block.
+        """
+
+        try:
+            block = _CODECS[self._codec][3](self._blocks[index])
+        except (zlib.error, lzma.LZMAError, OSError, EOFError, ValueError):
+            raise OctopusIOError("Block %d of compressed metadata is corrupted." % index)
+        expected_size = min(self._block_size, self._size - index * self._block_size)
+        if len(block) != expected_size or zlib.crc32(block) != self._checksums[index]:
+            raise OctopusIOError("Block %d of compressed metadata is corrupted." % index)
+        return block
+
+    def decompress(self, buffer: Optional['OctopusDecompressionBuffer'] = None) -> OctopusMetadata:
+        """
+        Restores the metadata object.
+
+        :param buffer: Reusable buffer to decompress into. The returned metadata is then only valid until the buffer is
+        used again. If not set a new buffer is allocated.
+        :return: Metadata object.
+        """
+
+        if buffer is None:
+            buffer = OctopusDecompressionBuffer()
+        view = buffer._reserve(self._size)
+        for i in range(len(self._blocks)):
+            offset = i * self._block_size
+            view[offset:offset + min(self._block_size, self._size - offset)] = self.decompress_block(i)
+        return OctopusMetadata.from_buffer(view)
+
+
+class OctopusDecompressionBuffer(object):
+    """
+    Memory that `OctopusCompressedMetadata.decompress()` writes into, reused across calls so that scanning compressed
+    documents does not allocate a new metadata-sized buffer per document. It grows to fit the largest document seen.
+    Not thread-safe: each thread needs its own buffer.
+    """
+
+    def __init__(self, capacity: int = 0) -> None:
+        """
+        Constructor.
+
+        :param capacity: Initial capacity in bytes.
+        """
+
+        self._buffer = bytearray(capacity)
+
+    @property
+    def capacity(self) -> int:
+        return len(self._buffer)
+
+    def _reserve(self, size: int) -> memoryview:
+        if size > len(self._buffer):
+            # Metadata handed out earlier may still hold the old buffer, so it is replaced rather than resized.
+            self._buffer = bytearray(max(size, 2 * len(self._buffer)))
+        return memoryview(self._buffer)[:size]
+
+
+__all__ = [
+    'COMPRESSED_METADATA_FILE_EXTENSION',
+    'COMPRESSION_CODECS',
+    'OctopusCompressedMetadata',
+    'OctopusDecompressionBuffer',
+]
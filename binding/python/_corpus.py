@@ -0,0 +1,151 @@
+#
+# Copyright 2023 Picovoice Inc.
+#
+# You may not use this file except in compliance with the license. A copy of the license is located in the "LICENSE"
+# file accompanying this source.
+#
+# Unless required by applicable law or agreed to in writing, software distributed under the License is distributed on
+# an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the License for the
+# specific language governing permissions and limitations under the License.
+#
+
+import mmap
+import os
+from typing import Dict, Iterator, Mapping, Sequence
+
+from ._octopus import OctopusIOError, OctopusMetadata
+
+METADATA_FILE_EXTENSION = '.oif'
+
+
+def find_metadata_files(directory: str, extension: str = METADATA_FILE_EXTENSION) -> Dict[str, str]:
+    """
+    Lists metadata files under a directory tree.
+
+    :param directory: Root directory to search.
+    :param extension: Extension of metadata files.
+    :return: A map from document ID to file path. The document ID of each file is its path relative to `directory`
+    without the extension.
+    """
+
+    if not os.path.isdir(directory):
+        raise OctopusIOError("Couldn't find corpus directory at `%s`." % directory)
+
+    paths = dict()
+    for root, _, files in os.walk(directory):
+        for file in sorted(files):
+            if file.endswith(extension):
+                path = os.path.join(root, file)
+                document_id = os.path.relpath(path, directory)[:-len(extension)].replace(os.sep, '/')
+                paths[document_id] = path
+
+    return paths
+
+
+class OctopusCorpus(Mapping[str, OctopusMetadata]):
+    """
+    Collection of metadata files keyed by document ID. Files are memory-mapped once and searched in place, so
+    the corpus is never copied into the Python heap and its pages are shared between processes reading the same files.
+    """
+
+    def __init__(self, paths: Mapping[str, str]) -> None:
+        """
+        Constructor.
+
+        :param paths: A map from document ID to the path of its metadata file (as written by
+        `OctopusMetadata.to_bytes()`).
+        """
+
+        self._maps = dict()
+        self._metadata = dict()
+
+        try:
+            for document_id, path in paths.items():
+                self.add(document_id, path)
+        except Exception:
+            self.close()
+            raise
+
+    @classmethod
+    def from_directory(cls, directory: str, extension: str = METADATA_FILE_EXTENSION) -> 'OctopusCorpus':
+        """
+        Loads every metadata file under a directory tree. The document ID of each file is its path relative to
+        `directory` without the extension.
+
+        :param directory: Root directory of the corpus.
+        :param extension: Extension of metadata files.
+        :return: A corpus of all metadata files found.
+        """
+
+        return cls(find_metadata_files(directory, extension=extension))
+
+    def add(self, document_id: str, path: str) -> None:
+        """
+        Maps a metadata file into the corpus, replacing any document with the same ID.
+
+        :param document_id: Document ID.
+        :param path: Path to the metadata file.
+        """
+
+        if not os.path.exists(path):
+            raise OctopusIOError("Couldn't find metadata file at `%s`." % path)
+
+        with open(path, 'rb') as f:
+            if os.fstat(f.fileno()).st_size == 0:
+                raise OctopusIOError("Metadata file at `%s` is empty." % path)
+            # Copy-on-write mapping gives ctypes the writable buffer it requires while leaving the file untouched.
+            metadata_map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_COPY)
+
+        self._maps[document_id] = metadata_map
+        self._metadata[document_id] = OctopusMetadata.from_buffer(metadata_map)
+
+    def remove(self, document_id: str) -> None:
+        """
+        Drops a document from the corpus. Its file stays mapped until metadata objects obtained from the corpus for it
+        are released, so concurrent searches are unaffected.
+
+        :param document_id: Document ID.
+        """
+
+        self._metadata.pop(document_id, None)
+        self._maps.pop(document_id, None)
+
+    def __getitem__(self, document_id: str) -> OctopusMetadata:
+        return self._metadata[document_id]
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._metadata)
+
+    def __len__(self) -> int:
+        return len(self._metadata)
+
+    @property
+    def ids(self) -> Sequence[str]:
+        """Document IDs in the corpus."""
+
+        return list(self._metadata.keys())
+
+    @property
+    def num_bytes(self) -> int:
+        """Total size of metadata in the corpus."""
+
+        return sum(x.size for x in self._metadata.values())
+
+    def close(self) -> None:
+        """Unmaps all metadata files. Metadata objects obtained from the corpus must not be used afterwards."""
+
+        self._metadata.clear()
+        for metadata_map in self._maps.values():
+            try:
+                metadata_map.close()
+            except BufferError:
+                # A caller still holds a metadata object; the mapping is released once it is garbage collected.
+                pass
+        self._maps.clear()
+
+
+__all__ = [
+    'METADATA_FILE_EXTENSION',
+    'OctopusCorpus',
+    'find_metadata_files',
+]
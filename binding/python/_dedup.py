@@ -0,0 +1,235 @@
+#
+# Copyright 2023 Picovoice Inc.
+#
+# You may not use this file except in compliance with the license. A copy of the license is located in the "LICENSE"
+# file accompanying this source.
+#
+# Unless required by applicable law or agreed to in writing, software distributed under the License is distributed on
+# an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the License for the
+# specific language governing permissions and limitations under the License.
+#
+
+import hashlib
+import json
+import os
+import sys
+from array import array
+from collections import namedtuple
+from typing import Dict, Iterable, List, Sequence
+
+from ._corpus import METADATA_FILE_EXTENSION
+from ._octopus import Octopus, OctopusInvalidArgumentError, OctopusIOError, OctopusMetadata
+
+_ANCHOR = b'\x5a\xa5'
+
+
+def _chunk_boundaries(pcm_bytes: bytes, min_samples: int, max_samples: int) -> List[int]:
+    """
+    Sample indices where chunks end. A chunk ends where the low bytes of two consecutive samples form a fixed pattern,
+    which happens about once every 65536 samples of non-silent audio, or after `max_samples` otherwise. Boundaries
+    depend only on nearby samples, so every copy of a segment is cut at the same places wherever it occurs.
+    """
+
+    low_bytes = pcm_bytes[0::2] if sys.byteorder == 'little' else pcm_bytes[1::2]
+    num_samples = len(low_bytes)
+
+    boundaries = list()
+    start = 0
+    while start < num_samples:
+        anchor = low_bytes.find(_ANCHOR, start + min_samples - len(_ANCHOR), start + max_samples)
+        start = min(num_samples, start + max_samples) if anchor < 0 else anchor + len(_ANCHOR)
+        boundaries.append(start)
+    return boundaries
+
+
+class OctopusChunkStore(object):
+    """
+    Directory of metadata for audio chunks, keyed by the SHA-256 of their samples.
+    """
+
+    def __init__(self, path: str) -> None:
+        """
+        Constructor.
+
+        :param path: Directory of the store. It is created if it does not exist.
+        """
+
+        self._path = path
+        os.makedirs(path, exist_ok=True)
+        self._keys = set(
+            x[:-len(METADATA_FILE_EXTENSION)] for x in os.listdir(path) if x.endswith(METADATA_FILE_EXTENSION))
+
+    def _chunk_path(self, key: str) -> str:
+        return os.path.join(self._path, key + METADATA_FILE_EXTENSION)
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._keys
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def get(self, key: str) -> OctopusMetadata:
+        if key not in self._keys:
+            raise OctopusIOError("Couldn't find chunk `%s` in `%s`." % (key, self._path))
+        with open(self._chunk_path(key), 'rb') as f:
+            return OctopusMetadata.from_bytes(f.read())
+
+    def put(self, key: str, metadata: OctopusMetadata) -> None:
+        tmp_path = self._chunk_path(key) + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.write(metadata.to_bytes())
+        os.replace(tmp_path, self._chunk_path(key))
+        self._keys.add(key)
+
+
+class OctopusChunkedMetadata(object):
+    """
+    Index of a recording as a sequence of chunks stored in an `OctopusChunkStore`, each placed at its offset in the
+    recording.
+    """
+
+    Chunk = namedtuple('Chunk', ['key', 'start_sec', 'end_sec', 'reused'])
+
+    def __init__(self, chunks: Sequence['OctopusChunkedMetadata.Chunk']) -> None:
+        self._chunks = tuple(chunks)
+
+    @property
+    def chunks(self) -> Sequence['OctopusChunkedMetadata.Chunk']:
+        return self._chunks
+
+    @property
+    def reused_fraction(self) -> float:
+        """Fraction of the recording whose metadata was reused rather than indexed."""
+
+        duration_sec = sum(x.end_sec - x.start_sec for x in self._chunks)
+        if duration_sec == 0:
+            return 0.
+        return sum(x.end_sec - x.start_sec for x in self._chunks if x.reused) / duration_sec
+
+    def to_bytes(self) -> bytes:
+        return json.dumps([list(x) for x in self._chunks]).encode('utf-8')
+
+    @classmethod
+    def from_bytes(cls, chunked_metadata_bytes: bytes) -> 'OctopusChunkedMetadata':
+        return cls([cls.Chunk(*x) for x in json.loads(chunked_metadata_bytes.decode('utf-8'))])
+
+
+class OctopusDeduplicatingIndexer(object):
+    """
+    Indexes recordings that share segments, e.g. broadcasts repeating the same ads or jingles, without indexing each
+    copy again. Audio is split into chunks at content-defined points, so identical audio is cut at the same places
+    wherever it occurs. Chunks whose samples are already in the store reuse its metadata; the rest are indexed and added
+    to it. Only bit-identical copies are recognized.
+
+    Each chunk is indexed on its own, so a phrase that straddles a chunk boundary is not found. Longer chunks make this
+    rarer but find fewer repeats.
+    """
+
+    def __init__(
+            self,
+            octopus: Octopus,
+            store: OctopusChunkStore,
+            min_chunk_sec: float = 2.,
+            max_chunk_sec: float = 16.) -> None:
+        """
+        Constructor.
+
+        :param octopus: Octopus instance used to index new chunks and search.
+        :param store: Store of chunk metadata shared by all recordings.
+        :param min_chunk_sec: Shortest chunk, except at the end of a recording. Chunks are about 4 seconds longer than
+        this on average.
+        :param max_chunk_sec: Longest chunk.
+        """
+
+        if not (0 < min_chunk_sec <= max_chunk_sec):
+            raise OctopusInvalidArgumentError("Chunk lengths should satisfy `0 < min_chunk_sec <= max_chunk_sec`.")
+
+        self._octopus = octopus
+        self._store = store
+        self._min_samples = max(len(_ANCHOR), round(min_chunk_sec * octopus.sample_rate))
+        self._max_samples = max(self._min_samples, round(max_chunk_sec * octopus.sample_rate))
+
+        self._num_samples = 0
+        self._num_reused_samples = 0
+
+    def index_audio_data(self, pcm: Sequence[int]) -> OctopusChunkedMetadata:
+        """
+        Indexes audio data, reusing the metadata of chunks that have been seen before.
+
+        :param pcm: Audio data. See `Octopus.index_audio_data()`.
+        :return: Chunked metadata to pass to `.search()`.
+        """
+
+        sample_rate = self._octopus.sample_rate
+        if not isinstance(pcm, array) or pcm.typecode != 'h':
+            pcm = array('h', pcm)
+        pcm_bytes = pcm.tobytes()
+
+        chunks = list()
+        start = 0
+        for end in _chunk_boundaries(pcm_bytes, self._min_samples, self._max_samples):
+            key = hashlib.sha256(pcm_bytes[start * 2:end * 2]).hexdigest()
+
+            reused = key in self._store
+            if reused:
+                self._num_reused_samples += end - start
+            else:
+                self._store.put(key, self._octopus.index_audio_data(pcm[start:end]))
+            self._num_samples += end - start
+
+            chunks.append(OctopusChunkedMetadata.Chunk(key, start / sample_rate, end / sample_rate, reused))
+            start = end
+
+        return OctopusChunkedMetadata(chunks)
+
+    def search(
+            self,
+            chunked_metadata: OctopusChunkedMetadata,
+            phrases: Iterable[str]) -> Dict[str, Sequence[Octopus.Match]]:
+        """
+        Searches a chunked recording. Matches are shifted to the timeline of the recording.
+
+        :param chunked_metadata: Chunked metadata returned by `.index_audio_data()`.
+        :param phrases: An iterable of phrases to search the index for.
+        :return matches: A dictionary map of found matches.
+        """
+
+        prepared_query = self._octopus.prepare(phrases)
+
+        chunk_matches = dict()
+        for chunk in chunked_metadata.chunks:
+            if chunk.key not in chunk_matches:
+                chunk_matches[chunk.key] = prepared_query.search(self._store.get(chunk.key))
+
+        matches = dict()
+        for chunk in chunked_metadata.chunks:
+            for phrase, phrase_matches in chunk_matches[chunk.key].items():
+                matches.setdefault(phrase, list()).extend(
+                    Octopus.Match(x.start_sec + chunk.start_sec, x.end_sec + chunk.start_sec, x.probability)
+                    for x in phrase_matches)
+        return matches
+
+    @property
+    def reused_fraction(self) -> float:
+        """Fraction of all audio given to this indexer whose metadata was reused rather than indexed."""
+
+        return self._num_reused_samples / self._num_samples if self._num_samples > 0 else 0.
+
+    @property
+    def num_samples(self) -> int:
+        """Number of samples given to this indexer."""
+
+        return self._num_samples
+
+    @property
+    def num_reused_samples(self) -> int:
+        """Number of samples whose metadata was reused."""
+
+        return self._num_reused_samples
+
+
+__all__ = [
+    'OctopusChunkStore',
+    'OctopusChunkedMetadata',
+    'OctopusDeduplicatingIndexer',
+]
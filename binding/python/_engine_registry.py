@@ -0,0 +1,294 @@
+#
+# Copyright 2023 Picovoice Inc.
+#
+# You may not use this file except in compliance with the license. A copy of the license is located in the "LICENSE"
+# file accompanying this source.
+#
+# Unless required by applicable law or agreed to in writing, software distributed under the License is distributed on
+# an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the License for the
+# specific language governing permissions and limitations under the License.
+#
+
+import os
+import re
+import threading
+import time
+from collections import OrderedDict, namedtuple
+from contextlib import contextmanager
+from typing import Dict, Iterable, Iterator, Mapping, Optional, Sequence, Tuple
+
+from ._factory import create
+from ._octopus import Octopus, OctopusInvalidArgumentError, OctopusInvalidStateError, OctopusKeyError, OctopusMetadata
+
+DEFAULT_MODEL_TIER = 'default'
+
+_MODEL_FILE_PATTERN = re.compile(r'^octopus_params(?:_([a-z]{2}))?\.pv$')
+
+
+def find_model_files(directory: str, tier: str = DEFAULT_MODEL_TIER) -> Dict[Tuple[str, str], str]:
+    """
+    Finds model files named like the ones shipped with Octopus (`octopus_params.pv` for English and
+    `octopus_params_<language>.pv` for other languages) in a directory.
+
+    :param directory: Directory holding model files, e.g. `lib/common/param`.
+    :param tier: Tier assigned to every model in the directory.
+    :return: A map from `(language, tier)` to the model path.
+    """
+
+    model_paths = dict()
+    for file_name in sorted(os.listdir(directory)):
+        match = _MODEL_FILE_PATTERN.match(file_name)
+        if match is not None:
+            model_paths[(match.group(1) or 'en', tier)] = os.path.join(directory, file_name)
+    return model_paths
+
+
+def _rss_bytes() -> Optional[int]:
+    try:
+        with open('/proc/self/statm', 'r') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+class _Engine(object):
+    def __init__(self, octopus: Octopus, memory_bytes: int) -> None:
+        self.octopus = octopus
+        self.memory_bytes = memory_bytes
+        self.lock = threading.Lock()
+        self.num_users = 0
+
+
+class OctopusEngineRegistry(object):
+    """
+    Octopus instances for several languages and model tiers, created on first use. When a memory budget is set, the
+    least recently used instances that are not in use are deleted to stay within it. Each instance serves one caller at
+    a time; callers of the same language and tier wait for each other.
+
+    The memory of an instance is measured as the growth of the resident set size while it loads (Linux), or estimated by
+    the size of its model file elsewhere.
+    """
+
+    Stats = namedtuple('Stats', ['loaded', 'num_loads', 'num_evictions', 'load_sec', 'memory_bytes'])
+
+    def __init__(
+            self,
+            access_key: str,
+            model_paths: Mapping[Tuple[str, str], str],
+            memory_budget_bytes: Optional[int] = None,
+            prewarm: Iterable[Tuple[str, str]] = (),
+            library_path: Optional[str] = None) -> None:
+        """
+        Constructor.
+
+        :param access_key: AccessKey provided by Picovoice Console (https://console.picovoice.ai/)
+        :param model_paths: A map from `(language, tier)` to the absolute path of its model file. See
+        `find_model_files()`.
+        :param memory_budget_bytes: Memory that loaded instances may use in total. Unlimited if not set. Instances in
+        use are never evicted, so the budget can be exceeded while more instances are in use than fit in it.
+        :param prewarm: `(language, tier)` pairs to load right away.
+        :param library_path: Absolute path to Octopus' dynamic library. If not set it will be set to the default
+        location.
+        """
+
+        if memory_budget_bytes is not None and (not isinstance(memory_budget_bytes, int) or memory_budget_bytes < 1):
+            raise OctopusInvalidArgumentError("`memory_budget_bytes` should be a positive integer.")
+
+        self._access_key = access_key
+        self._model_paths = dict(model_paths)
+        self._memory_budget_bytes = memory_budget_bytes
+        self._library_path = library_path
+
+        self._engines = OrderedDict()
+        self._stats = {x: dict(num_loads=0, num_evictions=0, load_sec=None, memory_bytes=None) for x in model_paths}
+        self._lock = threading.Lock()
+        self._load_lock = threading.Lock()
+        self._deleted = False
+
+        try:
+            self.prewarm(prewarm)
+        except Exception:
+            self.delete()
+            raise
+
+    def prewarm(self, keys: Iterable[Tuple[str, str]]) -> None:
+        """
+        Loads instances ahead of their first use.
+
+        :param keys: `(language, tier)` pairs.
+        """
+
+        for language, tier in keys:
+            with self.acquire(language, tier):
+                pass
+
+    @contextmanager
+    def acquire(self, language: str = 'en', tier: str = DEFAULT_MODEL_TIER) -> Iterator[Octopus]:
+        """
+        Borrows the instance of a language and tier for the duration of a `with` block, loading it if needed.
+
+        :param language: Language code, e.g. `'en'` or `'de'`.
+        :param tier: Model tier.
+        :return: An Octopus instance owned by the caller until the block exits.
+        """
+
+        key = (language, tier)
+        if key not in self._model_paths:
+            raise OctopusKeyError("No model registered for language `%s` and tier `%s`." % key)
+
+        engine = self._pin(key)
+        try:
+            with engine.lock:
+                yield engine.octopus
+        finally:
+            with self._lock:
+                engine.num_users -= 1
+            self._evict()
+
+    def index_audio_data(
+            self,
+            pcm: Sequence[int],
+            language: str = 'en',
+            tier: str = DEFAULT_MODEL_TIER) -> OctopusMetadata:
+        """Indexes audio data with the instance of a language and tier. See `Octopus.index_audio_data()`."""
+
+        with self.acquire(language, tier) as octopus:
+            return octopus.index_audio_data(pcm)
+
+    def index_audio_file(self, path: str, language: str = 'en', tier: str = DEFAULT_MODEL_TIER) -> OctopusMetadata:
+        """Indexes an audio file with the instance of a language and tier. See `Octopus.index_audio_file()`."""
+
+        with self.acquire(language, tier) as octopus:
+            return octopus.index_audio_file(path)
+
+    def search(
+            self,
+            metadata: OctopusMetadata,
+            phrases: Iterable[str],
+            language: str = 'en',
+            tier: str = DEFAULT_MODEL_TIER) -> Dict[str, Sequence[Octopus.Match]]:
+        """
+        Searches metadata with the instance of a language and tier. Metadata must be searched with the language it was
+        indexed with. See `Octopus.search()`.
+        """
+
+        with self.acquire(language, tier) as octopus:
+            return octopus.search(metadata, phrases)
+
+    def _pin(self, key: Tuple[str, str]) -> _Engine:
+        with self._lock:
+            if self._deleted:
+                raise OctopusInvalidStateError("Registry has been deleted.")
+            engine = self._engines.get(key)
+            if engine is not None:
+                engine.num_users += 1
+                self._engines.move_to_end(key)
+                return engine
+
+        # Loads are serialized so the growth of the resident set size can be attributed to a single instance.
+        with self._load_lock:
+            with self._lock:
+                engine = self._engines.get(key)
+                if engine is not None:
+                    engine.num_users += 1
+                    self._engines.move_to_end(key)
+                    return engine
+
+            rss_before = _rss_bytes()
+            start = time.perf_counter()
+            octopus = create(
+                access_key=self._access_key,
+                model_path=self._model_paths[key],
+                library_path=self._library_path)
+            load_sec = time.perf_counter() - start
+            rss_after = _rss_bytes()
+
+            if rss_before is not None and rss_after is not None and rss_after > rss_before:
+                memory_bytes = rss_after - rss_before
+            else:
+                memory_bytes = os.path.getsize(self._model_paths[key])
+
+            engine = _Engine(octopus, memory_bytes)
+            engine.num_users += 1
+            with self._lock:
+                if self._deleted:
+                    octopus.delete()
+                    raise OctopusInvalidStateError("Registry has been deleted.")
+                self._engines[key] = engine
+                stats = self._stats[key]
+                stats['num_loads'] += 1
+                stats['load_sec'] = load_sec
+                stats['memory_bytes'] = memory_bytes
+
+        self._evict()
+        return engine
+
+    def _evict(self) -> None:
+        if self._memory_budget_bytes is None:
+            return
+
+        evicted = list()
+        with self._lock:
+            memory_bytes = sum(x.memory_bytes for x in self._engines.values())
+            for key, engine in list(self._engines.items()):
+                if memory_bytes <= self._memory_budget_bytes:
+                    break
+                if engine.num_users == 0:
+                    del self._engines[key]
+                    self._stats[key]['num_evictions'] += 1
+                    memory_bytes -= engine.memory_bytes
+                    evicted.append(engine)
+
+        for engine in evicted:
+            engine.octopus.delete()
+
+    @property
+    def model_keys(self) -> Sequence[Tuple[str, str]]:
+        """`(language, tier)` pairs that have a model."""
+
+        return list(self._model_paths.keys())
+
+    @property
+    def loaded(self) -> Sequence[Tuple[str, str]]:
+        """`(language, tier)` pairs with a loaded instance, least recently used first."""
+
+        with self._lock:
+            return list(self._engines.keys())
+
+    @property
+    def memory_bytes(self) -> int:
+        """Memory used by loaded instances."""
+
+        with self._lock:
+            return sum(x.memory_bytes for x in self._engines.values())
+
+    def stats(self) -> Dict[Tuple[str, str], 'OctopusEngineRegistry.Stats']:
+        """
+        Load statistics per language and tier. `load_sec` and `memory_bytes` describe the most recent load and are
+        `None` for models that have not been loaded yet.
+        """
+
+        with self._lock:
+            return {x: self.Stats(loaded=x in self._engines, **y) for x, y in self._stats.items()}
+
+    def delete(self) -> None:
+        """
+        Releases resources acquired by all loaded Octopus instances. Raises `OctopusInvalidStateError` while an instance
+        is in use, leaving the registry untouched. The registry cannot be used afterwards.
+        """
+
+        with self._lock:
+            if any(x.num_users > 0 for x in self._engines.values()):
+                raise OctopusInvalidStateError("Registry cannot be deleted while its instances are in use.")
+            self._deleted = True
+            engines = list(self._engines.values())
+            self._engines.clear()
+        for engine in engines:
+            engine.octopus.delete()
+
+
+__all__ = [
+    'DEFAULT_MODEL_TIER',
+    'OctopusEngineRegistry',
+    'find_model_files',
+]
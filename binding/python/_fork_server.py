@@ -0,0 +1,383 @@
+#
+# Copyright 2023 Picovoice Inc.
+#
+# You may not use this file except in compliance with the license. A copy of the license is located in the "LICENSE"
+# file accompanying this source.
+#
+# Unless required by applicable law or agreed to in writing, software distributed under the License is distributed on
+# an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the License for the
+# specific language governing permissions and limitations under the License.
+#
+
+import multiprocessing
+import os
+import shutil
+import signal
+import socket
+import tempfile
+import threading
+import time
+from array import array
+from multiprocessing.connection import Client, Connection, answer_challenge, deliver_challenge
+from typing import Any, Dict, Iterable, Optional, Sequence
+
+from ._factory import create
+from ._octopus import Octopus, OctopusInvalidStateError, OctopusMetadata, OctopusRuntimeError
+
+
+def _is_running(pid: int) -> bool:
+    # The template process ignores SIGCHLD, so workers are reaped as soon as they exit and leave no zombies behind.
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def _serve(octopus: Octopus, request: Any) -> Any:
+    kind, args = request
+    if kind == 'index_audio_data':
+        return octopus.index_audio_data(args).to_bytes()
+    if kind == 'index_audio_file':
+        return octopus.index_audio_file(args).to_bytes()
+    if kind == 'search':
+        matches = octopus.search(OctopusMetadata.from_bytes(args[0]), args[1])
+        return {x: [tuple(z) for z in y] for x, y in matches.items()}
+    raise ValueError("Unknown request `%s`." % kind)
+
+
+def _worker_main(octopus: Octopus, address: str, authkey: bytes) -> None:
+    with Client(address, family='AF_UNIX', authkey=authkey) as conn:
+        conn.send(os.getpid())
+        while True:
+            try:
+                request = conn.recv()
+            except EOFError:
+                return
+            if request is None:
+                return
+            try:
+                conn.send((True, _serve(octopus, request)))
+            except Exception as e:
+                conn.send((False, e))
+
+
+def _zygote_main(
+        conn: Connection,
+        address: str,
+        authkey: bytes,
+        access_key: str,
+        model_path: Optional[str],
+        library_path: Optional[str]) -> None:
+    # Workers are reaped automatically.
+    signal.signal(signal.SIGCHLD, signal.SIG_IGN)
+
+    try:
+        octopus = create(access_key=access_key, model_path=model_path, library_path=library_path)
+        # Touches the code and model pages that indexing and searching use, so that workers inherit them warm.
+        octopus.search(octopus.index_audio_data(array('h', bytes(2 * octopus.sample_rate))), ['octopus'])
+    except Exception as e:
+        conn.send(e)
+        return
+    conn.send(None)
+
+    while True:
+        try:
+            request = conn.recv()
+        except EOFError:
+            break
+        if request is None:
+            break
+
+        pid = os.fork()
+        if pid == 0:
+            try:
+                conn.close()
+                signal.signal(signal.SIGCHLD, signal.SIG_DFL)
+                _worker_main(octopus, address, authkey)
+            finally:
+                os._exit(0)
+        conn.send(pid)
+
+    octopus.delete()
+
+
+class OctopusForkServerPool(object):
+    """
+    Worker processes forked from a template process that has already loaded the library, initialized Octopus and run a
+    warm-up index and search. New workers skip initialization and the cold first call, and share the pages of the
+    template copy-on-write. Workers are forked when needed, up to `num_workers`, and retired after `max_jobs_per_worker`
+    jobs to bound the memory each one accumulates.
+
+    Requires `fork` (Linux and macOS). Methods are thread-safe; each call runs on an idle worker.
+    """
+
+    _POLL_INTERVAL_SEC = 0.1
+
+    def __init__(
+            self,
+            access_key: str,
+            num_workers: int,
+            max_jobs_per_worker: Optional[int] = None,
+            model_path: Optional[str] = None,
+            library_path: Optional[str] = None,
+            worker_start_timeout_sec: float = 10.) -> None:
+        """
+        Constructor.
+
+        :param access_key: AccessKey provided by Picovoice Console (https://console.picovoice.ai/)
+        :param num_workers: Maximum number of worker processes.
+        :param max_jobs_per_worker: Number of jobs after which a worker exits. Workers are never retired if not set.
+        :param model_path: Absolute path to the file containing model parameters. If not set it will be set to the
+        default location for English model.
+        :param library_path: Absolute path to Octopus' dynamic library. If not set it will be set to the default
+        location.
+        :param worker_start_timeout_sec: Longest a new worker can take to be forked and connect back.
+        """
+
+        if not hasattr(os, 'fork'):
+            raise NotImplementedError('Unsupported platform.')
+
+        self._num_workers = num_workers
+        self._max_jobs_per_worker = max_jobs_per_worker
+        self._worker_start_timeout_sec = worker_start_timeout_sec
+        self._idle = list()
+        self._workers = dict()
+        self._num_live = 0
+        self._deleted = False
+        self._condition = threading.Condition()
+        self._fork_lock = threading.Lock()
+
+        self._authkey = os.urandom(32)
+        self._socket_dir = tempfile.mkdtemp(prefix='pvoctopus_')
+        address = os.path.join(self._socket_dir, 'workers')
+        self._socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self._socket.bind(address)
+        self._socket.listen()
+
+        context = multiprocessing.get_context('spawn')
+        self._zygote_conn, zygote_conn = context.Pipe()
+        self._zygote = context.Process(
+            target=_zygote_main,
+            args=(zygote_conn, address, self._authkey, access_key, model_path, library_path),
+            daemon=True)
+        self._zygote.start()
+        zygote_conn.close()
+
+        try:
+            error = self._zygote_conn.recv()
+        except EOFError:
+            error = OctopusRuntimeError("Template process exited during initialization.")
+        if error is not None:
+            self._zygote.join()
+            self._close_socket()
+            raise error
+
+    def _close_socket(self) -> None:
+        self._socket.close()
+        shutil.rmtree(self._socket_dir, ignore_errors=True)
+
+    def _fork(self) -> list:
+        with self._fork_lock:
+            deadline = time.monotonic() + self._worker_start_timeout_sec
+            if not self._zygote.is_alive():
+                raise OctopusRuntimeError("Template process has exited.")
+
+            self._kill_unclaimed()
+            try:
+                self._zygote_conn.send(True)
+                if not self._zygote_conn.poll(self._worker_start_timeout_sec):
+                    raise OctopusRuntimeError(
+                        "Template process did not fork a worker within %.1f seconds." % self._worker_start_timeout_sec)
+                pid = self._zygote_conn.recv()
+            except (EOFError, OSError):
+                raise OctopusRuntimeError("Template process has exited.")
+
+            while True:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._kill(pid)
+                    raise OctopusRuntimeError(
+                        "Worker process did not connect within %.1f seconds." % self._worker_start_timeout_sec)
+
+                self._socket.settimeout(min(remaining, self._POLL_INTERVAL_SEC))
+                try:
+                    sock, _ = self._socket.accept()
+                except socket.timeout:
+                    if not _is_running(pid):
+                        raise OctopusRuntimeError("Worker process exited before connecting.")
+                    continue
+
+                sock.setblocking(True)
+                conn = Connection(sock.detach())
+                try:
+                    deliver_challenge(conn, self._authkey)
+                    answer_challenge(conn, self._authkey)
+                    worker_pid = conn.recv()
+                except (EOFError, OSError, multiprocessing.AuthenticationError):
+                    conn.close()
+                    continue
+                # A worker that connected after an earlier attempt gave up on it has been killed; drop its connection.
+                if worker_pid != pid:
+                    conn.close()
+                    continue
+                return [conn, 0, pid]
+
+    def _kill_unclaimed(self) -> None:
+        # Workers forked for an earlier attempt that timed out are not waited for.
+        try:
+            while self._zygote_conn.poll():
+                self._kill(self._zygote_conn.recv())
+        except (EOFError, OSError):
+            pass
+
+    @staticmethod
+    def _kill(pid: int) -> None:
+        try:
+            os.kill(pid, signal.SIGKILL)
+        except ProcessLookupError:
+            pass
+
+    def _acquire(self) -> list:
+        with self._condition:
+            while not self._deleted and len(self._idle) == 0 and self._num_live >= self._num_workers:
+                self._condition.wait()
+            if self._deleted:
+                raise OctopusInvalidStateError("Pool has been deleted.")
+            if len(self._idle) > 0:
+                return self._idle.pop()
+            self._num_live += 1
+
+        try:
+            worker = self._fork()
+        except Exception:
+            self._release(None)
+            raise
+
+        with self._condition:
+            if not self._deleted:
+                self._workers[worker[2]] = worker
+                return worker
+        worker[0].close()
+        self._kill(worker[2])
+        raise OctopusInvalidStateError("Pool has been deleted.")
+
+    def _release(self, worker: Optional[list], exited: bool = False) -> None:
+        with self._condition:
+            # Workers are killed and forgotten on deletion, so there is nothing left to return them to.
+            if self._deleted:
+                if worker is not None:
+                    worker[0].close()
+                return
+
+            if worker is None:
+                self._num_live -= 1
+            elif exited:
+                del self._workers[worker[2]]
+                self._num_live -= 1
+            else:
+                self._idle.append(worker)
+            self._condition.notify()
+
+    def _retire(self, worker: list) -> None:
+        try:
+            worker[0].send(None)
+        except OSError:
+            pass
+        worker[0].close()
+
+    def _discard(self, worker: list) -> None:
+        self._kill(worker[2])
+        worker[0].close()
+        self._release(worker, exited=True)
+
+    def _call(self, kind: str, args: Any) -> Any:
+        worker = self._acquire()
+        try:
+            worker[0].send((kind, args))
+            ok, result = worker[0].recv()
+        except (EOFError, OSError):
+            self._discard(worker)
+            raise OctopusRuntimeError("Worker process exited unexpectedly.")
+        except BaseException:
+            # The worker may be left halfway through a message, e.g. after an interrupt, so it is not reused.
+            self._discard(worker)
+            raise
+
+        worker[1] += 1
+        if self._max_jobs_per_worker is not None and worker[1] >= self._max_jobs_per_worker:
+            self._retire(worker)
+            self._release(worker, exited=True)
+        else:
+            self._release(worker)
+
+        if not ok:
+            raise result
+        return result
+
+    def index_audio_data(self, pcm: Sequence[int]) -> OctopusMetadata:
+        """Indexes audio data on a worker. See `Octopus.index_audio_data()`."""
+
+        if not isinstance(pcm, array) or pcm.typecode != 'h':
+            pcm = array('h', pcm)
+        return OctopusMetadata.from_bytes(self._call('index_audio_data', pcm))
+
+    def index_audio_file(self, path: str) -> OctopusMetadata:
+        """Indexes an audio file on a worker. See `Octopus.index_audio_file()`."""
+
+        return OctopusMetadata.from_bytes(self._call('index_audio_file', path))
+
+    def search(self, metadata: OctopusMetadata, phrases: Iterable[str]) -> Dict[str, Sequence[Octopus.Match]]:
+        """Searches metadata on a worker. See `Octopus.search()`."""
+
+        matches = self._call('search', (metadata.to_bytes(), list(phrases)))
+        return {x: [Octopus.Match(*z) for z in y] for x, y in matches.items()}
+
+    @property
+    def num_live_workers(self) -> int:
+        """Number of worker processes currently running."""
+
+        return self._num_live
+
+    def delete(self) -> None:
+        """
+        Stops all workers and the template process. Workers that are busy are killed, and calls running on them raise
+        `OctopusRuntimeError`.
+        """
+
+        with self._condition:
+            if self._deleted:
+                return
+            self._deleted = True
+            idle = self._idle
+            workers = list(self._workers.values())
+            self._idle = list()
+            self._workers = dict()
+            self._num_live = 0
+            self._condition.notify_all()
+
+        for worker in idle:
+            self._retire(worker)
+        for worker in workers:
+            self._kill(worker[2])
+
+        # Waits for a fork in progress, which kills its worker once it sees the pool is deleted.
+        with self._fork_lock:
+            deadline = time.monotonic() + self._worker_start_timeout_sec
+            while any(_is_running(x[2]) for x in workers) and time.monotonic() < deadline:
+                time.sleep(0.01)
+            try:
+                self._zygote_conn.send(None)
+            except OSError:
+                pass
+            self._zygote.join()
+            self._kill_unclaimed()
+            self._zygote_conn.close()
+            self._close_socket()
+
+
+__all__ = [
+    'OctopusForkServerPool',
+]
@@ -12,11 +12,16 @@
 # limitations under the License.
 #
 
+import bisect
 import os
+import struct
+import sys
+from array import array
 from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
 from ctypes import *
 from enum import Enum
-from typing import Dict, Iterable, Sequence
+from typing import Any, Dict, Iterable, Optional, Sequence, Tuple
 
 
 class OctopusError(Exception):
@@ -87,6 +92,89 @@ class OctopusActivationRefusedError(OctopusError):
     pass
 
 
+_WAVE_FORMAT_PCM = 0x0001
+
+_WAVE_FORMAT_EXTENSIBLE = 0xFFFE
+
+# Streaming writers set the size of the data chunk to this when the length is not known upfront.
+_WAVE_UNKNOWN_DATA_SIZE = 0xFFFFFFFF
+
+_WAVE_SKIP_BLOCK_SIZE = 64 * 1024
+
+OctopusWavHeader = namedtuple('OctopusWavHeader', ['num_channels', 'sample_rate', 'num_data_bytes'])
+
+
+def read_wav_header(stream: Any) -> OctopusWavHeader:
+    """
+    Reads the header of a 16-bit PCM WAV file up to the start of its samples. The stream is read sequentially and is
+    never seeked, so it is left positioned at the first sample.
+
+    :param stream: A readable binary file-like object.
+    :return: Number of channels, sample rate and size of the data chunk in bytes. The size is `None` if the file was
+    written without knowing its length, in which case the samples run to the end of the stream.
+    """
+
+    def read_exactly(size: int) -> bytes:
+        data = b''
+        while len(data) < size:
+            chunk = stream.read(size - len(data))
+            if not chunk:
+                raise OctopusIOError("Audio stream ended before the WAV header was complete.")
+            data += chunk
+        return data
+
+    riff, _, wave_id = struct.unpack('<4sI4s', read_exactly(12))
+    if riff != b'RIFF' or wave_id != b'WAVE':
+        raise OctopusIOError("Audio stream is not a WAV file.")
+
+    num_channels = None
+    sample_rate = None
+    while True:
+        chunk_id, chunk_size = struct.unpack('<4sI', read_exactly(8))
+        if chunk_id == b'data':
+            break
+
+        if chunk_id == b'fmt ':
+            chunk = read_exactly(chunk_size + chunk_size % 2)
+            audio_format, num_channels, sample_rate, _, _, bits_per_sample = struct.unpack_from('<HHIIHH', chunk)
+            if audio_format == _WAVE_FORMAT_EXTENSIBLE and chunk_size >= 26:
+                audio_format = struct.unpack_from('<H', chunk, 24)[0]
+            if audio_format != _WAVE_FORMAT_PCM or bits_per_sample != 16:
+                raise OctopusInvalidArgumentError("Audio stream should be 16-bit PCM")
+        else:
+            skip = chunk_size + chunk_size % 2
+            while skip > 0:
+                skip -= len(read_exactly(min(skip, _WAVE_SKIP_BLOCK_SIZE)))
+
+    if num_channels is None:
+        raise OctopusIOError("WAV stream has no `fmt ` chunk before its `data` chunk.")
+
+    return OctopusWavHeader(
+        num_channels=num_channels,
+        sample_rate=sample_rate,
+        num_data_bytes=None if chunk_size == _WAVE_UNKNOWN_DATA_SIZE else chunk_size)
+
+
+def _read_wav_duration_sec(path: str) -> Optional[float]:
+    """
+    Length of a 16-bit PCM WAV file in seconds, read from its header. `None` for files that are not, including the
+    compressed formats the engine decodes itself, whose length is not known without decoding them.
+    """
+
+    try:
+        with open(path, 'rb') as f:
+            header = read_wav_header(f)
+            num_data_bytes = header.num_data_bytes
+            if num_data_bytes is None:
+                num_data_bytes = os.fstat(f.fileno()).st_size - f.tell()
+    except (OSError, OctopusError):
+        return None
+    if header.num_channels == 0 or header.sample_rate == 0:
+        return None
+
+    return (num_data_bytes // (2 * header.num_channels)) / header.sample_rate
+
+
 class OctopusMetadata(object):
     """
     Python representation of the metadata object.
@@ -113,12 +201,101 @@ class OctopusMetadata(object):
         handle = cast(byte_ptr, c_void_p)
         return cls(handle=handle, size=len(metadata_bytes))
 
+    @classmethod
+    def from_buffer(cls, metadata_buffer: Any) -> 'OctopusMetadata':
+        """
+        Wraps serialized metadata without copying it.
+
+        :param metadata_buffer: A writable buffer holding serialized metadata (e.g. `bytearray` or `mmap.mmap`). The
+        buffer must remain unchanged for the lifetime of the returned object.
+        :return metadata: A metadata object backed by `metadata_buffer`.
+        """
+
+        byte_ptr = (c_byte * len(metadata_buffer)).from_buffer(metadata_buffer)
+        handle = cast(byte_ptr, c_void_p)
+        return cls(handle=handle, size=len(metadata_buffer))
+
     @staticmethod
     def _to_bytes(ptr: c_void_p, size: int) -> bytes:
         # noinspection PyTypeChecker
         return bytes(cast(ptr, POINTER(c_byte * size)).contents)
 
 
+class OctopusPackedMetadata(object):
+    """
+    Metadata of several clips indexed as one recording by `Octopus.index_many()`, together with the position of each
+    clip in it.
+    """
+
+    _HEADER_STRUCT = struct.Struct('<Id')
+    _CLIP_STRUCT = struct.Struct('<dd')
+
+    def __init__(self, metadata: OctopusMetadata, clips: Sequence[Tuple[float, float]], guard_sec: float) -> None:
+        self._metadata = metadata
+        self._clips = tuple(clips)
+        self._guard_sec = guard_sec
+
+    @property
+    def metadata(self) -> OctopusMetadata:
+        """Metadata of the packed recording."""
+
+        return self._metadata
+
+    @property
+    def clips(self) -> Sequence[Tuple[float, float]]:
+        """Start and end of each clip in the packed recording in seconds."""
+
+        return self._clips
+
+    def __len__(self) -> int:
+        return len(self._clips)
+
+    def split(self, matches: Dict[str, Sequence['Octopus.Match']]) -> Sequence[Dict[str, Sequence['Octopus.Match']]]:
+        """
+        Assigns matches found in `.metadata` to clips. Match times are made relative to the start of their clip and
+        matches that cross from one clip into the next are dropped.
+
+        :param matches: Matches returned by searching `.metadata`.
+        :return: Matches of each clip, in the order the clips were given to `Octopus.index_many()`.
+        """
+
+        clip_matches = [dict() for _ in self._clips]
+        starts = [x[0] for x in self._clips]
+        # Engine timestamps may extend somewhat into the silence around a clip.
+        tolerance_sec = self._guard_sec / 2
+
+        for phrase, phrase_matches in matches.items():
+            for match in phrase_matches:
+                index = bisect.bisect_right(starts, match.start_sec + tolerance_sec) - 1
+                if index < 0:
+                    continue
+                start_sec, end_sec = self._clips[index]
+                if match.end_sec > end_sec + tolerance_sec:
+                    continue
+                clip_matches[index].setdefault(phrase, list()).append(Octopus.Match(
+                    start_sec=max(0., match.start_sec - start_sec),
+                    end_sec=min(end_sec - start_sec, match.end_sec - start_sec),
+                    probability=match.probability))
+
+        return clip_matches
+
+    def to_bytes(self) -> bytes:
+        parts = [self._HEADER_STRUCT.pack(len(self._clips), self._guard_sec)]
+        parts.extend(self._CLIP_STRUCT.pack(*x) for x in self._clips)
+        parts.append(self._metadata.to_bytes())
+        return b''.join(parts)
+
+    @classmethod
+    def from_bytes(cls, packed_metadata_bytes: bytes) -> 'OctopusPackedMetadata':
+        num_clips, guard_sec = cls._HEADER_STRUCT.unpack_from(packed_metadata_bytes)
+        offset = cls._HEADER_STRUCT.size
+        clips = list()
+        for _ in range(num_clips):
+            clips.append(cls._CLIP_STRUCT.unpack_from(packed_metadata_bytes, offset))
+            offset += cls._CLIP_STRUCT.size
+        return cls(OctopusMetadata.from_bytes(packed_metadata_bytes[offset:]), clips, guard_sec)
+
+
 class Octopus(object):
     """
     Python binding for Octopus Speech-to-Index engine.
@@ -262,9 +439,23 @@ class Octopus(object):
 
         self._sample_rate = library.pv_sample_rate()
 
+        self._init_args = (access_key, model_path, library_path)
+        self._trace_recorder = None
+        self._search_helpers = list()
+        self._search_executor = None
+        self._num_search_threads = 0
+
     def delete(self) -> None:
         """Releases resources acquired by Octopus."""
 
+        if self._search_executor is not None:
+            self._search_executor.shutdown()
+            self._search_executor = None
+            self._num_search_threads = 0
+        for helper in self._search_helpers:
+            helper.delete()
+        self._search_helpers.clear()
+
         self._delete_func(self._handle)
 
     def index_audio_data(self, pcm: Sequence[int]) -> OctopusMetadata:
@@ -272,25 +463,29 @@ class Octopus(object):
         Indexes audio data.
 
         :param pcm: Audio data. The audio needs to have a sample rate equal to `.sample_rate` and be 16-bit
-        linearly-encoded. Octopus operates on single-channel audio.
+        linearly-encoded. Octopus operates on single-channel audio. Buffers of 16-bit integers (e.g. `array.array('h')`
+        or a writable `memoryview` cast to `'h'`) are passed to the engine without being converted or, when writable,
+        copied.
         :return metadata: An immutable metadata object.
         """
 
-        metadata_size = c_int32()
-        status = self._index_size_func(
-            self._handle,
-            c_int32(len(pcm)),
-            byref(metadata_size))
-        if status is not self.PicovoiceStatuses.SUCCESS:
-            raise self._PICOVOICE_STATUS_TO_EXCEPTION[status](
-                message='Index size failed',
-                message_stack=self._get_error_stack())
+        if self._trace_recorder is not None:
+            return self._trace_recorder.record(
+                'index_audio_data',
+                self._index_audio_data,
+                pcm,
+                num_samples=len(pcm),
+                audio_sec=len(pcm) / self._sample_rate)
+        return self._index_audio_data(pcm)
 
-        metadata_bytes = create_string_buffer(metadata_size.value)
+    def _index_audio_data(self, pcm: Sequence[int]) -> OctopusMetadata:
+        metadata_size = self.index_audio_data_size(len(pcm))
+
+        metadata_bytes = create_string_buffer(metadata_size)
         metadata_bytes_ptr = cast(metadata_bytes, c_void_p)
         status = self._index_func(
             self._handle,
-            (c_short * len(pcm))(*pcm),
+            self._pcm_to_c_array(pcm),
             c_int32(len(pcm)),
             metadata_bytes_ptr)
         if status is not self.PicovoiceStatuses.SUCCESS:
@@ -298,14 +493,82 @@ class Octopus(object):
                 message='Index failed',
                 message_stack=self._get_error_stack())
 
-        return OctopusMetadata(metadata_bytes_ptr, metadata_size.value)
+        return OctopusMetadata(metadata_bytes_ptr, metadata_size)
 
-    def index_audio_file(self, path: str) -> OctopusMetadata:
+    def index_many(self, clips: Iterable[Sequence[int]], guard_sec: float = 1.) -> OctopusPackedMetadata:
         """
-        Indexes audio file.
+        Indexes many short clips of audio data with one engine call. Clips are concatenated with silence between them,
+        which saves the per-call overhead that dominates indexing of clips a few seconds long. Search the result with
+        `.search_many()`. The packed recording is limited in length like any other audio data, so very many clips
+        should be indexed in batches.
+
+        :param clips: Audio data of each clip. See `.index_audio_data()`.
+        :param guard_sec: Silence between clips in seconds.
+        :return: Packed metadata of all clips.
+        """
+
+        if guard_sec < 0:
+            raise OctopusInvalidArgumentError("`guard_sec` should be non-negative.")
+
+        guard = array('h', bytes(2 * int(guard_sec * self._sample_rate)))
+        pcm = array('h')
+        offsets = list()
+        for clip in clips:
+            if len(pcm) > 0:
+                pcm.extend(guard)
+            start = len(pcm)
+            if isinstance(clip, array) and clip.typecode == 'h':
+                pcm.extend(clip)
+            else:
+                pcm.extend(array('h', clip))
+            offsets.append((start / self._sample_rate, len(pcm) / self._sample_rate))
+
+        if len(offsets) == 0:
+            raise OctopusInvalidArgumentError("`clips` should not be empty.")
+
+        return OctopusPackedMetadata(self.index_audio_data(pcm), offsets, guard_sec)
+
+    def search_many(
+            self,
+            packed_metadata: OctopusPackedMetadata,
+            phrases: Iterable[str]) -> Sequence[Dict[str, Sequence['Octopus.Match']]]:
+        """
+        Searches clips indexed by `.index_many()`.
+
+        :param packed_metadata: Packed metadata object.
+        :param phrases: An iterable of phrases to search the index for.
+        :return: Matches of each clip, with times relative to the start of the clip.
+        """
+
+        return packed_metadata.split(self.search(packed_metadata.metadata, phrases))
+
+    def index_audio_data_size(self, num_samples: int) -> int:
+        """
+        Size of the metadata that indexing audio data produces, without indexing it. It grows with the length of the
+        audio, which makes it a cheap estimate of the cost of indexing.
+
+        :param num_samples: Number of samples.
+        :return: Size of the metadata in bytes.
+        """
+
+        metadata_size = c_int32()
+        status = self._index_size_func(
+            self._handle,
+            c_int32(num_samples),
+            byref(metadata_size))
+        if status is not self.PicovoiceStatuses.SUCCESS:
+            raise self._PICOVOICE_STATUS_TO_EXCEPTION[status](
+                message='Index size failed',
+                message_stack=self._get_error_stack())
+
+        return metadata_size.value
+
+    def index_audio_file_size(self, path: str) -> int:
+        """
+        Size of the metadata that indexing an audio file produces, without indexing it. See `.index_audio_data_size()`.
 
         :param path: Absolute path to the audio file.
-        :return metadata: An immutable metadata object.
+        :return: Size of the metadata in bytes.
         """
 
         if not os.path.exists(path):
@@ -321,7 +584,40 @@ class Octopus(object):
                 message='Index file size failed',
                 message_stack=self._get_error_stack())
 
-        metadata_bytes = create_string_buffer(metadata_size.value)
+        return metadata_size.value
+
+    def index_audio_file(self, path: str) -> OctopusMetadata:
+        """
+        Indexes audio file.
+
+        :param path: Absolute path to the audio file.
+        :return metadata: An immutable metadata object.
+        """
+
+        if self._trace_recorder is not None:
+            return self._trace_recorder.record(
+                'index_audio_file',
+                self._index_audio_file,
+                path,
+                content=dict(path=path),
+                **self._audio_file_trace_fields(path))
+        return self._index_audio_file(path)
+
+    def _audio_file_trace_fields(self, path: str) -> Dict[str, Any]:
+        if not os.path.exists(path):
+            return dict(file_bytes=None)
+
+        fields = dict(file_bytes=os.path.getsize(path))
+        audio_sec = _read_wav_duration_sec(path)
+        if audio_sec is not None:
+            fields['num_samples'] = int(round(audio_sec * self._sample_rate))
+            fields['audio_sec'] = audio_sec
+        return fields
+
+    def _index_audio_file(self, path: str) -> OctopusMetadata:
+        metadata_size = self.index_audio_file_size(path)
+
+        metadata_bytes = create_string_buffer(metadata_size)
         metadata_bytes_ptr = cast(metadata_bytes, c_void_p)
         status = self._index_file_func(
             self._handle,
@@ -332,7 +628,88 @@ class Octopus(object):
                 message='Index file failed',
                 message_stack=self._get_error_stack())
 
-        return OctopusMetadata(metadata_bytes_ptr, metadata_size.value)
+        return OctopusMetadata(metadata_bytes_ptr, metadata_size)
+
+    _STREAM_BLOCK_SIZE = 64 * 1024
+
+    def index_audio_stream(self, stream: Any, is_wav: bool = True) -> OctopusMetadata:
+        """
+        Indexes audio read from a file-like object, e.g. an HTTP upload or an object store reader. The stream is read
+        sequentially in fixed-size blocks and is never seeked, and samples are decoded straight into the buffer handed
+        to the engine. The engine indexes complete recordings, so that buffer (2 bytes per sample) is the only part of
+        memory use that grows with the input.
+
+        :param stream: A readable binary file-like object.
+        :param is_wav: Whether the stream holds a 16-bit PCM WAV file at `.sample_rate`. Only the first channel of
+        multi-channel files is indexed. Otherwise the stream holds raw single-channel 16-bit little-endian samples at
+        `.sample_rate`.
+        :return metadata: An immutable metadata object.
+        """
+
+        num_channels = 1
+        num_bytes = None
+        if is_wav:
+            header = read_wav_header(stream)
+            if header.sample_rate != self.sample_rate:
+                raise OctopusInvalidArgumentError(
+                    "Audio stream should have a sample rate of %d, got %d" % (self.sample_rate, header.sample_rate))
+            num_channels, num_bytes = header.num_channels, header.num_data_bytes
+
+        frame_size = 2 * num_channels
+        if num_bytes is not None:
+            num_bytes -= num_bytes % frame_size
+            pcm = bytearray(num_bytes // num_channels)
+        else:
+            pcm = bytearray()
+        block = bytearray(self._STREAM_BLOCK_SIZE - self._STREAM_BLOCK_SIZE % frame_size)
+        block_view = memoryview(block)
+
+        def readinto(view: memoryview) -> int:
+            if hasattr(stream, 'readinto'):
+                return stream.readinto(view)
+            data = stream.read(len(view))
+            view[:len(data)] = data
+            return len(data)
+
+        num_samples = 0
+        remaining = num_bytes
+        pending = 0
+        while remaining is None or remaining > 0:
+            size = len(block) if remaining is None else min(len(block), pending + remaining)
+            num_read = readinto(block_view[pending:size])
+            if not num_read:
+                break
+            pending += num_read
+            if remaining is not None:
+                remaining -= num_read
+
+            num_frames = pending // frame_size
+            if num_frames == 0:
+                continue
+            frames = block_view[:num_frames * frame_size].cast('h')[::num_channels]
+            if len(pcm) < (num_samples + num_frames) * 2:
+                pcm.extend(bytes(max(num_frames * 2, len(pcm))))
+            memoryview(pcm)[num_samples * 2:(num_samples + num_frames) * 2].cast('h')[:] = frames
+            frames.release()
+            num_samples += num_frames
+
+            leftover = pending - num_frames * frame_size
+            block_view[:leftover] = block_view[num_frames * frame_size:pending]
+            pending = leftover
+
+        if num_samples == 0:
+            raise OctopusInvalidArgumentError("Audio stream has no samples")
+
+        if len(pcm) > num_samples * 2:
+            del pcm[num_samples * 2:]
+        samples = memoryview(pcm).cast('h')
+        if sys.byteorder != 'little':
+            swapped = array('h')
+            swapped.frombytes(pcm)
+            swapped.byteswap()
+            samples[:] = swapped
+
+        return self.index_audio_data(samples)
 
     Match = namedtuple('Match', ['start_sec', 'end_sec', 'probability'])
 
@@ -342,48 +719,92 @@ class Octopus(object):
             ("end_sec", c_float),
             ("probability", c_float)]
 
-    def search(self, metadata: OctopusMetadata, phrases: Iterable[str]) -> Dict[str, Sequence[Match]]:
+    def search(
+            self,
+            metadata: OctopusMetadata,
+            phrases: Iterable[str],
+            workers: int = 1) -> Dict[str, Sequence[Match]]:
         """
         Searches metadata for occurrences of given phrases.
 
         :param metadata: Metadata object.
         :param phrases: An iterable of phrases to search the index for.
+        :param workers: Number of threads that search for the phrases in parallel, each with its own engine instance
+        and all reading the same metadata. Instances beyond this one are created on first use with the same
+        parameters and kept until `.delete()`.
         :return matches: A dictionary map of found matches.
         """
 
-        phrases_set = set(' '.join(x.strip().split()) for x in phrases)
+        if self._trace_recorder is not None:
+            phrases = list(phrases)
+            return self._trace_recorder.record(
+                'search',
+                self._search,
+                metadata,
+                phrases,
+                workers,
+                metadata_bytes=metadata.size,
+                num_phrases=len(phrases),
+                phrase_words=[len(x.split()) for x in phrases],
+                phrase_chars=[len(x) for x in phrases],
+                workers=workers,
+                content=dict(phrases=phrases))
+        return self._search(metadata, phrases, workers)
+
+    def _search(self, metadata: OctopusMetadata, phrases: Iterable[str], workers: int) -> Dict[str, Sequence[Match]]:
+        if not isinstance(workers, int) or workers < 1:
+            raise OctopusInvalidArgumentError("`workers` should be a positive integer.")
+
+        prepared_query = self.prepare(phrases)
+        phrases = prepared_query.phrases
+        workers = min(workers, len(phrases))
+        if workers < 2:
+            return prepared_query._search(metadata)
+
+        while len(self._search_helpers) < workers - 1:
+            self._search_helpers.append(Octopus(*self._init_args))
+        if self._num_search_threads < workers - 1:
+            if self._search_executor is not None:
+                self._search_executor.shutdown()
+            self._search_executor = ThreadPoolExecutor(max_workers=workers - 1)
+            self._num_search_threads = workers - 1
+
+        # Phrases are dealt out in turn so that long and short ones are spread across workers.
+        prepared_queries = [
+            x.prepare(phrases[i::workers]) for i, x in enumerate([self] + self._search_helpers[:workers - 1])]
+        futures = [self._search_executor.submit(x._search, metadata) for x in prepared_queries[1:]]
+        worker_matches = prepared_queries[0]._search(metadata)
+        for future in futures:
+            worker_matches.update(future.result())
+
+        return {x: worker_matches[x] for x in phrases if x in worker_matches}
+
+    def set_trace_recorder(self, trace_recorder: Optional[Any]) -> None:
+        """
+        Starts logging the timing and sizes of `.search()`, `.index_audio_*()` and prepared query searches to a trace
+        recorder, or stops logging with `None`. Operations built on these, such as `.index_many()`, are logged as the
+        calls they make.
 
-        if any(len(x) == 0 for x in phrases_set):
-            raise OctopusInvalidArgumentError("Search phrase cannot be empty")
+        :param trace_recorder: An `OctopusTraceRecorder`, or `None`.
+        """
 
-        matches = dict()
+        self._trace_recorder = trace_recorder
 
-        for phrase in phrases_set:
-            c_phrase_matches = POINTER(self.CMatch)()
-            num_phrase_matches = c_int32()
-            status = self._search_func(
-                self._handle,
-                metadata.handle,
-                metadata.size,
-                phrase.encode('utf-8'),
-                byref(c_phrase_matches),
-                byref(num_phrase_matches))
-            if status is not self.PicovoiceStatuses.SUCCESS:
-                raise self._PICOVOICE_STATUS_TO_EXCEPTION[status](
-                    message='Search failed',
-                    message_stack=self._get_error_stack())
-            if num_phrase_matches.value > 0:
-                phrase_matches = list()
-                for i in range(num_phrase_matches.value):
-                    match = self.Match(
-                        start_sec=c_phrase_matches[i].start_sec,
-                        end_sec=c_phrase_matches[i].end_sec,
-                        probability=c_phrase_matches[i].probability)
-                    phrase_matches.append(match)
-                matches[phrase] = phrase_matches
-            self._matches_delete_func(c_phrase_matches)
+    @property
+    def trace_recorder(self) -> Optional[Any]:
+        """Trace recorder set by `.set_trace_recorder()`, if any."""
 
-        return matches
+        return self._trace_recorder
+
+    def prepare(self, phrases: Iterable[str]) -> 'OctopusPreparedQuery':
+        """
+        Normalizes, validates and encodes phrases once so that they can be searched for in many metadata objects.
+
+        :param phrases: An iterable of phrases to search the index for.
+        :return: A prepared query bound to this instance.
+        """
+
+        return OctopusPreparedQuery(self, phrases)
 
     @property
     def version(self) -> str:
@@ -397,6 +818,21 @@ class Octopus(object):
 
         return self._sample_rate
 
+    _PCM_BUFFER_FORMATS = {'h', '=h', '@h', '<h' if sys.byteorder == 'little' else '>h'}
+
+    @classmethod
+    def _pcm_to_c_array(cls, pcm: Sequence[int]) -> Array:
+        try:
+            view = memoryview(pcm)
+        except TypeError:
+            return (c_short * len(pcm))(*pcm)
+
+        if view.format not in cls._PCM_BUFFER_FORMATS or not view.c_contiguous:
+            return (c_short * len(pcm))(*pcm)
+        if view.readonly:
+            return (c_short * len(view)).from_buffer_copy(view)
+        return (c_short * len(view)).from_buffer(view)
+
     def _get_error_stack(self) -> Sequence[str]:
         message_stack_ref = POINTER(c_char_p)()
         message_stack_depth = c_int()
@@ -413,6 +849,88 @@ class Octopus(object):
         return message_stack
 
 
+class OctopusPreparedQuery(object):
+    """
+    Phrases that have been normalized, validated and encoded for the engine once, together with preallocated output
+    parameters, so that searching many metadata objects for the same phrases only pays for the engine calls. Created by
+    `Octopus.prepare()`. A prepared query is bound to the Octopus instance that created it and, like that instance, must
+    not be used from several threads at once.
+    """
+
+    def __init__(self, octopus: Octopus, phrases: Iterable[str]) -> None:
+        phrases = tuple(dict.fromkeys(' '.join(x.strip().split()) for x in phrases))
+
+        if any(len(x) == 0 for x in phrases):
+            raise OctopusInvalidArgumentError("Search phrase cannot be empty")
+
+        self._octopus = octopus
+        self._phrases = phrases
+        self._c_phrases = tuple(c_char_p(x.encode('utf-8')) for x in phrases)
+        self._c_matches = POINTER(Octopus.CMatch)()
+        self._num_matches = c_int32()
+        self._c_matches_ref = byref(self._c_matches)
+        self._num_matches_ref = byref(self._num_matches)
+
+    @property
+    def phrases(self) -> Sequence[str]:
+        """Normalized and deduplicated phrases."""
+
+        return self._phrases
+
+    def search(self, metadata: OctopusMetadata) -> Dict[str, Sequence[Octopus.Match]]:
+        """
+        Searches metadata for occurrences of the prepared phrases.
+
+        :param metadata: Metadata object.
+        :return matches: A dictionary map of found matches.
+        """
+
+        trace_recorder = self._octopus._trace_recorder
+        if trace_recorder is not None:
+            return trace_recorder.record(
+                'search',
+                self._search,
+                metadata,
+                metadata_bytes=metadata.size,
+                num_phrases=len(self._phrases),
+                phrase_words=[len(x.split()) for x in self._phrases],
+                phrase_chars=[len(x) for x in self._phrases],
+                workers=1,
+                content=dict(phrases=list(self._phrases)))
+        return self._search(metadata)
+
+    def _search(self, metadata: OctopusMetadata) -> Dict[str, Sequence[Octopus.Match]]:
+        octopus = self._octopus
+        search_func = octopus._search_func
+        matches_delete_func = octopus._matches_delete_func
+        match = Octopus.Match
+        handle = octopus._handle
+        metadata_handle = metadata.handle
+        metadata_size = metadata.size
+        c_matches = self._c_matches
+        num_matches = self._num_matches
+
+        matches = dict()
+        for phrase, c_phrase in zip(self._phrases, self._c_phrases):
+            status = search_func(
+                handle,
+                metadata_handle,
+                metadata_size,
+                c_phrase,
+                self._c_matches_ref,
+                self._num_matches_ref)
+            if status is not Octopus.PicovoiceStatuses.SUCCESS:
+                raise octopus._PICOVOICE_STATUS_TO_EXCEPTION[status](
+                    message='Search failed',
+                    message_stack=octopus._get_error_stack())
+            if num_matches.value > 0:
+                matches[phrase] = [
+                    match(x.start_sec, x.end_sec, x.probability) for x in c_matches[:num_matches.value]]
+            matches_delete_func(c_matches)
+
+        return matches
+
+
 __all__ = [
     'OctopusError',
     'OctopusMemoryError',
@@ -426,6 +944,10 @@ __all__ = [
     'OctopusActivationLimitError',
     'OctopusActivationThrottledError',
     'OctopusActivationRefusedError',
+    'OctopusWavHeader',
     'OctopusMetadata',
+    'OctopusPackedMetadata',
     'Octopus',
+    'OctopusPreparedQuery',
+    'read_wav_header',
 ]
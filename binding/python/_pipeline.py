@@ -0,0 +1,500 @@
+#
+# Copyright 2023 Picovoice Inc.
+#
+# You may not use this file except in compliance with the license. A copy of the license is located in the "LICENSE"
+# file accompanying this source.
+#
+# Unless required by applicable law or agreed to in writing, software distributed under the License is distributed on
+# an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the License for the
+# specific language governing permissions and limitations under the License.
+#
+
+import os
+import queue
+import sys
+import threading
+import time
+from array import array
+from collections import deque, namedtuple
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Callable, Iterable, Iterator, Optional, Sequence, Tuple
+
+from ._audio import _open_wav
+from ._corpus import METADATA_FILE_EXTENSION
+from ._octopus import OctopusInvalidArgumentError, OctopusInvalidStateError, OctopusMetadata
+from ._pool import OctopusPool
+
+OctopusAudioBlock = namedtuple('OctopusAudioBlock', ['key', 'pcm', 'sample_rate', 'num_channels', 'is_last'])
+OctopusAudioBlock.__doc__ = """
+Block of 16-bit audio of one recording passed between pipeline stages. `pcm` is an `array.array('h')` of interleaved
+samples. `is_last` marks the last block of the recording identified by `key`.
+"""
+
+_END = object()
+
+
+class _Stage(object):
+    def __init__(self, name: str, function: Callable, is_map: bool, workers: int, executor: str) -> None:
+        self.name = name
+        self.function = function
+        self.is_map = is_map
+        self.workers = workers
+        self.executor = executor
+        self.input = None
+        self.output = None
+        self.num_in = 0
+        self.num_out = 0
+        self.busy_sec = 0.
+        self.max_queue_depth = 0
+        self.start_time = None
+        self.end_time = None
+
+
+class OctopusPipeline(object):
+    """
+    Streaming pipeline of stages connected by bounded queues. Each stage runs on its own thread and processes items as
+    they arrive, so a recording flows through all stages block by block rather than each stage making a full pass over
+    it. A stage that falls behind fills its input queue, which blocks the stages before it, so at most `queue_size`
+    items wait between any two stages.
+
+    Stages are either maps, which turn each item into zero or one items and can run on a pool of threads or processes,
+    or transforms, which turn the stream of items into another stream and can keep state between items. `.stats()`
+    reports how busy each stage is; the busiest stage is the bottleneck.
+    """
+
+    StageStats = namedtuple('StageStats', [
+        'name',
+        'num_in',
+        'num_out',
+        'busy_sec',
+        'utilization',
+        'items_per_sec',
+        'queue_depth',
+        'max_queue_depth'])
+
+    EXECUTORS = ('thread', 'process')
+
+    def __init__(self, source: Iterable[Any], queue_size: int = 8) -> None:
+        """
+        Constructor.
+
+        :param source: Items fed to the first stage, e.g. `read_wav_blocks()`.
+        :param queue_size: Maximum number of items waiting in front of each stage.
+        """
+
+        if not isinstance(queue_size, int) or queue_size < 1:
+            raise OctopusInvalidArgumentError("`queue_size` should be a positive integer.")
+
+        self._source = source
+        self._queue_size = queue_size
+        self._stages = list()
+        self._started = False
+        self._cancelled = threading.Event()
+        self._error = None
+
+    def map(
+            self,
+            function: Callable[[Any], Any],
+            name: Optional[str] = None,
+            workers: int = 1,
+            executor: str = 'thread') -> 'OctopusPipeline':
+        """
+        Adds a stage that calls `function` on each item and passes on its result. Items for which it returns `None` are
+        dropped. With several workers items are processed in parallel and passed on in their original order.
+
+        :param function: Function of one item. Must be picklable for the `'process'` executor.
+        :param name: Name of the stage in `.stats()`.
+        :param workers: Number of items processed in parallel.
+        :param executor: Whether workers are threads or processes. One of `EXECUTORS`.
+        :return: The pipeline.
+        """
+
+        if not isinstance(workers, int) or workers < 1:
+            raise OctopusInvalidArgumentError("`workers` should be a positive integer.")
+        if executor not in self.EXECUTORS:
+            raise OctopusInvalidArgumentError("`executor` should be one of %s." % ', '.join(self.EXECUTORS))
+
+        return self._add(_Stage(self._stage_name(name, function), function, True, workers, executor))
+
+    def transform(
+            self,
+            function: Callable[[Iterator[Any]], Iterable[Any]],
+            name: Optional[str] = None) -> 'OctopusPipeline':
+        """
+        Adds a stage that passes the stream of items through `function`, e.g. a generator that buffers or splits items.
+
+        :param function: Function of an iterator of items returning an iterable of items.
+        :param name: Name of the stage in `.stats()`.
+        :return: The pipeline.
+        """
+
+        return self._add(_Stage(self._stage_name(name, function), function, False, 1, 'thread'))
+
+    def _stage_name(self, name: Optional[str], function: Callable) -> str:
+        if name is not None:
+            return name
+        return getattr(function, '__name__', type(function).__name__)
+
+    def _add(self, stage: _Stage) -> 'OctopusPipeline':
+        if self._started:
+            raise OctopusInvalidStateError("Stages cannot be added to a running pipeline.")
+        self._stages.append(stage)
+        return self
+
+    def _put(self, stage: Optional[_Stage], q: queue.Queue, item: Any) -> float:
+        start = time.perf_counter()
+        while not self._cancelled.is_set():
+            try:
+                q.put(item, timeout=0.1)
+                break
+            except queue.Full:
+                continue
+        if stage is not None:
+            stage.max_queue_depth = max(stage.max_queue_depth, q.qsize())
+        return time.perf_counter() - start
+
+    def _get(self, q: queue.Queue) -> Tuple[Any, float]:
+        start = time.perf_counter()
+        while not self._cancelled.is_set():
+            try:
+                return q.get(timeout=0.1), time.perf_counter() - start
+            except queue.Empty:
+                continue
+        return _END, time.perf_counter() - start
+
+    def _feed(self) -> None:
+        first = self._stages[0] if len(self._stages) > 0 else None
+        try:
+            for item in self._source:
+                if self._cancelled.is_set():
+                    return
+                self._put(first, self._output_of_source, item)
+        except BaseException as e:
+            self._fail(e)
+        self._put(first, self._output_of_source, _END)
+
+    def _fail(self, error: BaseException) -> None:
+        if self._error is None:
+            self._error = error
+        self._cancelled.set()
+
+    def _run_stage(self, stage: _Stage) -> None:
+        stage.start_time = time.perf_counter()
+        next_stage = self._stages.index(stage) + 1
+        next_stage = self._stages[next_stage] if next_stage < len(self._stages) else None
+        wait_sec = 0.
+
+        def emit(result: Any) -> None:
+            nonlocal wait_sec
+            stage.num_out += 1
+            wait_sec += self._put(next_stage, stage.output, result)
+
+        def items() -> Iterator[Any]:
+            nonlocal wait_sec
+            while True:
+                item, item_wait_sec = self._get(stage.input)
+                wait_sec += item_wait_sec
+                if item is _END:
+                    return
+                stage.num_in += 1
+                yield item
+
+        try:
+            if not stage.is_map:
+                for result in stage.function(items()):
+                    emit(result)
+            elif stage.workers == 1:
+                for item in items():
+                    result = stage.function(item)
+                    if result is not None:
+                        emit(result)
+            else:
+                executor_class = ThreadPoolExecutor if stage.executor == 'thread' else ProcessPoolExecutor
+                with executor_class(max_workers=stage.workers) as executor:
+                    pending = deque()
+                    for item in items():
+                        pending.append(executor.submit(stage.function, item))
+                        if len(pending) >= 2 * stage.workers:
+                            result = pending.popleft().result()
+                            if result is not None:
+                                emit(result)
+                    while len(pending) > 0:
+                        result = pending.popleft().result()
+                        if result is not None:
+                            emit(result)
+        except BaseException as e:
+            self._fail(e)
+        finally:
+            stage.end_time = time.perf_counter()
+            stage.busy_sec = stage.end_time - stage.start_time - wait_sec
+            self._put(None, stage.output, _END)
+
+    def run(self) -> Iterator[Any]:
+        """
+        Starts all stages and yields the items coming out of the last one. Raises the first error of any stage. A
+        pipeline can be run once.
+
+        :return: An iterator of results.
+        """
+
+        if self._started:
+            raise OctopusInvalidStateError("Pipeline has already been run.")
+        self._started = True
+
+        queues = [queue.Queue(maxsize=self._queue_size) for _ in range(len(self._stages) + 1)]
+        self._output_of_source = queues[0]
+        for i, stage in enumerate(self._stages):
+            stage.input = queues[i]
+            stage.output = queues[i + 1]
+
+        threads = [threading.Thread(target=self._feed, daemon=True)]
+        threads.extend(threading.Thread(target=self._run_stage, args=(x,), daemon=True) for x in self._stages)
+        for thread in threads:
+            thread.start()
+
+        try:
+            while True:
+                item, _ = self._get(queues[-1])
+                if item is _END:
+                    break
+                yield item
+        finally:
+            self._cancelled.set()
+            for thread in threads:
+                thread.join()
+
+        if self._error is not None:
+            raise self._error
+
+    def stats(self) -> Sequence['OctopusPipeline.StageStats']:
+        """
+        Items processed by each stage so far, the fraction of time it was busy rather than waiting for input or for room
+        in the next queue, and the current and maximum number of items waiting in front of it.
+        """
+
+        stats = list()
+        now = time.perf_counter()
+        for stage in self._stages:
+            if stage.start_time is None:
+                elapsed_sec = 0.
+            else:
+                elapsed_sec = (now if stage.end_time is None else stage.end_time) - stage.start_time
+            stats.append(self.StageStats(
+                name=stage.name,
+                num_in=stage.num_in,
+                num_out=stage.num_out,
+                busy_sec=stage.busy_sec,
+                utilization=stage.busy_sec / elapsed_sec if elapsed_sec > 0 and stage.end_time is not None else 0.,
+                items_per_sec=stage.num_out / elapsed_sec if elapsed_sec > 0 else 0.,
+                queue_depth=stage.input.qsize() if stage.input is not None else 0,
+                max_queue_depth=stage.max_queue_depth))
+        return stats
+
+
+def read_wav_blocks(paths: Iterable[str], block_sec: float = 1.) -> Iterator[OctopusAudioBlock]:
+    """
+    Reads 16-bit WAV files in blocks, one file after the other.
+
+    :param paths: Paths to WAV files. Each path is the key of its blocks.
+    :param block_sec: Length of each block in seconds.
+    :return: An iterator of audio blocks.
+    """
+
+    for path in paths:
+        with _open_wav(path) as f:
+            sample_rate = f.getframerate()
+            num_channels = f.getnchannels()
+            block_frames = max(1, int(block_sec * sample_rate))
+            remaining = f.getnframes()
+
+            while True:
+                frames = f.readframes(min(block_frames, remaining))
+                remaining -= len(frames) // (2 * num_channels)
+                pcm = array('h')
+                pcm.frombytes(frames)
+                if sys.byteorder != 'little':
+                    pcm.byteswap()
+                yield OctopusAudioBlock(path, pcm, sample_rate, num_channels, remaining <= 0 or len(frames) == 0)
+                if remaining <= 0 or len(frames) == 0:
+                    break
+
+
+def downmix_block(block: OctopusAudioBlock) -> OctopusAudioBlock:
+    """
+    Averages the channels of a block. Map stage.
+
+    :param block: Audio block.
+    :return: Single-channel audio block.
+    """
+
+    if block.num_channels == 1:
+        return block
+
+    num_channels = block.num_channels
+    channels = [block.pcm[i::num_channels] for i in range(num_channels)]
+    pcm = array('h', (sum(x) // num_channels for x in zip(*channels)))
+    return block._replace(pcm=pcm, num_channels=1)
+
+
+class OctopusResampler(object):
+    """
+    Converts single-channel blocks to another sample rate by linear interpolation, carrying the position between the
+    blocks of each recording. Transform stage. There is no anti-aliasing filter, which suits speech recorded at up to
+    three times the target rate.
+    """
+
+    def __init__(self, sample_rate: int) -> None:
+        """
+        Constructor.
+
+        :param sample_rate: Target sample rate, e.g. `octopus.sample_rate`.
+        """
+
+        self._sample_rate = sample_rate
+
+    def __call__(self, blocks: Iterator[OctopusAudioBlock]) -> Iterator[OctopusAudioBlock]:
+        # Per recording: last input sample of the previous block and position of the next output sample relative to it.
+        state = dict()
+        for block in blocks:
+            if block.num_channels != 1:
+                raise OctopusInvalidArgumentError("Resampling requires single-channel audio; downmix it first.")
+            if block.sample_rate == self._sample_rate:
+                yield block
+                continue
+
+            step = block.sample_rate / self._sample_rate
+            previous, position = state.pop(block.key, (None, 0.))
+            samples = block.pcm if previous is None else array('h', [previous]) + block.pcm
+
+            pcm = array('h')
+            last = len(samples) - 1
+            while position < last:
+                index = int(position)
+                fraction = position - index
+                pcm.append(int(samples[index] + (samples[index + 1] - samples[index]) * fraction))
+                position += step
+
+            if block.is_last:
+                if position <= last and len(samples) > 0:
+                    pcm.append(samples[last])
+            elif len(samples) > 0:
+                state[block.key] = (samples[last], position - last)
+
+            yield block._replace(pcm=pcm, sample_rate=self._sample_rate)
+
+
+class OctopusSilenceTrimmer(object):
+    """
+    Drops blocks whose peak amplitude is below a threshold, keeping the last block of each recording. Map stage. The
+    audio after trimming is shorter, so match times no longer line up with the original recording.
+    """
+
+    def __init__(self, threshold: int = 500) -> None:
+        """
+        Constructor.
+
+        :param threshold: Peak amplitude below which a block is silent.
+        """
+
+        self._threshold = threshold
+
+    def __call__(self, block: OctopusAudioBlock) -> Optional[OctopusAudioBlock]:
+        if block.is_last or (len(block.pcm) > 0 and max(max(block.pcm), -min(block.pcm)) >= self._threshold):
+            return block
+        return None
+
+
+def concatenate_blocks(blocks: Iterator[OctopusAudioBlock]) -> Iterator[OctopusAudioBlock]:
+    """
+    Joins the blocks of each recording into a single block, yielded once its last block has arrived. Transform stage.
+
+    :param blocks: Audio blocks, possibly of several interleaved recordings.
+    :return: An iterator of one block per recording.
+    """
+
+    pending = dict()
+    for block in blocks:
+        pcm = pending.setdefault(block.key, array('h'))
+        pcm.extend(block.pcm)
+        if block.is_last:
+            yield block._replace(pcm=pending.pop(block.key))
+
+
+class OctopusPoolIndexer(object):
+    """
+    Indexes whole single-channel recordings on instances borrowed from an `OctopusPool`. Map stage; use the `'thread'`
+    executor with as many workers as the pool has instances.
+    """
+
+    def __init__(self, pool: OctopusPool) -> None:
+        self._pool = pool
+
+    def __call__(self, block: OctopusAudioBlock) -> Tuple[str, OctopusMetadata]:
+        with self._pool.acquire() as octopus:
+            if block.num_channels != 1 or block.sample_rate != octopus.sample_rate:
+                raise OctopusInvalidArgumentError(
+                    "Audio of `%s` should be single-channel at %d Hz." % (block.key, octopus.sample_rate))
+            return block.key, octopus.index_audio_data(block.pcm)
+
+
+class OctopusMetadataWriter(object):
+    """
+    Writes `(key, metadata)` pairs to a directory, naming each file after its key without the extension. Map stage.
+    Keys under `input_directory` keep their path relative to it, so recordings with the same name in different
+    directories do not overwrite each other. Two keys that would still be written to the same file raise an error.
+    """
+
+    def __init__(self, directory: str, input_directory: Optional[str] = None) -> None:
+        """
+        Constructor.
+
+        :param directory: Output directory. It is created if it does not exist.
+        :param input_directory: Directory whose layout is mirrored in `directory`. Every key should be a path under it.
+        Files are named after the base name of their key if not set.
+        """
+
+        self._directory = directory
+        self._input_directory = input_directory
+        os.makedirs(directory, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._keys = dict()
+
+    def _relative_path(self, key: str) -> str:
+        if self._input_directory is None:
+            return os.path.basename(key)
+
+        relative_path = os.path.relpath(os.path.abspath(key), os.path.abspath(self._input_directory))
+        if relative_path == os.pardir or relative_path.startswith(os.pardir + os.sep):
+            raise OctopusInvalidArgumentError("`%s` is not under `%s`." % (key, self._input_directory))
+        return relative_path
+
+    def __call__(self, item: Tuple[str, OctopusMetadata]) -> str:
+        key, metadata = item
+        path = os.path.join(self._directory, os.path.splitext(self._relative_path(key))[0] + METADATA_FILE_EXTENSION)
+
+        with self._lock:
+            other_key = self._keys.setdefault(path, key)
+        if other_key != key:
+            raise OctopusInvalidArgumentError(
+                "Metadata of `%s` and `%s` would both be written to `%s`." % (other_key, key, path))
+
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.write(metadata.to_bytes())
+        os.replace(tmp_path, path)
+        return path
+
+
+__all__ = [
+    'OctopusAudioBlock',
+    'OctopusMetadataWriter',
+    'OctopusPipeline',
+    'OctopusPoolIndexer',
+    'OctopusResampler',
+    'OctopusSilenceTrimmer',
+    'concatenate_blocks',
+    'downmix_block',
+    'read_wav_blocks',
+]
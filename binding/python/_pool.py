@@ -0,0 +1,109 @@
+#
+# Copyright 2023 Picovoice Inc.
+#
+# You may not use this file except in compliance with the license. A copy of the license is located in the "LICENSE"
+# file accompanying this source.
+#
+# Unless required by applicable law or agreed to in writing, software distributed under the License is distributed on
+# an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the License for the
+# specific language governing permissions and limitations under the License.
+#
+
+import queue
+from contextlib import contextmanager
+from typing import Any, Iterator, Optional
+
+from ._factory import create
+from ._octopus import Octopus, OctopusInvalidArgumentError
+
+
+class OctopusPool(object):
+    """
+    Fixed-size pool of initialized Octopus instances that can be shared between threads. Each instance is used by at
+    most one thread at a time.
+    """
+
+    def __init__(
+            self,
+            access_key: str,
+            size: int,
+            model_path: Optional[str] = None,
+            library_path: Optional[str] = None) -> None:
+        """
+        Constructor.
+
+        :param access_key: AccessKey provided by Picovoice Console (https://console.picovoice.ai/)
+        :param size: Number of Octopus instances in the pool.
+        :param model_path: Absolute path to the file containing model parameters. If not set it will be set to the
+        default location for English model.
+        :param library_path: Absolute path to Octopus' dynamic library. If not set it will be set to the default
+        location.
+        """
+
+        if not isinstance(size, int) or size < 1:
+            raise OctopusInvalidArgumentError("`size` should be a positive integer.")
+
+        self._engines = list()
+        self._idle = queue.Queue()
+
+        try:
+            for _ in range(size):
+                octopus = create(access_key=access_key, model_path=model_path, library_path=library_path)
+                self._engines.append(octopus)
+                self._idle.put(octopus)
+        except Exception:
+            self.delete()
+            raise
+
+    @contextmanager
+    def acquire(self, timeout: Optional[float] = None) -> Iterator[Octopus]:
+        """
+        Borrows an idle Octopus instance for the duration of a `with` block.
+
+        :param timeout: Maximum time to wait for an idle instance in seconds. Waits indefinitely if not set.
+        :return: An Octopus instance owned by the caller until the block exits.
+        """
+
+        try:
+            octopus = self._idle.get(timeout=timeout)
+        except queue.Empty:
+            raise TimeoutError("No idle Octopus instance became available within %.3f seconds." % timeout)
+
+        try:
+            yield octopus
+        finally:
+            self._idle.put(octopus)
+
+    def delete(self) -> None:
+        """Releases resources acquired by all Octopus instances in the pool."""
+
+        for octopus in self._engines:
+            octopus.delete()
+        self._engines.clear()
+
+    def set_trace_recorder(self, trace_recorder: Optional[Any]) -> None:
+        """
+        Sets the trace recorder of every Octopus instance in the pool. See `Octopus.set_trace_recorder()`.
+
+        :param trace_recorder: An `OctopusTraceRecorder`, or `None`.
+        """
+
+        for octopus in self._engines:
+            octopus.set_trace_recorder(trace_recorder)
+
+    @property
+    def size(self) -> int:
+        """Number of Octopus instances in the pool."""
+
+        return len(self._engines)
+
+    @property
+    def num_idle(self) -> int:
+        """Number of Octopus instances that are not currently borrowed."""
+
+        return self._idle.qsize()
+
+
+__all__ = [
+    'OctopusPool',
+]
@@ -0,0 +1,325 @@
+#
+# Copyright 2023 Picovoice Inc.
+#
+# You may not use this file except in compliance with the license. A copy of the license is located in the "LICENSE"
+# file accompanying this source.
+#
+# Unless required by applicable law or agreed to in writing, software distributed under the License is distributed on
+# an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the License for the
+# specific language governing permissions and limitations under the License.
+#
+
+import abc
+import re
+from collections import namedtuple
+from typing import Dict, List, Sequence
+
+from ._octopus import Octopus, OctopusInvalidArgumentError, OctopusMetadata
+
+_TOKEN_PATTERN = re.compile(r'\s*(?:(\()|(\))|"([^"]*)"|(NEAR/(\d+(?:\.\d+)?)s?)(?=[\s()"]|$)|([^\s()"]+))')
+
+
+class _Node(abc.ABC):
+    @abc.abstractmethod
+    def phrases(self) -> List[str]:
+        pass
+
+    def cost(self, cache: Dict[str, list]) -> int:
+        """Number of words in phrases that still have to be searched to evaluate the node."""
+
+        return sum(len(x.split()) for x in set(self.phrases()) if x not in cache)
+
+    @abc.abstractmethod
+    def evaluate(self, search) -> list:
+        pass
+
+
+class _Phrase(_Node):
+    def __init__(self, phrase: str) -> None:
+        self.phrase = phrase
+
+    def phrases(self) -> List[str]:
+        return [self.phrase]
+
+    def evaluate(self, search) -> list:
+        return search(self.phrase)
+
+
+class _Not(_Node):
+    def __init__(self, child: _Node) -> None:
+        self.child = child
+
+    def phrases(self) -> List[str]:
+        return self.child.phrases()
+
+    def evaluate(self, search) -> list:
+        # Matches of the negated operand. The parser only allows `NOT` as an operand of `AND`, which rejects the
+        # document if there are any.
+        return self.child.evaluate(search)
+
+
+class _And(_Node):
+    def __init__(self, children: Sequence[_Node]) -> None:
+        self.children = list(children)
+
+    def phrases(self) -> List[str]:
+        return [x for child in self.children for x in child.phrases()]
+
+    def evaluate(self, search) -> list:
+        results = list()
+        remaining = list(self.children)
+        while len(remaining) > 0:
+            # Cheapest operand first: any empty positive operand or non-empty negated one decides the result.
+            child = min(remaining, key=lambda x: x.cost(search.cache))
+            remaining.remove(child)
+            if isinstance(child, _Not):
+                if len(child.evaluate(search)) > 0:
+                    return list()
+            else:
+                child_results = child.evaluate(search)
+                if len(child_results) == 0:
+                    return list()
+                results.extend(child_results)
+        return results
+
+
+class _Or(_Node):
+    def __init__(self, children: Sequence[_Node]) -> None:
+        self.children = list(children)
+
+    def phrases(self) -> List[str]:
+        return [x for child in self.children for x in child.phrases()]
+
+    def evaluate(self, search) -> list:
+        return [x for child in self.children for x in child.evaluate(search)]
+
+
+class _Near(_Node):
+    def __init__(self, left: _Node, right: _Node, max_gap_sec: float) -> None:
+        self.left = left
+        self.right = right
+        self.max_gap_sec = max_gap_sec
+
+    def phrases(self) -> List[str]:
+        return self.left.phrases() + self.right.phrases()
+
+    def evaluate(self, search) -> list:
+        first, second = sorted((self.left, self.right), key=lambda x: x.cost(search.cache))
+        first_results = first.evaluate(search)
+        if len(first_results) == 0:
+            return list()
+        second_results = second.evaluate(search)
+        if len(second_results) == 0:
+            return list()
+        return _join_near(first_results, second_results, self.max_gap_sec)
+
+
+def _join_near(a: list, b: list, max_gap_sec: float) -> list:
+    """
+    Sort-merge interval join: pairs every interval of `a` with the intervals of `b` that overlap it or are at most
+    `max_gap_sec` apart, in O((|a| + |b|) log(|a| + |b|) + |output|).
+    """
+
+    a = sorted(a, key=lambda x: x.start_sec)
+    b = sorted(b, key=lambda x: x.start_sec)
+    max_b_duration = max(x.end_sec - x.start_sec for x in b)
+
+    joined = list()
+    low = 0
+    for x in a:
+        # Intervals of `b` starting this early end before `x` starts, even for the longest one.
+        while low < len(b) and b[low].start_sec < (x.start_sec - max_gap_sec - max_b_duration):
+            low += 1
+        for y in b[low:]:
+            if y.start_sec > (x.end_sec + max_gap_sec):
+                break
+            if y.end_sec >= (x.start_sec - max_gap_sec):
+                joined.append(OctopusQuery.Result(
+                    start_sec=min(x.start_sec, y.start_sec),
+                    end_sec=max(x.end_sec, y.end_sec),
+                    probability=x.probability * y.probability,
+                    phrases=tuple(sorted(set(x.phrases + y.phrases)))))
+    return joined
+
+
+class _Searcher(object):
+    def __init__(self, octopus: Octopus, metadata: OctopusMetadata) -> None:
+        self._octopus = octopus
+        self._metadata = metadata
+        self.cache = dict()
+
+    def __call__(self, phrase: str) -> list:
+        if phrase not in self.cache:
+            matches = self._octopus.search(self._metadata, [phrase]).get(phrase, list())
+            self.cache[phrase] = [
+                OctopusQuery.Result(x.start_sec, x.end_sec, x.probability, (phrase,)) for x in matches]
+        return self.cache[phrase]
+
+
+class _Parser(object):
+    def __init__(self, expression: str) -> None:
+        self._tokens = list()
+        position = 0
+        expression = expression.rstrip()
+        while position < len(expression):
+            match = _TOKEN_PATTERN.match(expression, position)
+            if match is None:
+                raise OctopusInvalidArgumentError("Invalid query syntax at `%s`" % expression[position:])
+            position = match.end()
+            if match.group(1) is not None:
+                self._tokens.append(('(', None))
+            elif match.group(2) is not None:
+                self._tokens.append((')', None))
+            elif match.group(3) is not None:
+                self._tokens.append(('PHRASE', match.group(3)))
+            elif match.group(4) is not None:
+                self._tokens.append(('NEAR', float(match.group(5))))
+            elif match.group(6) in ('AND', 'OR', 'NOT'):
+                self._tokens.append((match.group(6), None))
+            else:
+                self._tokens.append(('WORD', match.group(6)))
+        self._position = 0
+
+    def _peek(self) -> str:
+        return self._tokens[self._position][0] if self._position < len(self._tokens) else 'END'
+
+    def _next(self) -> tuple:
+        token = self._tokens[self._position]
+        self._position += 1
+        return token
+
+    def parse(self) -> _Node:
+        node = self._or()
+        if self._peek() != 'END':
+            raise OctopusInvalidArgumentError("Unexpected `%s` in query" % self._peek())
+        return node
+
+    def _or(self) -> _Node:
+        children = [self._and()]
+        while self._peek() == 'OR':
+            self._next()
+            children.append(self._and())
+        return children[0] if len(children) == 1 else _Or(children)
+
+    def _and(self) -> _Node:
+        children = [self._not()]
+        while self._peek() == 'AND':
+            self._next()
+            children.append(self._not())
+        if all(isinstance(x, _Not) for x in children):
+            if len(children) == 1:
+                raise OctopusInvalidArgumentError("`NOT` can only be used as an operand of `AND`")
+            raise OctopusInvalidArgumentError("`AND` needs at least one operand that is not negated")
+        return children[0] if len(children) == 1 else _And(children)
+
+    def _not(self) -> _Node:
+        if self._peek() == 'NOT':
+            self._next()
+            if self._peek() == 'NOT':
+                raise OctopusInvalidArgumentError("`NOT` can only be used as an operand of `AND`")
+            return _Not(self._near())
+        return self._near()
+
+    def _near(self) -> _Node:
+        node = self._primary()
+        while self._peek() == 'NEAR':
+            _, max_gap_sec = self._next()
+            node = _Near(node, self._primary(), max_gap_sec)
+        return node
+
+    def _primary(self) -> _Node:
+        kind = self._peek()
+        if kind == '(':
+            self._next()
+            node = self._or()
+            if self._peek() != ')':
+                raise OctopusInvalidArgumentError("Missing `)` in query")
+            self._next()
+            return node
+        if kind == 'PHRASE':
+            phrase = ' '.join(self._next()[1].split())
+            if len(phrase) == 0:
+                raise OctopusInvalidArgumentError("Search phrase cannot be empty")
+            return _Phrase(phrase)
+        if kind == 'WORD':
+            words = list()
+            while self._peek() == 'WORD':
+                words.append(self._next()[1])
+            return _Phrase(' '.join(words))
+        raise OctopusInvalidArgumentError("Expected a phrase but found `%s` in query" % kind)
+
+
+class OctopusQuery(object):
+    """
+    Boolean and proximity query over the matches of several phrases in one metadata object.
+
+    Syntax (operators in decreasing order of precedence):
+        - `refund` or `"cancel my subscription"`: a phrase. Unquoted consecutive words form one phrase.
+        - `a NEAR/10s b`: matches of `a` and `b` that overlap or are at most 10 seconds apart, merged into one result
+          whose probability is the product of both.
+        - `NOT a`: `a` has no matches. Only valid as an operand of `AND` with at least one operand that is not negated.
+        - `a AND b`: matches of both, if both have any.
+        - `a OR b`: matches of either.
+        - Parentheses group sub-expressions.
+
+    Operators are case-sensitive: lowercase `and`, `or`, `not` and `near/10s` are words of a phrase.
+
+    Phrases are searched lazily, at most once each, cheapest operand first, so an `AND` stops searching as soon as one
+    of its operands rules the document out.
+    """
+
+    Result = namedtuple('Result', ['start_sec', 'end_sec', 'probability', 'phrases'])
+
+    ORDER_BY_TIME = 'time'
+    ORDER_BY_SCORE = 'score'
+
+    def __init__(self, expression: str) -> None:
+        """
+        Constructor.
+
+        :param expression: Query expression.
+        """
+
+        self._expression = expression
+        self._root = _Parser(expression).parse()
+
+    @property
+    def expression(self) -> str:
+        return self._expression
+
+    @property
+    def phrases(self) -> Sequence[str]:
+        """Distinct phrases referenced by the query."""
+
+        return list(dict.fromkeys(self._root.phrases()))
+
+    def evaluate(
+            self,
+            octopus: Octopus,
+            metadata: OctopusMetadata,
+            order_by: str = ORDER_BY_TIME) -> Sequence['OctopusQuery.Result']:
+        """
+        Evaluates the query against a metadata object.
+
+        :param octopus: Octopus instance used for searching.
+        :param metadata: Metadata object.
+        :param order_by: `'time'` to sort results by start time or `'score'` to sort by decreasing probability.
+        :return: Distinct results, each listing the phrases that produced it.
+        """
+
+        if order_by not in (self.ORDER_BY_TIME, self.ORDER_BY_SCORE):
+            raise OctopusInvalidArgumentError("`order_by` should be `%s` or `%s`" % (
+                self.ORDER_BY_TIME,
+                self.ORDER_BY_SCORE))
+
+        results = list(dict.fromkeys(self._root.evaluate(_Searcher(octopus, metadata))))
+        if order_by == self.ORDER_BY_TIME:
+            results.sort(key=lambda x: (x.start_sec, x.end_sec))
+        else:
+            results.sort(key=lambda x: (-x.probability, x.start_sec))
+        return results
+
+
+__all__ = [
+    'OctopusQuery',
+]
@@ -0,0 +1,238 @@
+#
+# Copyright 2023 Picovoice Inc.
+#
+# You may not use this file except in compliance with the license. A copy of the license is located in the "LICENSE"
+# file accompanying this source.
+#
+# Unless required by applicable law or agreed to in writing, software distributed under the License is distributed on
+# an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the License for the
+# specific language governing permissions and limitations under the License.
+#
+
+import os
+import tempfile
+import threading
+from collections import OrderedDict, namedtuple
+from ctypes import c_void_p
+from typing import Optional
+
+from ._octopus import OctopusInvalidArgumentError, OctopusInvalidStateError, OctopusIOError, OctopusMetadata
+
+
+class OctopusResidentMetadata(OctopusMetadata):
+    """
+    Metadata managed by an `OctopusResidencyManager`. It can be used wherever `OctopusMetadata` is accepted; if it has
+    been spilled, it is read back from the spill file when it is used.
+    """
+
+    def __init__(self, manager: 'OctopusResidencyManager', handle: c_void_p, size: int) -> None:
+        super().__init__(handle=handle, size=size)
+
+        self._manager = manager
+        self._referenced = False
+        self._spill_offset = None
+        self._removed = False
+
+    @property
+    def handle(self) -> c_void_p:
+        return self._manager._fault_in(self)
+
+    @property
+    def is_resident(self) -> bool:
+        """Whether the metadata is in memory."""
+
+        return self._handle is not None
+
+
+class OctopusResidencyManager(object):
+    """
+    Keeps the total size of metadata held in memory under a budget. When it is exceeded, the metadata of documents that
+    have not been searched recently is written to a spill file and dropped from memory. It is read back when a search
+    uses it again.
+
+    Documents to spill are chosen with the `'clock'` policy, which gives recently used documents a second chance, or
+    `'lru'`, which spills the least recently used document. Metadata never changes, so each document is written to the
+    spill file at most once.
+    """
+
+    POLICIES = ('clock', 'lru')
+
+    Metrics = namedtuple('Metrics', [
+        'num_documents',
+        'num_resident',
+        'resident_bytes',
+        'budget_bytes',
+        'num_spills',
+        'num_evictions',
+        'num_faults',
+        'spill_file_bytes'])
+
+    def __init__(self, budget_bytes: int, policy: str = 'clock', spill_path: Optional[str] = None) -> None:
+        """
+        Constructor.
+
+        :param budget_bytes: Maximum total size of metadata kept in memory. A single document larger than the budget is
+        kept in memory while it is in use.
+        :param policy: One of `POLICIES`.
+        :param spill_path: Path of the spill file. It is overwritten, and removed by `.close()`. A temporary file is
+        used if not set.
+        """
+
+        if budget_bytes <= 0:
+            raise OctopusInvalidArgumentError("`budget_bytes` should be positive.")
+        if policy not in self.POLICIES:
+            raise OctopusInvalidArgumentError("`policy` should be one of %s." % ', '.join(self.POLICIES))
+
+        self._budget_bytes = budget_bytes
+        self._policy = policy
+
+        try:
+            if spill_path is None:
+                self._spill_file = tempfile.TemporaryFile()
+            else:
+                self._spill_file = open(spill_path, 'w+b')
+        except OSError:
+            raise OctopusIOError("Couldn't create spill file at `%s`." % spill_path)
+        self._spill_path = spill_path
+        self._spill_file_bytes = 0
+
+        self._lock = threading.Lock()
+        # Resident documents, oldest first. For `'clock'` the front of the dictionary is the hand.
+        self._resident = OrderedDict()
+        self._resident_bytes = 0
+        self._num_documents = 0
+        self._num_spills = 0
+        self._num_evictions = 0
+        self._num_faults = 0
+
+    def add(self, metadata: OctopusMetadata) -> OctopusResidentMetadata:
+        """
+        Places metadata under management. It is not copied, so the caller should drop its own references to it.
+
+        :param metadata: Metadata object.
+        :return: Metadata object to use in its place.
+        """
+
+        with self._lock:
+            if self._spill_file is None:
+                raise OctopusInvalidStateError("Residency manager has been closed.")
+
+            resident_metadata = OctopusResidentMetadata(self, metadata.handle, metadata.size)
+            self._resident[resident_metadata] = None
+            self._resident_bytes += metadata.size
+            self._num_documents += 1
+            self._evict(resident_metadata)
+
+        return resident_metadata
+
+    def remove(self, metadata: OctopusResidentMetadata) -> None:
+        """
+        Stops managing metadata. It can no longer be searched. Its space in the spill file is not reclaimed.
+
+        :param metadata: Metadata object returned by `.add()`.
+        """
+
+        with self._lock:
+            if metadata._removed:
+                return
+            metadata._removed = True
+            if metadata in self._resident:
+                del self._resident[metadata]
+                self._resident_bytes -= metadata.size
+            metadata._handle = None
+            self._num_documents -= 1
+
+    def _fault_in(self, metadata: OctopusResidentMetadata) -> c_void_p:
+        with self._lock:
+            handle = metadata._handle
+            if handle is not None:
+                if self._policy == 'lru':
+                    self._resident.move_to_end(metadata)
+                else:
+                    metadata._referenced = True
+                return handle
+
+            if metadata._removed or self._spill_file is None:
+                raise OctopusInvalidStateError("Metadata is no longer managed by the residency manager.")
+
+            buffer = bytearray(metadata.size)
+            self._spill_file.seek(metadata._spill_offset)
+            if self._spill_file.readinto(buffer) != metadata.size:
+                raise OctopusIOError("Spill file is truncated.")
+
+            # The handle keeps `buffer` alive, so a search holding it is unaffected if the metadata is spilled again.
+            handle = OctopusMetadata.from_buffer(buffer).handle
+            metadata._handle = handle
+            self._resident[metadata] = None
+            self._resident_bytes += metadata.size
+            self._num_faults += 1
+            self._evict(metadata)
+
+            return handle
+
+    def _evict(self, keep: OctopusResidentMetadata) -> None:
+        while self._resident_bytes > self._budget_bytes and len(self._resident) > 1:
+            victim = next(iter(self._resident))
+            if victim is keep:
+                self._resident.move_to_end(victim)
+                continue
+            if self._policy == 'clock' and victim._referenced:
+                victim._referenced = False
+                self._resident.move_to_end(victim)
+                continue
+
+            if victim._spill_offset is None:
+                self._spill_file.seek(self._spill_file_bytes)
+                self._spill_file.write(OctopusMetadata._to_bytes(victim._handle, victim.size))
+                victim._spill_offset = self._spill_file_bytes
+                self._spill_file_bytes += victim.size
+                self._num_spills += 1
+
+            del self._resident[victim]
+            victim._handle = None
+            self._resident_bytes -= victim.size
+            self._num_evictions += 1
+
+    @property
+    def resident_bytes(self) -> int:
+        """Total size of metadata currently in memory."""
+
+        return self._resident_bytes
+
+    def metrics(self) -> 'OctopusResidencyManager.Metrics':
+        """
+        Number of documents and how many of them are in memory, and counts of documents written to the spill file
+        (spills), dropped from memory (evictions) and read back (faults).
+        """
+
+        with self._lock:
+            return self.Metrics(
+                num_documents=self._num_documents,
+                num_resident=len(self._resident),
+                resident_bytes=self._resident_bytes,
+                budget_bytes=self._budget_bytes,
+                num_spills=self._num_spills,
+                num_evictions=self._num_evictions,
+                num_faults=self._num_faults,
+                spill_file_bytes=self._spill_file_bytes)
+
+    def close(self) -> None:
+        """Drops all metadata and removes the spill file. Managed metadata must not be used afterwards."""
+
+        with self._lock:
+            for metadata in self._resident:
+                metadata._handle = None
+            self._resident.clear()
+            self._resident_bytes = 0
+
+            if self._spill_file is not None:
+                self._spill_file.close()
+                self._spill_file = None
+                if self._spill_path is not None:
+                    os.remove(self._spill_path)
+
+
+__all__ = [
+    'OctopusResidencyManager',
+    'OctopusResidentMetadata',
+]
@@ -0,0 +1,338 @@
+#
+# Copyright 2023 Picovoice Inc.
+#
+# You may not use this file except in compliance with the license. A copy of the license is located in the "LICENSE"
+# file accompanying this source.
+#
+# Unless required by applicable law or agreed to in writing, software distributed under the License is distributed on
+# an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the License for the
+# specific language governing permissions and limitations under the License.
+#
+
+import abc
+import csv
+import io
+import json
+import math
+import struct
+import sys
+from array import array
+from collections import namedtuple
+from typing import BinaryIO, Dict, Iterator, Sequence
+
+from ._octopus import Octopus, OctopusInvalidArgumentError, OctopusInvalidStateError, OctopusIOError
+
+_MAGIC = b'PVOR'
+_VERSION = 1
+# magic, version
+_HEADER_STRUCT = struct.Struct('<4sB')
+# number of new documents, number of new phrases, number of rows
+_CHUNK_STRUCT = struct.Struct('<III')
+_LENGTH_STRUCT = struct.Struct('<I')
+# typecodes of document ID, phrase ID, start, end and probability columns
+_COLUMN_TYPECODES = ('I', 'I', 'd', 'd', 'f')
+
+CSV_HEADER = ('document', 'phrase', 'start_sec', 'end_sec', 'probability')
+
+
+class OctopusResultWriter(abc.ABC):
+    """
+    Streams search results to a binary file, one row per match. Rows are encoded in bulk and written once
+    `buffer_size` bytes have accumulated, so exporting many matches costs few writes. `.close()` flushes the remaining
+    rows but leaves the file open.
+    """
+
+    DEFAULT_BUFFER_SIZE = 1024 * 1024
+
+    def __init__(self, f: BinaryIO, buffer_size: int = DEFAULT_BUFFER_SIZE) -> None:
+        """
+        Constructor.
+
+        :param f: Binary file object, e.g. `open(path, 'wb')` or `sys.stdout.buffer`.
+        :param buffer_size: Number of bytes buffered before they are written.
+        """
+
+        if buffer_size <= 0:
+            raise OctopusInvalidArgumentError("`buffer_size` should be positive.")
+
+        self._f = f
+        self._buffer_size = buffer_size
+        self._num_rows = 0
+        self._closed = False
+
+    def write(self, document_id: str, matches: Dict[str, Sequence[Octopus.Match]]) -> int:
+        """
+        Adds the matches of one document.
+
+        :param document_id: Document ID, e.g. the path of the audio file.
+        :param matches: Matches returned by `Octopus.search()`.
+        :return: Number of rows added.
+        """
+
+        if self._closed:
+            raise OctopusInvalidStateError("Result writer has been closed.")
+
+        num_rows = 0
+        for phrase, phrase_matches in matches.items():
+            if len(phrase_matches) > 0:
+                self._add(document_id, phrase, phrase_matches)
+                num_rows += len(phrase_matches)
+        self._num_rows += num_rows
+
+        if self._buffered_bytes() >= self._buffer_size:
+            self.flush()
+        return num_rows
+
+    @abc.abstractmethod
+    def _add(self, document_id: str, phrase: str, matches: Sequence[Octopus.Match]) -> None:
+        pass
+
+    @abc.abstractmethod
+    def _buffered_bytes(self) -> int:
+        pass
+
+    @abc.abstractmethod
+    def _drain(self) -> bytes:
+        pass
+
+    def flush(self) -> None:
+        """Writes the buffered rows."""
+
+        data = self._drain()
+        if len(data) > 0:
+            self._f.write(data)
+        self._f.flush()
+
+    def close(self) -> None:
+        """Writes the buffered rows. The writer cannot be used afterwards."""
+
+        if not self._closed:
+            self.flush()
+            self._closed = True
+
+    @property
+    def num_rows(self) -> int:
+        """Number of rows written so far."""
+
+        return self._num_rows
+
+    def __enter__(self) -> 'OctopusResultWriter':
+        return self
+
+    def __exit__(self, *_) -> None:
+        self.close()
+
+
+class _TextResultWriter(OctopusResultWriter):
+    def __init__(self, f: BinaryIO, buffer_size: int = OctopusResultWriter.DEFAULT_BUFFER_SIZE) -> None:
+        super().__init__(f, buffer_size)
+
+        self._text = io.StringIO()
+
+    def _buffered_bytes(self) -> int:
+        # Characters rather than bytes, which is close enough to decide when to write.
+        return self._text.tell()
+
+    def _drain(self) -> bytes:
+        data = self._text.getvalue().encode('utf-8')
+        self._text.seek(0)
+        self._text.truncate()
+        return data
+
+
+class OctopusNDJSONResultWriter(_TextResultWriter):
+    """
+    Writes one JSON object per line with the keys `document`, `phrase`, `start_sec`, `end_sec` and `probability`. JSON
+    has no representation of NaN or infinity, so documents with such values are rejected.
+    """
+
+    def write(self, document_id: str, matches: Dict[str, Sequence[Octopus.Match]]) -> int:
+        for phrase, phrase_matches in matches.items():
+            for x in phrase_matches:
+                if not (math.isfinite(x.start_sec) and math.isfinite(x.end_sec) and math.isfinite(x.probability)):
+                    raise OctopusInvalidArgumentError(
+                        "Matches of `%s` for `%s` should have finite values." % (document_id, phrase))
+        return super().write(document_id, matches)
+
+    def _add(self, document_id: str, phrase: str, matches: Sequence[Octopus.Match]) -> None:
+        prefix = '{"document":%s,"phrase":%s,' % (json.dumps(document_id), json.dumps(phrase))
+        self._text.write(''.join(
+            '%s"start_sec":%r,"end_sec":%r,"probability":%r}\n' % (prefix, x.start_sec, x.end_sec, x.probability)
+            for x in matches))
+
+
+class OctopusCSVResultWriter(_TextResultWriter):
+    """
+    Writes comma-separated values with the header `CSV_HEADER`.
+    """
+
+    def __init__(self, f: BinaryIO, buffer_size: int = OctopusResultWriter.DEFAULT_BUFFER_SIZE) -> None:
+        super().__init__(f, buffer_size)
+
+        self._csv_writer = csv.writer(self._text, lineterminator='\n')
+        self._csv_writer.writerow(CSV_HEADER)
+
+    def _add(self, document_id: str, phrase: str, matches: Sequence[Octopus.Match]) -> None:
+        self._csv_writer.writerows((document_id, phrase, x.start_sec, x.end_sec, x.probability) for x in matches)
+
+
+class OctopusColumnarResultWriter(OctopusResultWriter):
+    """
+    Writes a compact binary file of chunks. Each chunk stores its rows as five little-endian arrays: document index and
+    phrase index (`uint32`), start and end in seconds (`float64`) and probability (`float32`). Document IDs and phrases
+    are dictionary-encoded: each is stored once, in the chunk of its first row, and rows refer to it by index. The file
+    is read with `read_columnar_results()`.
+    """
+
+    def __init__(self, f: BinaryIO, buffer_size: int = OctopusResultWriter.DEFAULT_BUFFER_SIZE) -> None:
+        super().__init__(f, buffer_size)
+
+        self._f.write(_HEADER_STRUCT.pack(_MAGIC, _VERSION))
+        self._document_indices = dict()
+        self._phrase_indices = dict()
+        self._new_documents = list()
+        self._new_phrases = list()
+        self._columns = tuple(array(x) for x in _COLUMN_TYPECODES)
+        self._row_size = sum(x.itemsize for x in self._columns)
+
+    def _index(self, value: str, indices: Dict[str, int], new_values: list) -> int:
+        index = indices.get(value)
+        if index is None:
+            index = len(indices)
+            indices[value] = index
+            new_values.append(value)
+        return index
+
+    def _add(self, document_id: str, phrase: str, matches: Sequence[Octopus.Match]) -> None:
+        document_index = self._index(document_id, self._document_indices, self._new_documents)
+        phrase_index = self._index(phrase, self._phrase_indices, self._new_phrases)
+
+        document_column, phrase_column, start_column, end_column, probability_column = self._columns
+        document_column.extend([document_index] * len(matches))
+        phrase_column.extend([phrase_index] * len(matches))
+        start_column.extend(x.start_sec for x in matches)
+        end_column.extend(x.end_sec for x in matches)
+        probability_column.extend(x.probability for x in matches)
+
+    def _buffered_bytes(self) -> int:
+        return len(self._columns[0]) * self._row_size
+
+    def _drain(self) -> bytes:
+        num_rows = len(self._columns[0])
+        if num_rows == 0 and len(self._new_documents) == 0 and len(self._new_phrases) == 0:
+            return b''
+
+        parts = [_CHUNK_STRUCT.pack(len(self._new_documents), len(self._new_phrases), num_rows)]
+        for value in self._new_documents + self._new_phrases:
+            encoded = value.encode('utf-8')
+            parts.append(_LENGTH_STRUCT.pack(len(encoded)))
+            parts.append(encoded)
+        for column in self._columns:
+            if sys.byteorder != 'little':
+                column.byteswap()
+            parts.append(column.tobytes())
+
+        self._new_documents = list()
+        self._new_phrases = list()
+        self._columns = tuple(array(x) for x in _COLUMN_TYPECODES)
+        return b''.join(parts)
+
+
+OctopusResultColumns = namedtuple('OctopusResultColumns', [
+    'documents',
+    'phrases',
+    'document_indices',
+    'phrase_indices',
+    'start_sec',
+    'end_sec',
+    'probability'])
+OctopusResultColumns.__doc__ = """
+Rows of one chunk of a columnar result file as typed arrays. `documents` and `phrases` are the dictionaries of all
+chunks read so far, indexed by `document_indices` and `phrase_indices`.
+"""
+
+
+def read_columnar_results(f: BinaryIO) -> Iterator[OctopusResultColumns]:
+    """
+    Reads a file written by `OctopusColumnarResultWriter` one chunk at a time.
+
+    :param f: Binary file object.
+    :return: An iterator of the columns of each chunk.
+    """
+
+    def read_exactly(size: int) -> bytes:
+        data = f.read(size)
+        if len(data) != size:
+            raise OctopusIOError("Columnar result file is truncated.")
+        return data
+
+    magic, version = _HEADER_STRUCT.unpack(read_exactly(_HEADER_STRUCT.size))
+    if magic != _MAGIC:
+        raise OctopusIOError("Data is not a columnar result file.")
+    if version != _VERSION:
+        raise OctopusIOError("Unsupported columnar result file version `%d`." % version)
+
+    documents = list()
+    phrases = list()
+    while True:
+        header = f.read(_CHUNK_STRUCT.size)
+        if len(header) == 0:
+            return
+        if len(header) != _CHUNK_STRUCT.size:
+            raise OctopusIOError("Columnar result file is truncated.")
+        num_documents, num_phrases, num_rows = _CHUNK_STRUCT.unpack(header)
+
+        for values, count in ((documents, num_documents), (phrases, num_phrases)):
+            for _ in range(count):
+                length = _LENGTH_STRUCT.unpack(read_exactly(_LENGTH_STRUCT.size))[0]
+                values.append(read_exactly(length).decode('utf-8'))
+
+        columns = list()
+        for typecode in _COLUMN_TYPECODES:
+            column = array(typecode)
+            column.frombytes(read_exactly(num_rows * column.itemsize))
+            if sys.byteorder != 'little':
+                column.byteswap()
+            columns.append(column)
+
+        yield OctopusResultColumns(documents, phrases, *columns)
+
+
+_RESULT_WRITERS = {
+    'ndjson': OctopusNDJSONResultWriter,
+    'csv': OctopusCSVResultWriter,
+    'columnar': OctopusColumnarResultWriter,
+}
+
+RESULT_FORMATS = tuple(_RESULT_WRITERS.keys())
+
+
+def create_result_writer(
+        f: BinaryIO,
+        output_format: str,
+        buffer_size: int = OctopusResultWriter.DEFAULT_BUFFER_SIZE) -> OctopusResultWriter:
+    """
+    Factory method for result writers.
+
+    :param f: Binary file object.
+    :param output_format: One of `RESULT_FORMATS`.
+    :param buffer_size: Number of bytes buffered before they are written.
+    :return: A result writer.
+    """
+
+    if output_format not in _RESULT_WRITERS:
+        raise OctopusInvalidArgumentError("`output_format` should be one of %s." % ', '.join(RESULT_FORMATS))
+    return _RESULT_WRITERS[output_format](f, buffer_size=buffer_size)
+
+
+__all__ = [
+    'CSV_HEADER',
+    'OctopusCSVResultWriter',
+    'OctopusColumnarResultWriter',
+    'OctopusNDJSONResultWriter',
+    'OctopusResultColumns',
+    'OctopusResultWriter',
+    'RESULT_FORMATS',
+    'create_result_writer',
+    'read_columnar_results',
+]
@@ -0,0 +1,298 @@
+#
+# Copyright 2023 Picovoice Inc.
+#
+# You may not use this file except in compliance with the license. A copy of the license is located in the "LICENSE"
+# file accompanying this source.
+#
+# Unless required by applicable law or agreed to in writing, software distributed under the License is distributed on
+# an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the License for the
+# specific language governing permissions and limitations under the License.
+#
+
+import heapq
+import itertools
+import math
+import os
+import threading
+import time
+from collections import deque, namedtuple
+from concurrent.futures import Future
+from typing import Optional, Sequence
+
+from ._octopus import (
+    OctopusInvalidArgumentError,
+    OctopusInvalidStateError,
+    OctopusIOError,
+    OctopusMetadata,
+    _read_wav_duration_sec,
+)
+from ._pool import OctopusPool
+from ._util import percentile
+
+
+# Compressed files are not decoded to estimate their length. They are taken to be at this bit rate, which is typical of
+# speech recordings in MP3, AAC or Ogg.
+_COMPRESSED_BITS_PER_SEC = 128000
+
+
+def _estimate_duration_sec(path: str) -> float:
+    if not os.path.exists(path):
+        raise OctopusIOError("Couldn't find input file at `%s`." % path)
+    duration_sec = _read_wav_duration_sec(path)
+    if duration_sec is None:
+        duration_sec = os.path.getsize(path) * 8 / _COMPRESSED_BITS_PER_SEC
+    return duration_sec
+
+
+class _Job(object):
+    def __init__(self, source, is_file: bool, cost: int, priority: int, deadline: Optional[float]) -> None:
+        self.source = source
+        self.is_file = is_file
+        self.cost = cost
+        self.priority = priority
+        self.deadline = deadline
+        self.submitted = time.monotonic()
+        self.future = Future()
+        self.taken = False
+
+
+class OctopusIngestionScheduler(object):
+    """
+    Indexes submitted audio on a pool of Octopus instances in an order chosen by a scheduling policy instead of first
+    come, first served:
+
+        - `'sjf'` (shortest job first) runs the job with the fewest samples first, so short clips do not wait behind
+          long archives.
+        - `'edf'` (earliest deadline first) runs the job with the nearest deadline first. Jobs without a deadline come
+          last, shortest first.
+        - `'fifo'` runs jobs in order of submission.
+
+    Jobs of a higher priority always run before jobs of a lower one. A job that has waited for longer than
+    `max_wait_sec` runs next regardless of policy and priority, oldest first, so no job starves.
+    """
+
+    POLICIES = ('sjf', 'edf', 'fifo')
+
+    Metrics = namedtuple('Metrics', [
+        'queue_depth',
+        'num_running',
+        'num_completed',
+        'num_failed',
+        'num_deadline_misses',
+        'num_starvation_promotions',
+        'wait_sec_p50',
+        'wait_sec_p90',
+        'wait_sec_p99',
+        'wait_sec_max'])
+
+    NUM_WAIT_SAMPLES = 1024
+
+    def __init__(
+            self,
+            access_key: str,
+            num_workers: int,
+            policy: str = 'sjf',
+            max_wait_sec: Optional[float] = None,
+            model_path: Optional[str] = None,
+            library_path: Optional[str] = None) -> None:
+        """
+        Constructor.
+
+        :param access_key: AccessKey provided by Picovoice Console (https://console.picovoice.ai/)
+        :param num_workers: Number of jobs indexed in parallel, each on its own Octopus instance.
+        :param policy: One of `POLICIES`.
+        :param max_wait_sec: Longest a job can wait before it runs next regardless of policy. No limit if not set.
+        :param model_path: Absolute path to the file containing model parameters. If not set it will be set to the
+        default location for English model.
+        :param library_path: Absolute path to Octopus' dynamic library. If not set it will be set to the default
+        location.
+        """
+
+        if policy not in self.POLICIES:
+            raise OctopusInvalidArgumentError("`policy` should be one of %s." % ', '.join(self.POLICIES))
+        if max_wait_sec is not None and max_wait_sec <= 0:
+            raise OctopusInvalidArgumentError("`max_wait_sec` should be positive.")
+
+        self._policy = policy
+        self._max_wait_sec = max_wait_sec
+
+        self._pool = OctopusPool(
+            access_key=access_key,
+            size=num_workers,
+            model_path=model_path,
+            library_path=library_path)
+        with self._pool.acquire() as octopus:
+            self._sample_rate = octopus.sample_rate
+
+        self._condition = threading.Condition()
+        self._queue = list()
+        self._arrivals = deque()
+        self._sequence = itertools.count()
+        self._num_queued = 0
+        self._num_running = 0
+        self._num_completed = 0
+        self._num_failed = 0
+        self._num_deadline_misses = 0
+        self._num_starvation_promotions = 0
+        self._waits = deque(maxlen=self.NUM_WAIT_SAMPLES)
+        self._stopped = False
+
+        self._workers = [threading.Thread(target=self._work, daemon=True) for _ in range(num_workers)]
+        for worker in self._workers:
+            worker.start()
+
+    def submit_file(
+            self,
+            path: str,
+            priority: int = 0,
+            deadline_sec: Optional[float] = None) -> 'Future[OctopusMetadata]':
+        """
+        Queues an audio file for indexing. Its cost is its number of samples at the engine's sample rate, whatever the
+        sample rate of the file. The length of WAV files is read from their header; compressed formats are assumed to
+        be at 128 kbps.
+
+        :param path: Absolute path to the audio file.
+        :param priority: Jobs with a higher priority run first.
+        :param deadline_sec: Time from now by which the job should be done, used by the `'edf'` policy.
+        :return: A future resolving to the metadata object.
+        """
+
+        cost = int(round(_estimate_duration_sec(path) * self._sample_rate))
+        return self._submit(_Job(path, True, cost, priority, self._deadline(deadline_sec)))
+
+    def submit_data(
+            self,
+            pcm: Sequence[int],
+            priority: int = 0,
+            deadline_sec: Optional[float] = None) -> 'Future[OctopusMetadata]':
+        """
+        Queues audio data for indexing. Its cost is its number of samples.
+
+        :param pcm: Audio data. See `Octopus.index_audio_data()`.
+        :param priority: Jobs with a higher priority run first.
+        :param deadline_sec: Time from now by which the job should be done, used by the `'edf'` policy.
+        :return: A future resolving to the metadata object.
+        """
+
+        return self._submit(_Job(pcm, False, len(pcm), priority, self._deadline(deadline_sec)))
+
+    @staticmethod
+    def _deadline(deadline_sec: Optional[float]) -> Optional[float]:
+        return None if deadline_sec is None else time.monotonic() + deadline_sec
+
+    def _submit(self, job: _Job) -> 'Future[OctopusMetadata]':
+        if self._policy == 'sjf':
+            policy_key = (job.cost,)
+        elif self._policy == 'edf':
+            policy_key = (math.inf if job.deadline is None else job.deadline, job.cost)
+        else:
+            policy_key = ()
+
+        with self._condition:
+            if self._stopped:
+                raise OctopusInvalidStateError("Scheduler has been deleted.")
+            heapq.heappush(self._queue, (-job.priority,) + policy_key + (next(self._sequence), job))
+            self._arrivals.append(job)
+            self._num_queued += 1
+            self._condition.notify()
+        return job.future
+
+    def _next_job(self) -> Optional[_Job]:
+        with self._condition:
+            while self._num_queued == 0 and not self._stopped:
+                self._condition.wait()
+            if self._stopped:
+                return None
+
+            # Both queues hold every job; entries taken through the other one are skipped lazily.
+            while self._arrivals[0].taken:
+                self._arrivals.popleft()
+            while self._queue[0][-1].taken:
+                heapq.heappop(self._queue)
+
+            oldest = self._arrivals[0]
+            if self._max_wait_sec is not None and time.monotonic() - oldest.submitted > self._max_wait_sec:
+                job = oldest
+                if job is not self._queue[0][-1]:
+                    self._num_starvation_promotions += 1
+            else:
+                job = self._queue[0][-1]
+
+            job.taken = True
+            self._num_queued -= 1
+            self._num_running += 1
+            self._waits.append(time.monotonic() - job.submitted)
+            return job
+
+    def _work(self) -> None:
+        with self._pool.acquire() as octopus:
+            while True:
+                job = self._next_job()
+                if job is None:
+                    return
+
+                if not job.future.set_running_or_notify_cancel():
+                    with self._condition:
+                        self._num_running -= 1
+                    continue
+
+                try:
+                    if job.is_file:
+                        metadata = octopus.index_audio_file(job.source)
+                    else:
+                        metadata = octopus.index_audio_data(job.source)
+                except Exception as e:
+                    with self._condition:
+                        self._num_running -= 1
+                        self._num_failed += 1
+                    job.future.set_exception(e)
+                    continue
+
+                with self._condition:
+                    self._num_running -= 1
+                    self._num_completed += 1
+                    if job.deadline is not None and time.monotonic() > job.deadline:
+                        self._num_deadline_misses += 1
+                job.future.set_result(metadata)
+
+    def metrics(self) -> 'OctopusIngestionScheduler.Metrics':
+        """
+        Current queue depth, job counts and the distribution of the time recent jobs waited in the queue. Wait times
+        are NaN until the first job has started.
+        """
+
+        with self._condition:
+            waits = sorted(self._waits)
+            return self.Metrics(
+                queue_depth=self._num_queued,
+                num_running=self._num_running,
+                num_completed=self._num_completed,
+                num_failed=self._num_failed,
+                num_deadline_misses=self._num_deadline_misses,
+                num_starvation_promotions=self._num_starvation_promotions,
+                wait_sec_p50=percentile(waits, 50),
+                wait_sec_p90=percentile(waits, 90),
+                wait_sec_p99=percentile(waits, 99),
+                wait_sec_max=percentile(waits, 100))
+
+    def delete(self) -> None:
+        """Cancels queued jobs, waits for running ones and releases all Octopus instances."""
+
+        with self._condition:
+            self._stopped = True
+            queued = [x[-1] for x in self._queue if not x[-1].taken]
+            self._queue.clear()
+            self._arrivals.clear()
+            self._num_queued = 0
+            self._condition.notify_all()
+
+        for job in queued:
+            job.future.cancel()
+        for worker in self._workers:
+            worker.join()
+        self._pool.delete()
+
+
+__all__ = [
+    'OctopusIngestionScheduler',
+]
@@ -0,0 +1,330 @@
+#
+# Copyright 2023 Picovoice Inc.
+#
+# You may not use this file except in compliance with the license. A copy of the license is located in the "LICENSE"
+# file accompanying this source.
+#
+# Unless required by applicable law or agreed to in writing, software distributed under the License is distributed on
+# an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the License for the
+# specific language governing permissions and limitations under the License.
+#
+
+import itertools
+import os
+import platform
+import threading
+from array import array
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from ctypes import c_byte, memmove
+from multiprocessing import shared_memory
+from typing import Iterable, List, Optional, Sequence
+
+from ._factory import create
+from ._octopus import OctopusInvalidArgumentError, OctopusMetadata
+
+SHARED_MEMORY_PREFIX = 'pvoctopus'
+
+_SHM_DIRECTORY = '/dev/shm'
+
+
+def _process_start_time(pid: int) -> Optional[int]:
+    # Start time of a process in clock ticks since boot, which tells it apart from a later process reusing its PID.
+    # `None` if the process does not exist. Only available on Linux; 0 elsewhere.
+    if platform.system() != 'Linux':
+        return 0
+    try:
+        with open('/proc/%d/stat' % pid, 'rb') as f:
+            stat = f.read()
+    except OSError:
+        return None
+    # The command name in parentheses may contain spaces, so fields are counted from its closing parenthesis.
+    return int(stat[stat.rindex(b')') + 2:].split()[19])
+
+
+def _attach(name: str) -> shared_memory.SharedMemory:
+    # Workers share the resource tracker of the process that created the pool, so attaching to a segment here does not
+    # transfer ownership; segments are only unlinked by `OctopusSharedMemoryIndexer`.
+    return shared_memory.SharedMemory(name=name)
+
+
+def _unlink(name: str) -> None:
+    try:
+        segment = _attach(name)
+    except FileNotFoundError:
+        return
+    segment.close()
+    segment.unlink()
+
+
+_octopus = None
+
+
+def _init_worker(access_key: str, model_path: Optional[str], library_path: Optional[str]) -> None:
+    global _octopus
+    _octopus = create(access_key=access_key, model_path=model_path, library_path=library_path)
+
+
+def _index_worker(pcm_name: str, num_samples: int, metadata_name: str) -> int:
+    pcm_segment = _attach(pcm_name)
+    try:
+        pcm = pcm_segment.buf[:num_samples * 2].cast('h')
+        metadata = _octopus.index_audio_data(pcm)
+        del pcm
+
+        metadata_segment = shared_memory.SharedMemory(name=metadata_name, create=True, size=metadata.size)
+        try:
+            memmove((c_byte * metadata.size).from_buffer(metadata_segment.buf), metadata.handle, metadata.size)
+        finally:
+            metadata_segment.close()
+        return metadata.size
+    finally:
+        pcm_segment.close()
+
+
+class OctopusSharedMemoryIndexer(object):
+    """
+    Indexes audio in a pool of worker processes. Audio is handed to workers in shared memory segments instead of being
+    pickled, and workers index straight from those segments. Metadata is returned through shared memory as well.
+
+    Every segment is named after the owning process (`pvoctopus_<pid>_<start time>_<n>`) and tracked until its job
+    finishes. If a worker dies, the segments of all in-flight jobs are unlinked and the pool is restarted on the next
+    submission. Segments left behind by owners that no longer exist are reclaimed on construction; the start time in the
+    name keeps a process that reuses the PID of a dead owner from being mistaken for it.
+    """
+
+    def __init__(
+            self,
+            access_key: str,
+            num_workers: Optional[int] = None,
+            model_path: Optional[str] = None,
+            library_path: Optional[str] = None) -> None:
+        """
+        Constructor.
+
+        :param access_key: AccessKey provided by Picovoice Console (https://console.picovoice.ai/)
+        :param num_workers: Number of worker processes. Defaults to the number of CPUs.
+        :param model_path: Absolute path to the file containing model parameters. If not set it will be set to the
+        default location for English model.
+        :param library_path: Absolute path to Octopus' dynamic library. If not set it will be set to the default
+        location.
+        """
+
+        if num_workers is not None and (not isinstance(num_workers, int) or num_workers < 1):
+            raise OctopusInvalidArgumentError("`num_workers` should be a positive integer.")
+
+        self._init_args = (access_key, model_path, library_path)
+        self._num_workers = num_workers or os.cpu_count()
+        pid = os.getpid()
+        start_time = _process_start_time(pid)
+        self._names = ('%s_%d_%d_%d' % (SHARED_MEMORY_PREFIX, pid, start_time, i) for i in itertools.count())
+        self._live_segments = set()
+        self._lock = threading.Lock()
+        self._executor = None
+
+        self.reclaim_orphaned_segments()
+
+    @staticmethod
+    def reclaim_orphaned_segments() -> Sequence[str]:
+        """
+        Unlinks segments whose owning process no longer exists. Only supported on Linux, where segments are visible
+        under `/dev/shm`.
+
+        :return: Names of the reclaimed segments.
+        """
+
+        if platform.system() != 'Linux' or not os.path.isdir(_SHM_DIRECTORY):
+            return list()
+
+        reclaimed = list()
+        for name in os.listdir(_SHM_DIRECTORY):
+            parts = name.split('_')
+            if len(parts) != 4 or parts[0] != SHARED_MEMORY_PREFIX or not all(x.isdigit() for x in parts[1:]):
+                continue
+            if _process_start_time(int(parts[1])) != int(parts[2]):
+                _unlink(name)
+                reclaimed.append(name)
+        return reclaimed
+
+    def allocate(self, num_samples: int) -> 'OctopusSharedPcm':
+        """
+        Creates a shared memory segment for audio that is about to be decoded, so that it can be written in place and
+        indexed without another copy.
+
+        :param num_samples: Number of 16-bit samples.
+        :return: A segment to write samples into and pass to `.submit_shared()`.
+        """
+
+        if not isinstance(num_samples, int) or num_samples < 1:
+            raise OctopusInvalidArgumentError("`num_samples` should be a positive integer.")
+
+        with self._lock:
+            name = next(self._names)
+            segment = shared_memory.SharedMemory(name=name, create=True, size=num_samples * 2)
+            self._live_segments.add(name)
+        segment.close()
+
+        return OctopusSharedPcm(name, num_samples)
+
+    def submit(self, pcm: Sequence[int]) -> 'Future[OctopusMetadata]':
+        """
+        Copies audio into shared memory and schedules it for indexing.
+
+        :param pcm: Audio data. See `Octopus.index_audio_data()`.
+        :return: A future resolving to the metadata object.
+        """
+
+        shared_pcm = self.allocate(len(pcm))
+        try:
+            try:
+                shared_pcm.samples[:] = memoryview(pcm)
+            except (TypeError, ValueError, NotImplementedError):
+                shared_pcm.samples[:] = array('h', pcm)
+        except Exception:
+            shared_pcm.close()
+            self._release((shared_pcm.name,))
+            raise
+
+        return self.submit_shared(shared_pcm)
+
+    def submit_shared(self, shared_pcm: 'OctopusSharedPcm') -> 'Future[OctopusMetadata]':
+        """
+        Schedules audio written to a segment returned by `.allocate()` for indexing. The segment must not be accessed
+        afterwards; it is unlinked once the job finishes.
+
+        :param shared_pcm: Segment holding the audio.
+        :return: A future resolving to the metadata object.
+        """
+
+        pcm_name = shared_pcm.name
+        num_samples = shared_pcm.num_samples
+        shared_pcm.close()
+
+        with self._lock:
+            if pcm_name not in self._live_segments:
+                raise OctopusInvalidArgumentError("Unknown shared memory segment `%s`." % pcm_name)
+            metadata_name = next(self._names)
+            self._live_segments.add(metadata_name)
+            executor = self._get_executor()
+
+        result = Future()
+        try:
+            job = executor.submit(_index_worker, pcm_name, num_samples, metadata_name)
+        except BrokenProcessPool as e:
+            self._release((pcm_name, metadata_name))
+            self._reset_executor(executor)
+            result.set_exception(e)
+            return result
+
+        def on_done(f: Future) -> None:
+            try:
+                if f.exception() is not None:
+                    if isinstance(f.exception(), BrokenProcessPool):
+                        self._reset_executor(executor)
+                    result.set_exception(f.exception())
+                    return
+
+                metadata_segment = _attach(metadata_name)
+                try:
+                    with metadata_segment.buf[:f.result()] as metadata_view:
+                        metadata = OctopusMetadata.from_bytes(metadata_view)
+                finally:
+                    metadata_segment.close()
+                result.set_result(metadata)
+            except Exception as e:
+                result.set_exception(e)
+            finally:
+                self._release((pcm_name, metadata_name))
+
+        job.add_done_callback(on_done)
+        return result
+
+    def index(self, pcms: Iterable[Sequence[int]]) -> List[OctopusMetadata]:
+        """
+        Indexes several pieces of audio in parallel.
+
+        :param pcms: Audio data. See `Octopus.index_audio_data()`.
+        :return: Metadata objects in the order of `pcms`.
+        """
+
+        futures = [self.submit(x) for x in pcms]
+        return [x.result() for x in futures]
+
+    @property
+    def num_live_segments(self) -> int:
+        """Number of shared memory segments owned by in-flight jobs."""
+
+        return len(self._live_segments)
+
+    def delete(self) -> None:
+        """Stops the worker processes and unlinks all remaining segments."""
+
+        with self._lock:
+            executor = self._executor
+            self._executor = None
+        if executor is not None:
+            executor.shutdown(wait=True, cancel_futures=True)
+        self._release(list(self._live_segments))
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(
+                max_workers=self._num_workers,
+                initializer=_init_worker,
+                initargs=self._init_args)
+        return self._executor
+
+    def _reset_executor(self, executor: ProcessPoolExecutor) -> None:
+        with self._lock:
+            if self._executor is executor:
+                self._executor = None
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    def _release(self, names: Iterable[str]) -> None:
+        with self._lock:
+            names = [x for x in names if x in self._live_segments]
+            self._live_segments.difference_update(names)
+        for name in names:
+            _unlink(name)
+
+
+class OctopusSharedPcm(object):
+    """
+    Audio in a shared memory segment created by `OctopusSharedMemoryIndexer.allocate()`.
+    """
+
+    def __init__(self, name: str, num_samples: int) -> None:
+        self._name = name
+        self._num_samples = num_samples
+        self._segment = _attach(name)
+        self._samples = self._segment.buf[:num_samples * 2].cast('h')
+
+    @property
+    def name(self) -> str:
+        return self._name
+
+    @property
+    def num_samples(self) -> int:
+        return self._num_samples
+
+    @property
+    def samples(self) -> memoryview:
+        """Writable view of the 16-bit samples. Views derived from it must be released before submission."""
+
+        if self._samples is None:
+            raise OctopusInvalidArgumentError("Shared memory segment `%s` has been closed." % self._name)
+        return self._samples
+
+    def close(self) -> None:
+        """Unmaps the segment from this process. The segment itself stays alive until its job finishes."""
+
+        if self._samples is not None:
+            self._samples.release()
+            self._samples = None
+            self._segment.close()
+
+
+__all__ = [
+    'OctopusSharedMemoryIndexer',
+    'OctopusSharedPcm',
+]
@@ -0,0 +1,251 @@
+#
+# Copyright 2023 Picovoice Inc.
+#
+# You may not use this file except in compliance with the license. A copy of the license is located in the "LICENSE"
+# file accompanying this source.
+#
+# Unless required by applicable law or agreed to in writing, software distributed under the License is distributed on
+# an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the License for the
+# specific language governing permissions and limitations under the License.
+#
+
+import json
+import os
+import struct
+from collections import namedtuple
+from typing import Callable, Dict, Iterable, Optional, Sequence, Union
+
+from ._octopus import Octopus, OctopusInvalidArgumentError, OctopusKeyError, OctopusMetadata
+
+_POSTING_STRUCT = struct.Struct('<Ifff')
+
+
+class OctopusStandingQueries(object):
+    """
+    A watchlist of phrases that are searched once per document, when the document is added, instead of on every lookup.
+    Matches are stored in an on-disk postings store with one file of fixed-size records per phrase, so looking up a
+    phrase across the whole corpus reads only its hits and makes no engine calls.
+
+    Documents are numbered in the order they are added. Each phrase has a watermark: the number of documents it has been
+    searched against. Phrases registered after documents were added lag behind and catch up through `.backfill()`, which
+    can be run incrementally and resumes from the watermark after an interruption.
+    """
+
+    Posting = namedtuple('Posting', ['document_id', 'start_sec', 'end_sec', 'probability'])
+
+    STATE_FILE_NAME = 'state.json'
+    DOCUMENTS_FILE_NAME = 'documents.txt'
+    POSTINGS_DIRECTORY_NAME = 'postings'
+
+    def __init__(self, octopus: Octopus, path: str) -> None:
+        """
+        Constructor.
+
+        :param octopus: Octopus instance used to search new documents.
+        :param path: Directory of the postings store. It is created if it does not exist.
+        """
+
+        self._octopus = octopus
+        self._path = path
+        os.makedirs(os.path.join(path, self.POSTINGS_DIRECTORY_NAME), exist_ok=True)
+
+        self._documents = list()
+        documents_path = os.path.join(path, self.DOCUMENTS_FILE_NAME)
+        if os.path.exists(documents_path):
+            with open(documents_path, 'rb+') as f:
+                data = f.read()
+                # Drop a partially written last line from an interrupted `.add()`.
+                f.truncate(data.rfind(b'\n') + 1)
+            self._documents = data[:data.rfind(b'\n') + 1].decode('utf-8').splitlines()
+        self._document_file = open(documents_path, 'a', encoding='utf-8')
+
+        self._phrases = dict()
+        self._next_phrase_id = 0
+        state_path = os.path.join(path, self.STATE_FILE_NAME)
+        if os.path.exists(state_path):
+            with open(state_path, 'r', encoding='utf-8') as f:
+                state = json.load(f)
+            self._phrases = state['phrases']
+            self._next_phrase_id = state['next_phrase_id']
+
+        # Postings written after the last saved watermark belong to an interrupted update and will be searched again. A
+        # postings file shorter than its saved count lost writes that never reached the disk; it is cut back to the
+        # last document whose postings are all there and its watermark rolled back so that the rest is searched again.
+        is_recovered = False
+        for phrase_state in self._phrases.values():
+            postings_path = self._postings_path(phrase_state['id'])
+            with open(postings_path, 'ab+') as f:
+                num_postings = f.seek(0, os.SEEK_END) // _POSTING_STRUCT.size
+                if num_postings < phrase_state['num_postings']:
+                    f.seek(0)
+                    postings = list(_POSTING_STRUCT.iter_unpack(f.read(num_postings * _POSTING_STRUCT.size)))
+                    watermark = postings[-1][0] if len(postings) > 0 else 0
+                    phrase_state['num_postings'] = sum(1 for x in postings if x[0] < watermark)
+                    phrase_state['watermark'] = min(phrase_state['watermark'], watermark)
+                    is_recovered = True
+                f.truncate(phrase_state['num_postings'] * _POSTING_STRUCT.size)
+        if is_recovered:
+            self._save_state()
+
+    @staticmethod
+    def _normalize(phrase: str) -> str:
+        normalized = ' '.join(phrase.strip().split())
+        if len(normalized) == 0:
+            raise OctopusInvalidArgumentError("Search phrase cannot be empty")
+        return normalized
+
+    def _postings_path(self, phrase_id: int) -> str:
+        return os.path.join(self._path, self.POSTINGS_DIRECTORY_NAME, '%d.bin' % phrase_id)
+
+    def _save_state(self) -> None:
+        state_path = os.path.join(self._path, self.STATE_FILE_NAME)
+        tmp_path = state_path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(dict(phrases=self._phrases, next_phrase_id=self._next_phrase_id), f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, state_path)
+
+    def register(self, phrases: Iterable[str]) -> None:
+        """
+        Adds phrases to the watchlist. New phrases start with a watermark of zero and only see documents added from now
+        on until `.backfill()` catches them up.
+
+        :param phrases: Phrases to watch.
+        """
+
+        for phrase in set(self._normalize(x) for x in phrases):
+            if phrase in self._phrases:
+                continue
+            self._phrases[phrase] = dict(id=self._next_phrase_id, watermark=0, num_postings=0)
+            self._next_phrase_id += 1
+            open(self._postings_path(self._phrases[phrase]['id']), 'wb').close()
+        self._save_state()
+
+    def unregister(self, phrases: Iterable[str]) -> None:
+        """
+        Removes phrases and their postings from the watchlist.
+
+        :param phrases: Phrases to remove.
+        """
+
+        for phrase in set(self._normalize(x) for x in phrases):
+            phrase_state = self._phrases.pop(phrase, None)
+            if phrase_state is not None:
+                os.remove(self._postings_path(phrase_state['id']))
+        self._save_state()
+
+    def add(self, document_id: str, metadata: OctopusMetadata) -> None:
+        """
+        Records a new document and searches it for every phrase whose watermark has caught up with the corpus.
+
+        :param document_id: ID of the document. IDs are not required to be unique but lookups cannot tell duplicates
+        apart.
+        :param metadata: Metadata of the document.
+        """
+
+        if '\n' in document_id:
+            raise OctopusInvalidArgumentError("`document_id` cannot contain newlines.")
+
+        sequence_number = len(self._documents)
+        self._document_file.write(document_id + '\n')
+        self._document_file.flush()
+        os.fsync(self._document_file.fileno())
+        self._documents.append(document_id)
+
+        caught_up = [x for x, y in self._phrases.items() if y['watermark'] == sequence_number]
+        self._search(sequence_number, metadata, caught_up)
+        self._save_state()
+
+    def backfill(
+            self,
+            metadata_provider: Union[Callable[[str], OctopusMetadata], Dict[str, OctopusMetadata]],
+            max_documents: Optional[int] = None) -> int:
+        """
+        Searches lagging phrases against documents they have not seen yet, oldest document first. All phrases lagging
+        at the same document share one pass over it. The watermarks are saved after every document.
+
+        :param metadata_provider: A callable or mapping resolving a document ID to its metadata (e.g. `OctopusCorpus`).
+        :param max_documents: Maximum number of documents to visit in this call. Visits all if not set.
+        :return: Number of documents visited.
+        """
+
+        get_metadata = metadata_provider.__getitem__ if hasattr(metadata_provider, '__getitem__') else metadata_provider
+
+        num_visited = 0
+        while max_documents is None or num_visited < max_documents:
+            lagging = [(y['watermark'], x) for x, y in self._phrases.items() if y['watermark'] < len(self._documents)]
+            if len(lagging) == 0:
+                break
+
+            sequence_number = min(x[0] for x in lagging)
+            phrases = [x[1] for x in lagging if x[0] == sequence_number]
+            self._search(sequence_number, get_metadata(self._documents[sequence_number]), phrases)
+            self._save_state()
+            num_visited += 1
+
+        return num_visited
+
+    def _search(self, sequence_number: int, metadata: OctopusMetadata, phrases: Sequence[str]) -> None:
+        if len(phrases) > 0:
+            matches = self._octopus.search(metadata, phrases)
+            for phrase, phrase_matches in matches.items():
+                phrase_state = self._phrases[phrase]
+                with open(self._postings_path(phrase_state['id']), 'ab') as f:
+                    f.write(b''.join(
+                        _POSTING_STRUCT.pack(sequence_number, x.start_sec, x.end_sec, x.probability)
+                        for x in phrase_matches))
+                    f.flush()
+                    os.fsync(f.fileno())
+                phrase_state['num_postings'] += len(phrase_matches)
+
+        for phrase in phrases:
+            self._phrases[phrase]['watermark'] = sequence_number + 1
+
+    def lookup(self, phrase: str) -> Sequence['OctopusStandingQueries.Posting']:
+        """
+        Returns every stored match of a phrase without calling the engine. Results only cover documents below the
+        phrase's watermark.
+
+        :param phrase: A registered phrase.
+        :return: Matches ordered by the order in which documents were added.
+        """
+
+        phrase_state = self._phrases.get(self._normalize(phrase))
+        if phrase_state is None:
+            raise OctopusKeyError("Phrase `%s` is not registered." % phrase)
+
+        with open(self._postings_path(phrase_state['id']), 'rb') as f:
+            data = f.read(phrase_state['num_postings'] * _POSTING_STRUCT.size)
+
+        return [self.Posting(self._documents[x[0]], x[1], x[2], x[3]) for x in _POSTING_STRUCT.iter_unpack(data)]
+
+    def watermark(self, phrase: str) -> int:
+        """Number of documents a registered phrase has been searched against."""
+
+        phrase_state = self._phrases.get(self._normalize(phrase))
+        if phrase_state is None:
+            raise OctopusKeyError("Phrase `%s` is not registered." % phrase)
+        return phrase_state['watermark']
+
+    @property
+    def phrases(self) -> Sequence[str]:
+        """Registered phrases."""
+
+        return list(self._phrases.keys())
+
+    @property
+    def num_documents(self) -> int:
+        """Number of documents added."""
+
+        return len(self._documents)
+
+    def close(self) -> None:
+        """Closes the postings store."""
+
+        self._document_file.close()
+
+
+__all__ = [
+    'OctopusStandingQueries',
+]
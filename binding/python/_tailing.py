@@ -0,0 +1,239 @@
+#
+# Copyright 2023 Picovoice Inc.
+#
+# You may not use this file except in compliance with the license. A copy of the license is located in the "LICENSE"
+# file accompanying this source.
+#
+# Unless required by applicable law or agreed to in writing, software distributed under the License is distributed on
+# an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the License for the
+# specific language governing permissions and limitations under the License.
+#
+
+import os
+import sys
+import threading
+import time
+from array import array
+from collections import namedtuple
+from typing import Dict, Iterable, List, Optional, Sequence
+
+from ._octopus import Octopus, OctopusInvalidArgumentError, OctopusIOError, read_wav_header
+
+# Largest header that may still be in the process of being written rather than a file that is not a WAV file.
+_MAX_INCOMPLETE_HEADER_SIZE = 4096
+
+
+class OctopusTailingIndexer(object):
+    """
+    Indexes a WAV file while it is being recorded. Each `.update()` reads only the frames appended since the last one.
+    Audio is indexed in segments of `segment_sec`, each starting `overlap_sec` before the end of the previous one so
+    that phrases crossing a boundary are found whole. The unfinished last segment is indexed again on every update, so
+    the work per update is bounded by the new audio plus one segment, however long the recording grows.
+
+    The file must only grow. Only the first channel of multi-channel files is indexed. `.update()` and `.follow()` must
+    be called from one thread at a time, while `.search()` can be called from any thread. Calls to the Octopus instance
+    are serialized, so it should not be used elsewhere meanwhile.
+    """
+
+    Segment = namedtuple('Segment', ['audio_start_sec', 'start_sec', 'end_sec', 'metadata'])
+
+    def __init__(
+            self,
+            octopus: Octopus,
+            path: str,
+            segment_sec: float = 30.,
+            overlap_sec: float = 2.) -> None:
+        """
+        Constructor.
+
+        :param octopus: Octopus instance used to index and search.
+        :param path: Path to a 16-bit PCM WAV file at `octopus.sample_rate`. It does not need to exist yet.
+        :param segment_sec: Length of each segment, without its overlap.
+        :param overlap_sec: Audio before the start of a segment that is indexed with it. Should be longer than the
+        longest phrase searched for.
+        """
+
+        if not (0 <= overlap_sec < segment_sec):
+            raise OctopusInvalidArgumentError("Segment lengths should satisfy `0 <= overlap_sec < segment_sec`.")
+
+        self._octopus = octopus
+        self._path = path
+        self._sample_rate = octopus.sample_rate
+        self._segment_samples = round(segment_sec * self._sample_rate)
+        self._overlap_samples = round(overlap_sec * self._sample_rate)
+
+        self._num_channels = None
+        self._data_offset = None
+        self._num_samples = 0
+
+        self._lock = threading.Lock()
+        self._octopus_lock = threading.Lock()
+        self._segments = list()
+        self._partial_segment = None
+        # Samples from the start of the overlap of the unfinished segment onwards.
+        self._tail = array('h')
+        self._tail_start = 0
+        self._segment_start = 0
+
+    def _read_header(self, f) -> bool:
+        try:
+            header = read_wav_header(f)
+        except OctopusIOError:
+            if os.fstat(f.fileno()).st_size < _MAX_INCOMPLETE_HEADER_SIZE:
+                return False
+            raise
+        if header.sample_rate != self._sample_rate:
+            raise OctopusInvalidArgumentError(
+                "Audio file should have a sample rate of %d, got %d" % (self._sample_rate, header.sample_rate))
+        self._num_channels = header.num_channels
+        self._data_offset = f.tell()
+        return True
+
+    def _read_new_samples(self) -> array:
+        if not os.path.exists(self._path):
+            return array('h')
+
+        with open(self._path, 'rb') as f:
+            if self._data_offset is None and not self._read_header(f):
+                return array('h')
+
+            frame_size = 2 * self._num_channels
+            num_frames = (os.fstat(f.fileno()).st_size - self._data_offset) // frame_size
+            if num_frames < self._num_samples:
+                raise OctopusIOError("Audio file at `%s` has been truncated." % self._path)
+
+            f.seek(self._data_offset + self._num_samples * frame_size)
+            data = f.read((num_frames - self._num_samples) * frame_size)
+
+        samples = array('h')
+        samples.frombytes(data[:len(data) - len(data) % frame_size])
+        if sys.byteorder != 'little':
+            samples.byteswap()
+        if self._num_channels > 1:
+            samples = samples[::self._num_channels]
+        return samples
+
+    def update(self) -> float:
+        """
+        Indexes the audio appended to the file since the last update.
+
+        :return: Length of the new audio in seconds.
+        """
+
+        samples = self._read_new_samples()
+        if len(samples) == 0:
+            return 0.
+
+        self._tail.extend(samples)
+        self._num_samples += len(samples)
+
+        segments = list()
+        while self._num_samples - self._segment_start >= self._segment_samples:
+            end = self._segment_start + self._segment_samples
+            segments.append(self._index(end))
+
+            tail_start = max(0, end - self._overlap_samples)
+            del self._tail[:tail_start - self._tail_start]
+            self._tail_start = tail_start
+            self._segment_start = end
+
+        partial_segment = None
+        if self._num_samples > self._segment_start:
+            partial_segment = self._index(self._num_samples)
+
+        with self._lock:
+            self._segments.extend(segments)
+            self._partial_segment = partial_segment
+
+        return len(samples) / self._sample_rate
+
+    def _index(self, end: int) -> 'OctopusTailingIndexer.Segment':
+        with self._octopus_lock:
+            metadata = self._octopus.index_audio_data(self._tail[:end - self._tail_start])
+        return self.Segment(
+            audio_start_sec=self._tail_start / self._sample_rate,
+            start_sec=self._segment_start / self._sample_rate,
+            end_sec=end / self._sample_rate,
+            metadata=metadata)
+
+    def follow(
+            self,
+            poll_interval_sec: float = 1.,
+            idle_timeout_sec: Optional[float] = None,
+            stop_event: Optional[threading.Event] = None) -> None:
+        """
+        Calls `.update()` every `poll_interval_sec` until the file stops growing for `idle_timeout_sec` or
+        `stop_event` is set. Searches can run from other threads meanwhile.
+
+        :param poll_interval_sec: Time between updates.
+        :param idle_timeout_sec: Time without new audio after which the recording is considered finished. Follows
+        forever if not set.
+        :param stop_event: Event that stops following when set.
+        """
+
+        if stop_event is None:
+            stop_event = threading.Event()
+
+        last_growth = time.monotonic()
+        while not stop_event.is_set():
+            if self.update() > 0:
+                last_growth = time.monotonic()
+            elif idle_timeout_sec is not None and time.monotonic() - last_growth > idle_timeout_sec:
+                return
+            stop_event.wait(poll_interval_sec)
+
+    @property
+    def segments(self) -> Sequence['OctopusTailingIndexer.Segment']:
+        """Indexed segments, including the unfinished last one."""
+
+        with self._lock:
+            if self._partial_segment is None:
+                return list(self._segments)
+            return self._segments + [self._partial_segment]
+
+    @property
+    def duration_sec(self) -> float:
+        """Length of the audio indexed so far."""
+
+        return self._num_samples / self._sample_rate
+
+    def search(self, phrases: Iterable[str]) -> Dict[str, Sequence[Octopus.Match]]:
+        """
+        Searches the audio indexed so far. Match times are relative to the start of the recording.
+
+        :param phrases: An iterable of phrases to search the index for.
+        :return matches: A dictionary map of found matches.
+        """
+
+        prepared_query = self._octopus.prepare(phrases)
+
+        matches = dict()
+        for segment in self.segments:
+            with self._octopus_lock:
+                segment_matches = prepared_query.search(segment.metadata)
+            for phrase, phrase_matches in segment_matches.items():
+                for match in phrase_matches:
+                    start_sec = match.start_sec + segment.audio_start_sec
+                    end_sec = match.end_sec + segment.audio_start_sec
+                    # Matches that end before the start of the segment lie in its overlap and were found already.
+                    if end_sec > segment.start_sec or segment.start_sec == 0:
+                        matches.setdefault(phrase, list()).append(Octopus.Match(start_sec, end_sec, match.probability))
+
+        return {x: self._merge(y) for x, y in matches.items()}
+
+    @staticmethod
+    def _merge(matches: List[Octopus.Match]) -> Sequence[Octopus.Match]:
+        # A phrase right at a boundary can be found by both segments with slightly different times.
+        merged = list()
+        for match in sorted(matches):
+            if len(merged) > 0 and match.start_sec < merged[-1].end_sec:
+                if match.probability > merged[-1].probability:
+                    merged[-1] = match
+            else:
+                merged.append(match)
+        return merged
+
+
+__all__ = [
+    'OctopusTailingIndexer',
+]
@@ -0,0 +1,428 @@
+#
+# Copyright 2023 Picovoice Inc.
+#
+# You may not use this file except in compliance with the license. A copy of the license is located in the "LICENSE"
+# file accompanying this source.
+#
+# Unless required by applicable law or agreed to in writing, software distributed under the License is distributed on
+# an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the License for the
+# specific language governing permissions and limitations under the License.
+#
+
+import json
+import mmap
+import os
+import threading
+import time
+from collections import namedtuple
+from typing import Dict, Iterable, Iterator, Optional, Sequence, Tuple
+
+from ._compressed_metadata import (
+    COMPRESSED_METADATA_FILE_EXTENSION,
+    OctopusCompressedMetadata,
+    OctopusDecompressionBuffer,
+)
+from ._corpus import METADATA_FILE_EXTENSION
+from ._octopus import Octopus, OctopusInvalidArgumentError, OctopusIOError, OctopusKeyError, OctopusMetadata
+
+
+class OctopusTieredStore(object):
+    """
+    Metadata store with two tiers. Every document is archived compressed in the cold tier; the documents queried most
+    often and most recently also have an uncompressed copy in the hot tier, which is memory-mapped and searched in
+    place. Each document has an access score that is incremented when it is read with `.get()` or found by `.search()`
+    and halves every `half_life_sec`. `.rebalance()` keeps the documents with the highest scores hot, up to
+    `hot_capacity_bytes`. It runs after each corpus search, including one the caller stops iterating early; callers that
+    only use `.get()` should run it periodically.
+
+    `.add()` and `.remove()` append the change to a journal on disk. The journal is folded into a snapshot of all
+    documents and their scores by `.rebalance()` and `.close()`, and whenever it grows longer than the list of
+    documents, so only accesses since the last snapshot are forgotten after a crash.
+    """
+
+    HOT_DIRECTORY_NAME = 'hot'
+    COLD_DIRECTORY_NAME = 'cold'
+    STATE_FILE_NAME = 'state.json'
+    JOURNAL_FILE_NAME = 'journal.jsonl'
+
+    # The journal is folded into the snapshot once it has more entries than this or than there are documents.
+    MIN_JOURNAL_LENGTH = 1024
+
+    Stats = namedtuple('Stats', [
+        'num_documents',
+        'num_hot',
+        'hot_bytes',
+        'hot_capacity_bytes',
+        'num_promotions',
+        'num_demotions',
+        'num_hot_reads',
+        'num_cold_reads'])
+
+    def __init__(
+            self,
+            path: str,
+            hot_capacity_bytes: int,
+            half_life_sec: float = 7 * 24 * 60 * 60.,
+            codec: str = 'lzma',
+            level: int = 6) -> None:
+        """
+        Constructor.
+
+        :param path: Directory of the store. It is created if it does not exist.
+        :param hot_capacity_bytes: Maximum total size of documents in the hot tier.
+        :param half_life_sec: Time for an access to lose half of its weight in the score of a document.
+        :param codec: Codec of the cold tier. One of `COMPRESSION_CODECS`.
+        :param level: Compression level of the cold tier.
+        """
+
+        if hot_capacity_bytes < 0:
+            raise OctopusInvalidArgumentError("`hot_capacity_bytes` should be non-negative.")
+        if half_life_sec <= 0:
+            raise OctopusInvalidArgumentError("`half_life_sec` should be positive.")
+
+        self._path = path
+        self._hot_capacity_bytes = hot_capacity_bytes
+        self._half_life_sec = half_life_sec
+        self._codec = codec
+        self._level = level
+        os.makedirs(os.path.join(path, self.HOT_DIRECTORY_NAME), exist_ok=True)
+        os.makedirs(os.path.join(path, self.COLD_DIRECTORY_NAME), exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._rebalance_lock = threading.Lock()
+        self._save_lock = threading.Lock()
+        # Document ID to `[size, score, time of last access]`.
+        self._documents = dict()
+        self._maps = dict()
+        self._hot = dict()
+        self._hot_bytes = 0
+        self._num_promotions = 0
+        self._num_demotions = 0
+        self._num_hot_reads = 0
+        self._num_cold_reads = 0
+
+        state_path = os.path.join(path, self.STATE_FILE_NAME)
+        if os.path.exists(state_path):
+            with open(state_path, 'r', encoding='utf-8') as f:
+                self._documents = json.load(f)['documents']
+
+        journal_path = os.path.join(path, self.JOURNAL_FILE_NAME)
+        self._journal_entries = list()
+        if os.path.exists(journal_path):
+            with open(journal_path, 'r', encoding='utf-8') as f:
+                # A partially written last entry belongs to a change that did not complete.
+                self._journal_entries = [x for x in f.read().splitlines(keepends=True) if x.endswith('\n')]
+            for entry in self._journal_entries:
+                self._apply(json.loads(entry))
+        self._journal = None
+        self._open_journal()
+
+        for document_id in self._documents:
+            if os.path.exists(self._hot_path(document_id)):
+                self._map(document_id)
+                self._hot_bytes += self._documents[document_id][0]
+
+        if len(self._journal_entries) > 0:
+            self._save_state()
+
+    def _hot_path(self, document_id: str) -> str:
+        return os.path.join(self._path, self.HOT_DIRECTORY_NAME, document_id + METADATA_FILE_EXTENSION)
+
+    def _cold_path(self, document_id: str) -> str:
+        return os.path.join(self._path, self.COLD_DIRECTORY_NAME, document_id + COMPRESSED_METADATA_FILE_EXTENSION)
+
+    @staticmethod
+    def _write(path: str, data: bytes) -> None:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+
+    def _open_journal(self) -> None:
+        journal_path = os.path.join(self._path, self.JOURNAL_FILE_NAME)
+        tmp_path = journal_path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write(''.join(self._journal_entries))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, journal_path)
+        if self._journal is not None:
+            self._journal.close()
+        self._journal = open(journal_path, 'a', encoding='utf-8')
+
+    def _apply(self, entry: Dict) -> None:
+        if entry['document'] is None:
+            self._documents.pop(entry['id'], None)
+        else:
+            self._documents[entry['id']] = entry['document']
+
+    def _log(self, document_id: str) -> bool:
+        entry = json.dumps(dict(id=document_id, document=self._documents.get(document_id))) + '\n'
+        self._journal.write(entry)
+        self._journal.flush()
+        os.fsync(self._journal.fileno())
+        self._journal_entries.append(entry)
+        return len(self._journal_entries) > max(self.MIN_JOURNAL_LENGTH, len(self._documents))
+
+    def _map(self, document_id: str) -> None:
+        with open(self._hot_path(document_id), 'rb') as f:
+            metadata_map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_COPY)
+        self._maps[document_id] = metadata_map
+        self._hot[document_id] = OctopusMetadata.from_buffer(metadata_map)
+
+    def _promote(self, document_id: str) -> None:
+        self._map(document_id)
+        self._hot_bytes += self._documents[document_id][0]
+        self._num_promotions += 1
+
+    def _demote(self, document_id: str) -> None:
+        self._unmap(document_id)
+        os.remove(self._hot_path(document_id))
+        self._hot_bytes -= self._documents[document_id][0]
+        self._num_demotions += 1
+
+    def _unmap(self, document_id: str) -> None:
+        self._hot.pop(document_id, None)
+        metadata_map = self._maps.pop(document_id, None)
+        if metadata_map is not None:
+            try:
+                metadata_map.close()
+            except BufferError:
+                # A search still holds the metadata; the mapping is released once it is garbage collected.
+                pass
+
+    def _score(self, document_id: str, now: float) -> float:
+        _, score, last_access = self._documents[document_id]
+        return score * 0.5 ** ((now - last_access) / self._half_life_sec)
+
+    def _touch(self, document_id: str) -> None:
+        with self._lock:
+            if document_id in self._documents:
+                now = time.time()
+                document = self._documents[document_id]
+                document[1] = self._score(document_id, now) + 1
+                document[2] = now
+
+    def _read_cold(self, document_id: str, buffer: Optional[OctopusDecompressionBuffer] = None) -> OctopusMetadata:
+        cold_path = self._cold_path(document_id)
+        if not os.path.exists(cold_path):
+            raise OctopusIOError("Couldn't find metadata file at `%s`." % cold_path)
+        with open(cold_path, 'rb') as f:
+            return OctopusCompressedMetadata.from_bytes(f.read()).decompress(buffer)
+
+    def add(self, document_id: str, metadata: OctopusMetadata) -> None:
+        """
+        Archives a document in the cold tier, replacing any document with the same ID. It is counted as accessed and
+        also placed in the hot tier if there is room.
+
+        :param document_id: Document ID.
+        :param metadata: Metadata object.
+        """
+
+        compressed = OctopusCompressedMetadata.compress(metadata, codec=self._codec, level=self._level)
+        self._write(self._cold_path(document_id), compressed.to_bytes())
+
+        with self._lock:
+            if document_id in self._hot:
+                self._demote(document_id)
+            self._documents[document_id] = [metadata.size, 1., time.time()]
+            if self._hot_bytes + metadata.size <= self._hot_capacity_bytes:
+                self._write(self._hot_path(document_id), metadata.to_bytes())
+                self._promote(document_id)
+            is_journal_full = self._log(document_id)
+        if is_journal_full:
+            self._save_state()
+
+    def remove(self, document_id: str) -> None:
+        """
+        Deletes a document from both tiers.
+
+        :param document_id: Document ID.
+        """
+
+        with self._lock:
+            if document_id not in self._documents:
+                raise OctopusKeyError("Couldn't find document `%s`." % document_id)
+            if document_id in self._hot:
+                self._demote(document_id)
+            del self._documents[document_id]
+            os.remove(self._cold_path(document_id))
+            is_journal_full = self._log(document_id)
+        if is_journal_full:
+            self._save_state()
+
+    def get(self, document_id: str) -> OctopusMetadata:
+        """
+        Reads a document from the hot tier, or decompresses it from the cold tier.
+
+        :param document_id: Document ID.
+        :return: Metadata object.
+        """
+
+        with self._lock:
+            if document_id not in self._documents:
+                raise OctopusKeyError("Couldn't find document `%s`." % document_id)
+            metadata = self._hot.get(document_id)
+            if metadata is not None:
+                self._num_hot_reads += 1
+            else:
+                self._num_cold_reads += 1
+
+        if metadata is None:
+            metadata = self._read_cold(document_id)
+        self._touch(document_id)
+        return metadata
+
+    def search(
+            self,
+            octopus: Octopus,
+            phrases: Iterable[str]) -> Iterator[Tuple[str, Dict[str, Sequence[Octopus.Match]]]]:
+        """
+        Searches every document, hot documents first and within each tier in order of decreasing score, yielding
+        matches as each document is searched. Documents with matches count as accessed.
+
+        :param octopus: Octopus instance to search with.
+        :param phrases: An iterable of phrases to search the index for.
+        :return: An iterator of `(document ID, matches)` for documents with at least one match.
+        """
+
+        prepared_query = octopus.prepare(phrases)
+
+        with self._lock:
+            now = time.time()
+            document_ids = sorted(
+                self._documents,
+                key=lambda x: (x not in self._hot, -self._score(x, now)))
+
+        buffer = OctopusDecompressionBuffer()
+        try:
+            for document_id in document_ids:
+                with self._lock:
+                    if document_id not in self._documents:
+                        continue
+                    metadata = self._hot.get(document_id)
+                    if metadata is not None:
+                        self._num_hot_reads += 1
+                    else:
+                        self._num_cold_reads += 1
+                if metadata is None:
+                    metadata = self._read_cold(document_id, buffer)
+
+                matches = prepared_query.search(metadata)
+                if any(len(x) > 0 for x in matches.values()):
+                    self._touch(document_id)
+                    yield document_id, matches
+        finally:
+            self.rebalance()
+
+    def rebalance(self) -> None:
+        """
+        Moves the documents with the highest access scores to the hot tier and the rest to the cold tier, and saves the
+        scores.
+        """
+
+        with self._rebalance_lock:
+            with self._lock:
+                now = time.time()
+                hot_ids = set()
+                hot_bytes = 0
+                for document_id in sorted(self._documents, key=lambda x: -self._score(x, now)):
+                    size = self._documents[document_id][0]
+                    if hot_bytes + size <= self._hot_capacity_bytes:
+                        hot_ids.add(document_id)
+                        hot_bytes += size
+
+                for document_id in [x for x in self._hot if x not in hot_ids]:
+                    self._demote(document_id)
+                promotions = [(x, self._documents[x]) for x in hot_ids if x not in self._hot]
+
+            # Documents are decompressed and written outside the lock, so reads and searches are not held up.
+            for document_id, document in promotions:
+                try:
+                    metadata = self._read_cold(document_id)
+                except OctopusIOError:
+                    continue
+                tmp_path = self._hot_path(document_id) + '.rebalance.tmp'
+                with open(tmp_path, 'wb') as f:
+                    f.write(metadata.to_bytes())
+
+                with self._lock:
+                    # The document may have been replaced, removed or promoted by `.add()` in the meantime.
+                    unchanged = self._documents.get(document_id) is document and document_id not in self._hot
+                    if unchanged and self._hot_bytes + document[0] <= self._hot_capacity_bytes:
+                        os.replace(tmp_path, self._hot_path(document_id))
+                        self._promote(document_id)
+                        tmp_path = None
+                if tmp_path is not None:
+                    os.remove(tmp_path)
+
+        self._save_state()
+
+    def _save_state(self) -> None:
+        with self._save_lock:
+            with self._lock:
+                documents = {x: list(y) for x, y in self._documents.items()}
+                num_entries = len(self._journal_entries)
+
+            # The snapshot is serialized and written outside the lock so that reads and searches are not held up.
+            state_path = os.path.join(self._path, self.STATE_FILE_NAME)
+            tmp_path = state_path + '.tmp'
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(dict(documents=documents), f)
+                f.flush()
+                os.fsync(f.fileno())
+
+            with self._lock:
+                os.replace(tmp_path, state_path)
+                # Entries logged while the snapshot was written are not in it. Replaying the others over the snapshot
+                # after a crash is harmless, as each entry holds the whole state of its document.
+                self._journal_entries = self._journal_entries[num_entries:]
+                self._open_journal()
+
+    @property
+    def hot_ids(self) -> Sequence[str]:
+        """IDs of documents in the hot tier."""
+
+        return list(self._hot.keys())
+
+    def __contains__(self, document_id: str) -> bool:
+        return document_id in self._documents
+
+    def __len__(self) -> int:
+        return len(self._documents)
+
+    def stats(self) -> 'OctopusTieredStore.Stats':
+        """
+        Number and total size of hot documents, counts of promotions to and demotions from the hot tier, and counts of
+        reads served by each tier.
+        """
+
+        with self._lock:
+            return self.Stats(
+                num_documents=len(self._documents),
+                num_hot=len(self._hot),
+                hot_bytes=self._hot_bytes,
+                hot_capacity_bytes=self._hot_capacity_bytes,
+                num_promotions=self._num_promotions,
+                num_demotions=self._num_demotions,
+                num_hot_reads=self._num_hot_reads,
+                num_cold_reads=self._num_cold_reads)
+
+    def close(self) -> None:
+        """
+        Saves the scores and unmaps the hot tier. Metadata objects obtained from the store must not be used afterwards.
+        """
+
+        self._save_state()
+        with self._lock:
+            for document_id in list(self._hot):
+                self._unmap(document_id)
+            self._journal.close()
+
+
+__all__ = [
+    'OctopusTieredStore',
+]
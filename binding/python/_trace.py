@@ -0,0 +1,344 @@
+#
+# Copyright 2023 Picovoice Inc.
+#
+# You may not use this file except in compliance with the license. A copy of the license is located in the "LICENSE"
+# file accompanying this source.
+#
+# Unless required by applicable law or agreed to in writing, software distributed under the License is distributed on
+# an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the License for the
+# specific language governing permissions and limitations under the License.
+#
+
+import bisect
+import json
+import os
+import random
+import threading
+import time
+from array import array
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Iterable, Iterator, Mapping, Optional, Sequence
+
+from ._octopus import OctopusInvalidArgumentError, OctopusInvalidStateError, OctopusIOError, OctopusMetadata
+from ._pool import OctopusPool
+from ._util import percentile
+
+_TRACE_VERSION = 1
+
+
+class OctopusTraceRecorder(object):
+    """
+    Logs every traced operation as a line of JSON: when it started relative to the start of the trace, the thread that
+    called it, its latency, the sizes of its input and output (audio length, metadata size, number and length of
+    phrases, number of matches) and the name of the exception it raised, if any. Phrases and file paths are only logged
+    with `record_content`, so traces of production traffic can be shared without what was searched for. Attach the
+    recorder with `Octopus.set_trace_recorder()`; it can be shared by several instances and threads.
+    """
+
+    def __init__(self, path: str, record_content: bool = False) -> None:
+        """
+        Constructor.
+
+        :param path: Path of the trace file. It is overwritten.
+        :param record_content: Whether to log search phrases and audio file paths.
+        """
+
+        try:
+            self._f = open(path, 'w', encoding='utf-8')
+        except OSError:
+            raise OctopusIOError("Couldn't create trace file at `%s`." % path)
+
+        self._record_content = record_content
+        self._lock = threading.Lock()
+        self._start = time.perf_counter()
+        self._threads = dict()
+        self._num_events = 0
+
+        self._f.write(json.dumps(dict(trace_version=_TRACE_VERSION, record_content=record_content)) + '\n')
+
+    def record(self, operation: str, function: Callable, *args: Any, **fields: Any) -> Any:
+        """
+        Calls `function(*args)` and logs it as `operation`.
+
+        :param operation: Name of the operation.
+        :param function: Function to call.
+        :param args: Arguments of the function.
+        :param fields: Fields to log. The dictionary `content`, if given, is only logged with `record_content`.
+        :return: Result of the function.
+        """
+
+        content = fields.pop('content', None)
+        start = time.perf_counter()
+        error = None
+        result = None
+        try:
+            result = function(*args)
+            return result
+        except Exception as e:
+            error = type(e).__name__
+            raise
+        finally:
+            latency_sec = time.perf_counter() - start
+
+            event = dict(
+                operation=operation,
+                start_sec=round(start - self._start, 6),
+                latency_sec=round(latency_sec, 6))
+            event.update(fields)
+            if isinstance(result, OctopusMetadata):
+                event['metadata_bytes'] = result.size
+            elif isinstance(result, dict):
+                event['num_matches'] = sum(len(x) for x in result.values())
+            event['error'] = error
+            if self._record_content and content is not None:
+                event.update(content)
+
+            thread_id = threading.get_ident()
+            with self._lock:
+                event['thread'] = self._threads.setdefault(thread_id, len(self._threads))
+                if self._f is not None:
+                    self._f.write(json.dumps(event) + '\n')
+                    self._num_events += 1
+
+    @property
+    def num_events(self) -> int:
+        """Number of operations logged so far."""
+
+        return self._num_events
+
+    def close(self) -> None:
+        """Flushes and closes the trace file. Operations traced afterwards are not logged."""
+
+        with self._lock:
+            if self._f is not None:
+                self._f.close()
+                self._f = None
+
+
+def read_trace(path: str) -> Iterator[Dict[str, Any]]:
+    """
+    Reads the operations logged by `OctopusTraceRecorder`.
+
+    :param path: Path of the trace file.
+    :return: An iterator of operations as dictionaries.
+    """
+
+    if not os.path.exists(path):
+        raise OctopusIOError("Couldn't find trace file at `%s`." % path)
+
+    with open(path, 'r', encoding='utf-8') as f:
+        header = json.loads(f.readline() or '{}')
+        if header.get('trace_version') != _TRACE_VERSION:
+            raise OctopusIOError("Unsupported trace file at `%s`." % path)
+        for line in f:
+            if len(line.strip()) > 0:
+                yield json.loads(line)
+
+
+class OctopusTraceReplayer(object):
+    """
+    Re-drives a recorded trace against a corpus of metadata, keeping the arrival times of the trace scaled by a speed
+    factor, so that the mix of phrase lengths, document sizes and bursts matches real traffic. Operations start on
+    schedule regardless of how many are still running (an open loop), up to `concurrency` at once, and queue after
+    that. Latency is measured from the scheduled start, so it includes time spent queueing; service time only covers
+    the call itself.
+
+    Each search runs against the corpus document closest in size to the recorded one. Recorded phrases are used if the
+    trace has them; otherwise phrases with the recorded number of words are drawn from `phrases`. Audio is indexed from
+    the recorded file path if the trace has it and it exists, and otherwise from `audio`, repeated to the recorded
+    number of samples. Audio files whose length was not recorded are taken to be 16-bit single-channel audio of the
+    recorded file size. Index operations that cannot be reproduced either way are skipped.
+    """
+
+    Stats = namedtuple('Stats', [
+        'speed',
+        'num_operations',
+        'num_errors',
+        'num_skipped',
+        'elapsed_sec',
+        'offered_per_sec',
+        'completed_per_sec',
+        'latency_p50_sec',
+        'latency_p90_sec',
+        'latency_p99_sec',
+        'latency_max_sec',
+        'service_p50_sec',
+        'service_p99_sec',
+        'is_saturated'])
+
+    # A replay is saturated once the median operation waits longer than this multiple of its service time before it
+    # runs, i.e. operations arrive faster than they are served and the queue keeps growing. Waits shorter than the
+    # minimum are scheduling jitter. A replay in which every operation failed did not keep up either.
+    SATURATION_QUEUEING_FACTOR = 1.
+    SATURATION_MIN_QUEUEING_SEC = 0.001
+
+    def __init__(
+            self,
+            pool: OctopusPool,
+            corpus: Mapping[str, OctopusMetadata],
+            events: Iterable[Dict[str, Any]],
+            phrases: Sequence[str] = ('alexa', 'siri', 'google', 'picovoice', 'octopus'),
+            audio: Optional[Sequence[int]] = None,
+            concurrency: Optional[int] = None) -> None:
+        """
+        Constructor.
+
+        :param pool: Pool of Octopus instances that run the operations.
+        :param corpus: Metadata searched by replayed searches, e.g. an `OctopusCorpus`.
+        :param events: Operations of a trace, e.g. from `read_trace()`.
+        :param phrases: Words from which phrases are drawn when the trace has none.
+        :param audio: 16-bit audio at the engine's sample rate used for index operations without a recorded file.
+        :param concurrency: Maximum number of operations running at once. Defaults to the size of the pool.
+        """
+
+        events = sorted(events, key=lambda x: x['start_sec'])
+        if len(corpus) == 0 and any(x['operation'] == 'search' for x in events):
+            raise OctopusInvalidArgumentError("`corpus` should not be empty.")
+        if len(phrases) == 0:
+            raise OctopusInvalidArgumentError("`phrases` should not be empty.")
+
+        self._pool = pool
+        self._events = events
+        self._words = [x for phrase in phrases for x in phrase.split()]
+        self._audio = array('h', audio) if audio is not None else None
+        self._concurrency = concurrency if concurrency is not None else pool.size
+
+        documents = sorted((x.size, x) for x in corpus.values()) if len(corpus) > 0 else list()
+        self._document_sizes = [x[0] for x in documents]
+        self._documents = [x[1] for x in documents]
+
+    def _closest_document(self, size: int) -> OctopusMetadata:
+        i = bisect.bisect_left(self._document_sizes, size)
+        if i == len(self._documents) or (i > 0 and size - self._document_sizes[i - 1] < self._document_sizes[i] - size):
+            i -= 1
+        return self._documents[i]
+
+    def _prepare(self, event: Dict[str, Any], rng: random.Random) -> Optional[Callable]:
+        operation = event['operation']
+        if operation == 'search':
+            metadata = self._closest_document(event.get('metadata_bytes', 0))
+            phrases = event.get('phrases')
+            if phrases is None:
+                phrases = [' '.join(rng.choice(self._words) for _ in range(x)) for x in event['phrase_words']]
+            workers = event.get('workers', 1)
+            return lambda octopus: octopus.search(metadata, phrases, workers=workers)
+
+        if operation == 'index_audio_file' and event.get('path') is not None and os.path.exists(event['path']):
+            path = event['path']
+            return lambda octopus: octopus.index_audio_file(path)
+
+        if operation in ('index_audio_data', 'index_audio_file') and self._audio is not None and len(self._audio) > 0:
+            num_samples = event.get('num_samples')
+            if num_samples is None and event.get('file_bytes') is not None:
+                num_samples = event['file_bytes'] // 2
+            if num_samples is None:
+                return None
+            pcm = self._audio * (num_samples // len(self._audio) + 1)
+            pcm = pcm[:num_samples]
+            return lambda octopus: octopus.index_audio_data(pcm)
+
+        return None
+
+    def replay(self, speed: float = 1.) -> 'OctopusTraceReplayer.Stats':
+        """
+        Replays the trace once.
+
+        :param speed: Factor by which the trace is sped up, e.g. `2.` offers twice the recorded rate.
+        :return: Throughput and latency of the replay.
+        """
+
+        if speed <= 0:
+            raise OctopusInvalidArgumentError("`speed` should be positive.")
+
+        rng = random.Random(0)
+        schedule = list()
+        num_skipped = 0
+        for event in self._events:
+            operation = self._prepare(event, rng)
+            if operation is None:
+                num_skipped += 1
+            else:
+                schedule.append((event['start_sec'] / speed, operation))
+        if len(schedule) == 0:
+            raise OctopusInvalidStateError("Trace has no operations that can be replayed.")
+
+        lock = threading.Lock()
+        latencies = list()
+        service_times = list()
+        errors = list()
+
+        def run(scheduled: float, operation: Callable) -> None:
+            start = time.perf_counter()
+            try:
+                with self._pool.acquire() as octopus:
+                    operation(octopus)
+            except Exception as e:
+                with lock:
+                    errors.append(e)
+                return
+            end = time.perf_counter()
+            with lock:
+                latencies.append(end - scheduled)
+                service_times.append(end - start)
+
+        offset = schedule[0][0]
+        with ThreadPoolExecutor(max_workers=self._concurrency) as executor:
+            start = time.perf_counter()
+            for scheduled_sec, operation in schedule:
+                scheduled = start + scheduled_sec - offset
+                delay = scheduled - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+                executor.submit(run, scheduled, operation)
+        elapsed_sec = time.perf_counter() - start
+
+        latencies.sort()
+        service_times.sort()
+        span_sec = schedule[-1][0] - offset
+        offered_per_sec = len(schedule) / span_sec if span_sec > 0 else float('inf')
+        completed_per_sec = len(latencies) / elapsed_sec if elapsed_sec > 0 else float('inf')
+
+        latency_p50_sec = percentile(latencies, 50)
+        service_p50_sec = percentile(service_times, 50)
+
+        return self.Stats(
+            speed=speed,
+            num_operations=len(schedule),
+            num_errors=len(errors),
+            num_skipped=num_skipped,
+            elapsed_sec=elapsed_sec,
+            offered_per_sec=offered_per_sec,
+            completed_per_sec=completed_per_sec,
+            latency_p50_sec=latency_p50_sec,
+            latency_p90_sec=percentile(latencies, 90),
+            latency_p99_sec=percentile(latencies, 99),
+            latency_max_sec=percentile(latencies, 100),
+            service_p50_sec=service_p50_sec,
+            service_p99_sec=percentile(service_times, 99),
+            is_saturated=len(latencies) == 0 or latency_p50_sec - service_p50_sec > max(
+                self.SATURATION_QUEUEING_FACTOR * service_p50_sec,
+                self.SATURATION_MIN_QUEUEING_SEC))
+
+    def find_saturation(self, speeds: Iterable[float]) -> Sequence['OctopusTraceReplayer.Stats']:
+        """
+        Replays the trace at increasing speeds until operations start queueing. The offered rate of the last speed that
+        kept up is the capacity of the pool for this traffic.
+
+        :param speeds: Speed factors to try, in increasing order.
+        :return: Stats of each replay. The last one is saturated unless every speed kept up.
+        """
+
+        stats = list()
+        for speed in speeds:
+            stats.append(self.replay(speed))
+            if stats[-1].is_saturated:
+                break
+        return stats
+
+
+__all__ = [
+    'OctopusTraceRecorder',
+    'OctopusTraceReplayer',
+    'read_trace',
+]
@@ -11,7 +11,7 @@
 
 import os
 import platform
-from typing import Tuple
+from typing import Sequence, Tuple
 
 
 def _pv_platform() -> Tuple[str, str]:
@@ -49,7 +49,23 @@ def default_model_path(relative_path: str = '') -> str:
         'lib/common/param/octopus_params.pv')
 
 
+def percentile(sorted_values: Sequence[float], q: float) -> float:
+    """
+    Nearest-rank percentile of sorted values, as reported by the ingestion scheduler and the trace replayer.
+
+    :param sorted_values: Values in increasing order.
+    :param q: Percentile between 0 and 100.
+    :return: The value whose rank is closest to `q` percent of the way from the smallest to the largest, or NaN if there
+    are no values.
+    """
+
+    if len(sorted_values) == 0:
+        return float('nan')
+    return sorted_values[min(len(sorted_values) - 1, int(round(q / 100 * (len(sorted_values) - 1))))]
+
+
 __all__ = [
     'default_library_path',
     'default_model_path',
+    'percentile',
 ]
@@ -3,7 +3,29 @@ import shutil
 
 import setuptools
 
-INCLUDE_FILES = ('../../LICENSE', '__init__.py', '_factory.py', '_octopus.py', '_util.py')
+INCLUDE_FILES = (
+    '../../LICENSE',
+    '__init__.py',
+    '_audio.py',
+    '_compressed_metadata.py',
+    '_corpus.py',
+    '_dedup.py',
+    '_engine_registry.py',
+    '_factory.py',
+    '_fork_server.py',
+    '_octopus.py',
+    '_pipeline.py',
+    '_pool.py',
+    '_query.py',
+    '_residency.py',
+    '_results.py',
+    '_scheduler.py',
+    '_shared_memory.py',
+    '_standing_queries.py',
+    '_tailing.py',
+    '_tiered_store.py',
+    '_trace.py',
+    '_util.py')
 INCLUDE_LIBS = ('linux', 'mac', 'windows')
 
 os.system('git clean -dfx')
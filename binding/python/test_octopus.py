@@ -12,17 +12,31 @@
 # limitations under the License.
 #
 
+import csv
+import io
+import json
+import math
+import mmap
 import os
+import shutil
+import signal
+import struct
 import sys
+import tempfile
+import threading
+import time
 import unittest
+import wave
+from array import array
+from multiprocessing import shared_memory
 from typing import *
 
 from parameterized import parameterized
 
-from _octopus import *
-from _util import *
 from test_util import *
 
+from pvoctopus import *
+
 TEST_PARAMS = [
     ["en", {"alexa": [(7.648, 8.352, 1)], "porcupine": [(5.728, 6.752, 1), (35.360, 36.416, 1)]}],
     ["de", {"ananas": [(0.000, 0.704, 0.954)]}],
@@ -72,6 +86,121 @@ class OctopusTestCase(unittest.TestCase):
             if octopus is not None:
                 octopus.delete()
 
+    def test_index_buffer(self):
+        octopus = None
+
+        try:
+            octopus = self._create_octopus()
+            audio_data = read_wav_file(get_audio_path_by_language(self._relative), octopus.sample_rate)
+            metadata = octopus.index_audio_data(audio_data)
+
+            buffer_metadata = octopus.index_audio_data(array('h', audio_data))
+            self.assertEqual(metadata.to_bytes(), buffer_metadata.to_bytes())
+
+            buffer_metadata = octopus.index_audio_data(memoryview(array('h', audio_data)))
+            self.assertEqual(metadata.to_bytes(), buffer_metadata.to_bytes())
+        finally:
+            if octopus is not None:
+                octopus.delete()
+
+    @parameterized.expand(TEST_PARAMS)
+    def test_index_many(self, language: str, phrase_occurrences: Dict[str, Sequence[Tuple[float, float, float]]]):
+        octopus = None
+
+        try:
+            octopus = self._create_octopus(language)
+            audio_data = read_wav_file(get_audio_path_by_language(self._relative, language), octopus.sample_rate)
+
+            packed_metadata = octopus.index_many([audio_data, audio_data])
+            self.assertEqual(len(packed_metadata), 2)
+            for clip_matches in octopus.search_many(packed_metadata, phrase_occurrences.keys()):
+                self._check_matches(clip_matches, phrase_occurrences)
+
+            packed_metadata = OctopusPackedMetadata.from_bytes(packed_metadata.to_bytes())
+            self.assertEqual(len(packed_metadata), 2)
+            for clip_matches in octopus.search_many(packed_metadata, phrase_occurrences.keys()):
+                self._check_matches(clip_matches, phrase_occurrences)
+
+            with self.assertRaises(OctopusInvalidArgumentError):
+                octopus.index_many([])
+        finally:
+            if octopus is not None:
+                octopus.delete()
+
+    def test_index_stream(self):
+        octopus = None
+
+        try:
+            octopus = self._create_octopus()
+            audio_path = get_audio_path_by_language(self._relative)
+            audio_data = read_wav_file(audio_path, octopus.sample_rate)
+            metadata = octopus.index_audio_data(audio_data)
+
+            with open(audio_path, 'rb') as f:
+                stream_metadata = octopus.index_audio_stream(f)
+            self.assertEqual(metadata.to_bytes(), stream_metadata.to_bytes())
+
+            pcm_stream = io.BytesIO(struct.pack('<%dh' % len(audio_data), *audio_data))
+            stream_metadata = octopus.index_audio_stream(pcm_stream, is_wav=False)
+            self.assertEqual(metadata.to_bytes(), stream_metadata.to_bytes())
+
+            with self.assertRaises(OctopusIOError):
+                octopus.index_audio_stream(io.BytesIO(b'not a wav file'))
+
+            def wav_stream(data_size: int, trailer: bytes) -> io.BytesIO:
+                fmt = struct.pack('<HHIIHH', 1, 1, octopus.sample_rate, octopus.sample_rate * 2, 2, 16)
+                chunks = [
+                    b'RIFF', struct.pack('<I', 0xFFFFFFFF), b'WAVE',
+                    b'fmt ', struct.pack('<I', len(fmt)), fmt,
+                    b'data', struct.pack('<I', data_size), pcm_stream.getvalue(), trailer]
+                return io.BytesIO(b''.join(chunks))
+
+            # A size of 0xFFFFFFFF means the length was unknown when the header was written, so the stream is read to
+            # its end. Any other size, including 0, bounds the audio and chunks following it are skipped.
+            trailer = b'LIST' + struct.pack('<I', 4) + b'junk'
+            stream_metadata = octopus.index_audio_stream(wav_stream(0xFFFFFFFF, b''))
+            self.assertEqual(metadata.to_bytes(), stream_metadata.to_bytes())
+            stream_metadata = octopus.index_audio_stream(wav_stream(len(pcm_stream.getvalue()), trailer))
+            self.assertEqual(metadata.to_bytes(), stream_metadata.to_bytes())
+            with self.assertRaises(OctopusInvalidArgumentError):
+                octopus.index_audio_stream(wav_stream(0, trailer))
+        finally:
+            if octopus is not None:
+                octopus.delete()
+
+    def test_read_wav_header(self):
+        audio_path = get_audio_path_by_language(self._relative)
+        with wave.open(audio_path, 'rb') as f:
+            num_channels, sample_rate, num_frames = f.getnchannels(), f.getframerate(), f.getnframes()
+            first_frames = f.readframes(16)
+
+        with open(audio_path, 'rb') as f:
+            header = read_wav_header(f)
+            self.assertEqual(header, (num_channels, sample_rate, num_frames * num_channels * 2))
+            self.assertEqual(f.read(len(first_frames)), first_frames)
+
+        with self.assertRaises(OctopusIOError):
+            read_wav_header(io.BytesIO(b'RIFF'))
+        with self.assertRaises(OctopusIOError):
+            read_wav_header(io.BytesIO(b'RIFF' + struct.pack('<I', 4) + b'WAVE' + b'data' + struct.pack('<I', 0)))
+
+    def test_index_size(self):
+        octopus = None
+
+        try:
+            octopus = self._create_octopus()
+            audio_path = get_audio_path_by_language(self._relative)
+            audio_data = read_wav_file(audio_path, octopus.sample_rate)
+
+            metadata = octopus.index_audio_data(audio_data)
+            self.assertEqual(octopus.index_audio_data_size(len(audio_data)), metadata.size)
+
+            metadata = octopus.index_audio_file(audio_path)
+            self.assertEqual(octopus.index_audio_file_size(audio_path), metadata.size)
+        finally:
+            if octopus is not None:
+                octopus.delete()
+
     @parameterized.expand(TEST_PARAMS)
     def _test_index_file(self, language: str, phrase_occurrences: Dict[str, Sequence[Tuple[float, float, float]]]):
         octopus = None
@@ -175,6 +304,1121 @@ class OctopusTestCase(unittest.TestCase):
             if os.path.exists(cache_path):
                 os.remove(cache_path)
 
+    @parameterized.expand(TEST_PARAMS)
+    def test_from_buffer(self, language: str, phrase_occurrences: Dict[str, Sequence[Tuple[float, float, float]]]):
+        octopus = None
+        cache_path = 'original_metadata.oif'
+
+        try:
+            octopus = self._create_octopus(language)
+            original_metadata = octopus.index_audio_file(get_audio_path_by_language(self._relative, language))
+
+            metadata = OctopusMetadata.from_buffer(bytearray(original_metadata.to_bytes()))
+            phrase_matches = octopus.search(metadata, list(phrase_occurrences.keys()))
+            self._check_matches(phrase_matches, phrase_occurrences)
+
+            with open(cache_path, 'wb') as f:
+                f.write(original_metadata.to_bytes())
+            with open(cache_path, 'rb') as f:
+                metadata_map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_COPY)
+
+            metadata = OctopusMetadata.from_buffer(metadata_map)
+            self.assertEqual(metadata.size, original_metadata.size)
+            phrase_matches = octopus.search(metadata, list(phrase_occurrences.keys()))
+            self._check_matches(phrase_matches, phrase_occurrences)
+
+            del metadata
+            metadata_map.close()
+        finally:
+            if octopus is not None:
+                octopus.delete()
+            if os.path.exists(cache_path):
+                os.remove(cache_path)
+
+    @parameterized.expand(TEST_PARAMS)
+    def test_prepare(self, language: str, phrase_occurrences: Dict[str, Sequence[Tuple[float, float, float]]]):
+        octopus = None
+
+        try:
+            octopus = self._create_octopus(language)
+            metadata = octopus.index_audio_file(get_audio_path_by_language(self._relative, language))
+
+            prepared_query = octopus.prepare([' %s ' % x for x in phrase_occurrences.keys()])
+            self.assertEqual(set(prepared_query.phrases), set(phrase_occurrences.keys()))
+            for _ in range(2):
+                self._check_matches(prepared_query.search(metadata), phrase_occurrences)
+
+            with self.assertRaises(OctopusInvalidArgumentError):
+                octopus.prepare(['   '])
+        finally:
+            if octopus is not None:
+                octopus.delete()
+
+    @parameterized.expand(TEST_PARAMS)
+    def test_search_workers(self, language: str, phrase_occurrences: Dict[str, Sequence[Tuple[float, float, float]]]):
+        octopus = None
+
+        try:
+            octopus = self._create_octopus(language)
+            metadata = octopus.index_audio_file(get_audio_path_by_language(self._relative, language))
+
+            for workers in (2, 8):
+                matches = octopus.search(metadata, phrase_occurrences.keys(), workers=workers)
+                self.assertEqual(list(matches.keys()), list(octopus.search(metadata, phrase_occurrences.keys()).keys()))
+                self._check_matches(matches, phrase_occurrences)
+
+            with self.assertRaises(OctopusInvalidArgumentError):
+                octopus.search(metadata, phrase_occurrences.keys(), workers=0)
+        finally:
+            if octopus is not None:
+                octopus.delete()
+
+    def test_shared_memory_indexer(self):
+        octopus = None
+        indexer = None
+
+        try:
+            octopus = self._create_octopus()
+            audio_data = read_wav_file(get_audio_path_by_language(self._relative), octopus.sample_rate)
+            metadata = octopus.index_audio_data(audio_data)
+
+            indexer = OctopusSharedMemoryIndexer(
+                access_key=self._access_key,
+                num_workers=2,
+                model_path=get_model_path_by_language(self._relative),
+                library_path=default_library_path(self._relative))
+            for shared_metadata in indexer.index([audio_data, audio_data[:len(audio_data) // 2]]):
+                self.assertGreater(shared_metadata.size, 0)
+            self.assertEqual(indexer.index([audio_data])[0].to_bytes(), metadata.to_bytes())
+            self.assertEqual(indexer.num_live_segments, 0)
+        finally:
+            if indexer is not None:
+                indexer.delete()
+            if octopus is not None:
+                octopus.delete()
+
+    @unittest.skipUnless(os.path.isdir('/dev/shm'), "Orphaned segments are only reclaimed on Linux.")
+    def test_shared_memory_reclaim(self):
+        with open('/proc/self/stat', 'rb') as f:
+            stat = f.read()
+        start_time = int(stat[stat.rindex(b')') + 2:].split()[19])
+
+        # A segment of this process and one whose owner had this PID but a different start time.
+        live_name = 'pvoctopus_%d_%d_1000000' % (os.getpid(), start_time)
+        orphaned_name = 'pvoctopus_%d_%d_1000000' % (os.getpid(), start_time + 1)
+        segments = [shared_memory.SharedMemory(name=x, create=True, size=16) for x in (live_name, orphaned_name)]
+
+        try:
+            reclaimed = OctopusSharedMemoryIndexer.reclaim_orphaned_segments()
+            self.assertIn(orphaned_name, reclaimed)
+            self.assertNotIn(live_name, reclaimed)
+            self.assertFalse(os.path.exists(os.path.join('/dev/shm', orphaned_name)))
+        finally:
+            segments[0].close()
+            segments[0].unlink()
+            segments[1].close()
+
+    def test_standing_queries(self):
+        octopus = None
+        standing_queries = None
+        postings_path = tempfile.mkdtemp()
+
+        try:
+            octopus = self._create_octopus()
+            metadata = {
+                language: octopus.index_audio_file(get_audio_path_by_language(self._relative, language))
+                for language in ('en', 'de', 'es')
+            }
+
+            def check_postings(phrase: str) -> None:
+                expected = [
+                    (language, x.start_sec, x.end_sec, x.probability)
+                    for language in metadata
+                    for x in octopus.search(metadata[language], [phrase]).get(phrase, [])]
+                postings = standing_queries.lookup(phrase)
+                self.assertEqual(len(postings), len(expected))
+                for posting, occurrence in zip(postings, expected):
+                    self.assertEqual(posting.document_id, occurrence[0])
+                    for x, y in zip(posting[1:], occurrence[1:]):
+                        self.assertAlmostEqual(x, y, places=3)
+
+            standing_queries = OctopusStandingQueries(octopus, postings_path)
+            standing_queries.register(['alexa'])
+            standing_queries.add('en', metadata['en'])
+            standing_queries.add('de', metadata['de'])
+            standing_queries.register([' porcupine '])
+            standing_queries.add('es', metadata['es'])
+
+            self.assertEqual(standing_queries.watermark('alexa'), 3)
+            self.assertEqual(standing_queries.watermark('porcupine'), 0)
+            self.assertEqual(standing_queries.lookup('porcupine'), [])
+            check_postings('alexa')
+
+            self.assertEqual(standing_queries.backfill(metadata, max_documents=1), 1)
+            self.assertEqual(standing_queries.watermark('porcupine'), 1)
+            standing_queries.close()
+
+            standing_queries = OctopusStandingQueries(octopus, postings_path)
+            self.assertEqual(standing_queries.num_documents, 3)
+            self.assertEqual(set(standing_queries.phrases), {'alexa', 'porcupine'})
+            self.assertEqual(standing_queries.watermark('porcupine'), 1)
+            self.assertEqual(standing_queries.backfill(metadata.__getitem__), 2)
+            self.assertEqual(standing_queries.backfill(metadata), 0)
+            check_postings('alexa')
+            check_postings('porcupine')
+            standing_queries.close()
+
+            # Postings lost in a crash roll the watermark back instead of reading as zeros.
+            alexa_path = os.path.join(postings_path, OctopusStandingQueries.POSTINGS_DIRECTORY_NAME, '0.bin')
+            alexa_postings = standing_queries.lookup('alexa')
+            self.assertGreater(len(alexa_postings), 0)
+            with open(alexa_path, 'rb+') as f:
+                f.truncate(os.path.getsize(alexa_path) - 16 - 3)
+            standing_queries = OctopusStandingQueries(octopus, postings_path)
+            watermark = standing_queries.watermark('alexa')
+            self.assertLess(watermark, 3)
+            self.assertEqual(os.path.getsize(alexa_path) % 16, 0)
+            self.assertTrue(all(
+                x.document_id in list(metadata)[:watermark] for x in standing_queries.lookup('alexa')))
+            standing_queries.close()
+            standing_queries = OctopusStandingQueries(octopus, postings_path)
+            self.assertEqual(standing_queries.watermark('alexa'), watermark)
+            self.assertGreater(standing_queries.backfill(metadata), 0)
+            check_postings('alexa')
+            check_postings('porcupine')
+
+            with self.assertRaises(OctopusKeyError):
+                standing_queries.lookup('avocado')
+        finally:
+            if standing_queries is not None:
+                standing_queries.close()
+            if octopus is not None:
+                octopus.delete()
+            shutil.rmtree(postings_path)
+
+    def test_query_syntax(self):
+        self.assertEqual(
+            OctopusQuery('"cancel  my subscription" OR (refund NEAR/10s manager AND NOT angry)').phrases,
+            ['cancel my subscription', 'refund', 'manager', 'angry'])
+        self.assertEqual(OctopusQuery('refund and not now').phrases, ['refund and not now'])
+
+        for expression in [
+                'NOT refund',
+                'refund OR NOT manager',
+                '(NOT refund) AND manager',
+                'NOT refund AND NOT manager',
+                'refund AND NOT NOT manager',
+                'refund AND',
+                '(refund',
+                'refund NEAR/5s',
+                '""']:
+            with self.assertRaises(OctopusInvalidArgumentError):
+                OctopusQuery(expression)
+
+    def test_query(self):
+        octopus = None
+
+        try:
+            octopus = self._create_octopus()
+            metadata = octopus.index_audio_file(get_audio_path_by_language(self._relative))
+            matches = octopus.search(metadata, ['alexa', 'porcupine', 'avocado'])
+
+            def results(phrase: str) -> Set[Tuple[float, float]]:
+                return set((x.start_sec, x.end_sec) for x in matches.get(phrase, []))
+
+            def evaluate(expression: str) -> Set[Tuple[float, float]]:
+                return set((x.start_sec, x.end_sec) for x in OctopusQuery(expression).evaluate(octopus, metadata))
+
+            self.assertEqual(evaluate('alexa OR porcupine'), results('alexa') | results('porcupine'))
+            self.assertEqual(evaluate('alexa AND porcupine'), results('alexa') | results('porcupine'))
+            self.assertEqual(evaluate('alexa AND NOT porcupine'), set())
+            self.assertEqual(
+                evaluate('alexa AND NOT avocado'),
+                results('alexa') if len(results('avocado')) == 0 else set())
+            all_results = results('alexa') | results('porcupine') | results('avocado')
+            self.assertEqual(
+                evaluate('(alexa OR porcupine) AND avocado'),
+                all_results if len(results('avocado')) > 0 else set())
+
+            near_results = OctopusQuery('alexa NEAR/3600s porcupine').evaluate(octopus, metadata, order_by='score')
+            self.assertEqual(len(near_results), len(matches['alexa']) * len(matches['porcupine']))
+            for result in near_results:
+                self.assertEqual(result.phrases, ('alexa', 'porcupine'))
+            self.assertEqual(
+                [x.probability for x in near_results],
+                sorted((x.probability for x in near_results), reverse=True))
+        finally:
+            if octopus is not None:
+                octopus.delete()
+
+    def test_compressed_metadata(self):
+        octopus = None
+
+        try:
+            octopus = self._create_octopus()
+            metadata = octopus.index_audio_file(get_audio_path_by_language(self._relative))
+            metadata_bytes = metadata.to_bytes()
+
+            buffer = OctopusDecompressionBuffer()
+            for codec in COMPRESSION_CODECS:
+                compressed = OctopusCompressedMetadata.compress(metadata, codec=codec, level=1, block_size=1000)
+                self.assertEqual(compressed.num_blocks, (len(metadata_bytes) + 999) // 1000)
+                compressed = OctopusCompressedMetadata.from_bytes(compressed.to_bytes())
+                self.assertEqual(compressed.codec, codec)
+                self.assertEqual(compressed.decompress().to_bytes(), metadata_bytes)
+                self.assertEqual(compressed.decompress(buffer).to_bytes(), metadata_bytes)
+
+            for level in (6.0, True, 10):
+                with self.assertRaises(OctopusInvalidArgumentError):
+                    OctopusCompressedMetadata.compress(metadata, level=level)
+
+            compressed_bytes = OctopusCompressedMetadata.compress(metadata, block_size=1000).to_bytes()
+            header = struct.Struct('<4sBBBxIQI')
+            magic, version, codec_id, level, block_size, size, num_blocks = header.unpack_from(compressed_bytes)
+            for forged_header in [
+                    header.pack(magic, version, codec_id, level, 0, size, num_blocks),
+                    header.pack(magic, version, codec_id, level, block_size, size + 2000, num_blocks),
+                    header.pack(magic, version, codec_id, level, block_size, size, num_blocks - 1)]:
+                with self.assertRaises(OctopusIOError):
+                    OctopusCompressedMetadata.from_bytes(forged_header + compressed_bytes[header.size:])
+            with self.assertRaises(OctopusIOError):
+                OctopusCompressedMetadata.from_bytes(compressed_bytes[:-1])
+        finally:
+            if octopus is not None:
+                octopus.delete()
+
+    def test_engine_registry(self):
+        model_paths = find_model_files(os.path.join(os.path.dirname(__file__), self._relative, 'lib/common/param'))
+        self.assertEqual(model_paths[('de', DEFAULT_MODEL_TIER)], get_model_path_by_language(self._relative, 'de'))
+
+        registry = None
+        try:
+            registry = OctopusEngineRegistry(
+                access_key=self._access_key,
+                model_paths=model_paths,
+                prewarm=[('en', DEFAULT_MODEL_TIER)],
+                library_path=default_library_path(self._relative))
+            self.assertEqual(registry.loaded, [('en', DEFAULT_MODEL_TIER)])
+
+            audio_path = get_audio_path_by_language(self._relative, 'de')
+            metadata = registry.index_audio_file(audio_path, language='de')
+            registry.search(metadata, ['ananas'], language='de')
+            registry.search(metadata, ['ananas'])
+            self.assertEqual(registry.loaded, [('de', DEFAULT_MODEL_TIER), ('en', DEFAULT_MODEL_TIER)])
+
+            with self.assertRaises(OctopusKeyError):
+                registry.search(metadata, ['ananas'], language='xx')
+        finally:
+            if registry is not None:
+                registry.delete()
+
+        registry = None
+        try:
+            # Any loaded instance exceeds the budget, so instances are only kept while in use.
+            registry = OctopusEngineRegistry(
+                access_key=self._access_key,
+                model_paths=model_paths,
+                memory_budget_bytes=1,
+                library_path=default_library_path(self._relative))
+            with registry.acquire('en'):
+                with registry.acquire('de'):
+                    self.assertEqual(set(registry.loaded), {('en', DEFAULT_MODEL_TIER), ('de', DEFAULT_MODEL_TIER)})
+                self.assertEqual(registry.loaded, [('en', DEFAULT_MODEL_TIER)])
+            self.assertEqual(registry.loaded, [])
+
+            with registry.acquire('en'):
+                pass
+            stats = registry.stats()
+            self.assertEqual(stats[('en', DEFAULT_MODEL_TIER)].num_loads, 2)
+            self.assertEqual(stats[('en', DEFAULT_MODEL_TIER)].num_evictions, 2)
+            self.assertEqual(stats[('de', DEFAULT_MODEL_TIER)].num_evictions, 1)
+            self.assertFalse(stats[('de', DEFAULT_MODEL_TIER)].loaded)
+            self.assertEqual(registry.memory_bytes, 0)
+
+            # Instances in use are not deleted under their users.
+            with registry.acquire('en'):
+                with self.assertRaises(OctopusInvalidStateError):
+                    registry.delete()
+            registry.delete()
+            with self.assertRaises(OctopusInvalidStateError):
+                with registry.acquire('en'):
+                    pass
+            registry = None
+        finally:
+            if registry is not None:
+                registry.delete()
+
+    def test_extract_clips(self):
+        audio_path = get_audio_path_by_language(self._relative)
+        with wave.open(audio_path, 'rb') as f:
+            sample_rate = f.getframerate()
+            audio_data = read_wav_file(audio_path, sample_rate)
+            duration_sec = f.getnframes() / sample_rate
+
+        matches = [
+            Octopus.Match(start_sec=5.0, end_sec=6.0, probability=1.),
+            Octopus.Match(start_sec=1.0, end_sec=1.5, probability=1.),
+            Octopus.Match(start_sec=5.5, end_sec=7.0, probability=1.),
+            Octopus.Match(start_sec=0.1, end_sec=0.2, probability=1.),
+            Octopus.Match(start_sec=duration_sec - 0.1, end_sec=duration_sec + 1., probability=1.)]
+        for pad_sec, max_gap_sec in [(0.5, 1.), (0., 0.), (0.25, 10.)]:
+            clips = extract_clips(audio_path, matches, pad_sec=pad_sec, max_gap_sec=max_gap_sec)
+            self.assertEqual(len(clips), len(matches))
+            for clip, match in zip(clips, matches):
+                start = max(0, math.floor((match.start_sec - pad_sec) * sample_rate))
+                end = min(len(audio_data), math.ceil((match.end_sec + pad_sec) * sample_rate))
+                self.assertEqual(list(clip), list(audio_data[start:end]))
+
+        clip = extract_clip(audio_path, matches[0], pad_sec=0., as_wav=True)
+        with wave.open(io.BytesIO(clip), 'rb') as f:
+            self.assertEqual(f.getframerate(), sample_rate)
+            self.assertEqual(f.getnframes(), sample_rate)
+
+        with self.assertRaises(OctopusInvalidArgumentError):
+            extract_clips(audio_path, matches, pad_sec=-1.)
+        with self.assertRaises(OctopusIOError):
+            extract_clips(audio_path + '.missing', matches)
+
+    def test_deduplicating_indexer(self):
+        octopus = None
+        store_path = tempfile.mkdtemp()
+
+        try:
+            octopus = self._create_octopus()
+            audio_data = read_wav_file(get_audio_path_by_language(self._relative), octopus.sample_rate)
+            sample_rate = octopus.sample_rate
+
+            store = OctopusChunkStore(store_path)
+            indexer = OctopusDeduplicatingIndexer(octopus, store, min_chunk_sec=1., max_chunk_sec=8.)
+            chunked_metadata = indexer.index_audio_data(audio_data)
+            self.assertEqual(chunked_metadata.reused_fraction, 0.)
+            self.assertEqual(chunked_metadata.chunks[0].start_sec, 0.)
+            self.assertEqual(round(chunked_metadata.chunks[-1].end_sec * sample_rate), len(audio_data))
+
+            pcm_bytes = array('h', audio_data).tobytes()
+            low_bytes = pcm_bytes[0::2] if sys.byteorder == 'little' else pcm_bytes[1::2]
+            for chunk, next_chunk in zip(chunked_metadata.chunks[:-1], chunked_metadata.chunks[1:]):
+                start = round(chunk.start_sec * sample_rate)
+                end = round(chunk.end_sec * sample_rate)
+                self.assertEqual(end, round(next_chunk.start_sec * sample_rate))
+                self.assertGreaterEqual(end - start, sample_rate)
+                self.assertLessEqual(end - start, 8 * sample_rate)
+                # A chunk is cut right after an anchor, unless it reached the longest allowed length.
+                if end - start < 8 * sample_rate:
+                    self.assertEqual(low_bytes[end - 2:end], b'\x5a\xa5')
+                    self.assertEqual(low_bytes.find(b'\x5a\xa5', start + sample_rate - 2, end - 2), -1)
+
+            # Boundaries depend on the content rather than on offsets, so a copy preceded by other audio is cut at
+            # the same places once the first anchor in it is reached.
+            keys = set(x.key for x in chunked_metadata.chunks)
+            shifted_metadata = indexer.index_audio_data(array('h', [0] * 1234) + array('h', audio_data))
+            self.assertGreater(shifted_metadata.reused_fraction, 0.)
+            for chunk in shifted_metadata.chunks:
+                self.assertEqual(chunk.reused, chunk.key in keys)
+            num_chunks = len(store)
+
+            repeated_metadata = indexer.index_audio_data(audio_data)
+            self.assertEqual(repeated_metadata.reused_fraction, 1.)
+            self.assertEqual(len(store), num_chunks)
+            self.assertEqual(len(OctopusChunkStore(store_path)), num_chunks)
+            self.assertEqual(
+                OctopusChunkedMetadata.from_bytes(repeated_metadata.to_bytes()).chunks,
+                repeated_metadata.chunks)
+
+            # A single chunk finds the same matches as indexing the whole recording.
+            indexer = OctopusDeduplicatingIndexer(octopus, store, min_chunk_sec=1000., max_chunk_sec=1000.)
+            chunked_metadata = indexer.index_audio_data(audio_data)
+            self.assertEqual(len(chunked_metadata.chunks), 1)
+            self.assertEqual(
+                indexer.search(chunked_metadata, ['alexa', 'porcupine']),
+                octopus.search(octopus.index_audio_data(audio_data), ['alexa', 'porcupine']))
+
+            with self.assertRaises(OctopusIOError):
+                store.get('0' * 64)
+            with self.assertRaises(OctopusInvalidArgumentError):
+                OctopusDeduplicatingIndexer(octopus, store, min_chunk_sec=2., max_chunk_sec=1.)
+        finally:
+            shutil.rmtree(store_path)
+            if octopus is not None:
+                octopus.delete()
+
+    def test_ingestion_scheduler(self):
+        class GatedAudio(list):
+            # Holds the only worker until the gate opens, so that jobs queue up behind it.
+            def __init__(self, pcm: Sequence[int], gate: threading.Event) -> None:
+                super().__init__(pcm)
+                self._gate = gate
+
+            def __iter__(self):
+                self._gate.wait()
+                return super().__iter__()
+
+        audio_path = get_audio_path_by_language(self._relative)
+        with wave.open(audio_path, 'rb') as f:
+            audio_data = read_wav_file(audio_path, f.getframerate())
+        clip_length = len(audio_data) // 8
+
+        def run(
+                policy: str,
+                jobs: Sequence[Tuple[Union[str, int], int]],
+                max_wait_sec: Optional[float] = None,
+                wait_sec: float = 0.) -> Tuple[List[int], OctopusIngestionScheduler.Metrics]:
+            scheduler = None
+            try:
+                scheduler = OctopusIngestionScheduler(
+                    access_key=self._access_key,
+                    num_workers=1,
+                    policy=policy,
+                    max_wait_sec=max_wait_sec,
+                    library_path=default_library_path(self._relative),
+                    model_path=get_model_path_by_language(self._relative, 'en'))
+
+                gate = threading.Event()
+                futures = [scheduler.submit_data(GatedAudio(audio_data[:clip_length], gate))]
+                while scheduler.metrics().num_running == 0:
+                    time.sleep(0.01)
+
+                order = list()
+                for i, (source, priority) in enumerate(jobs):
+                    if isinstance(source, str):
+                        futures.append(scheduler.submit_file(source, priority=priority))
+                    else:
+                        futures.append(scheduler.submit_data(audio_data[:source], priority=priority))
+                    futures[-1].add_done_callback(lambda _, x=i: order.append(x))
+                time.sleep(wait_sec)
+                gate.set()
+
+                for future in futures:
+                    self.assertIsInstance(future.result(), OctopusMetadata)
+                metrics = scheduler.metrics()
+            finally:
+                if scheduler is not None:
+                    scheduler.delete()
+            # Deleting joins the worker, which runs the callbacks of the last job.
+            return order, metrics
+
+        # WAV files are sized from their header, which here holds more samples than any of the clips.
+        jobs = [(audio_path, 0), (3 * clip_length, 0), (clip_length, 0), (2 * clip_length, 0)]
+        order, metrics = run('sjf', jobs)
+        self.assertEqual(order, [2, 3, 1, 0])
+        self.assertEqual(metrics.num_completed, 5)
+        self.assertEqual(metrics.queue_depth, 0)
+        self.assertEqual(metrics.num_starvation_promotions, 0)
+
+        order, _ = run('fifo', jobs)
+        self.assertEqual(order, [0, 1, 2, 3])
+
+        order, _ = run('sjf', [(3 * clip_length, 0), (2 * clip_length, 1), (clip_length, 0)])
+        self.assertEqual(order, [1, 2, 0])
+
+        # Files are costed at the engine's sample rate: 1.5 clips at 48 kHz hold more frames than two clips at 16 kHz
+        # but are shorter.
+        wav_dir = tempfile.mkdtemp()
+        try:
+            wav_48k_path = os.path.join(wav_dir, '48k.wav')
+            with wave.open(wav_48k_path, 'wb') as f:
+                f.setnchannels(1)
+                f.setsampwidth(2)
+                f.setframerate(48000)
+                f.writeframes(array('h', audio_data[:3 * (3 * clip_length // 2)]).tobytes())
+            order, _ = run('sjf', [(2 * clip_length, 0), (wav_48k_path, 0), (clip_length, 0)])
+            self.assertEqual(order, [2, 1, 0])
+        finally:
+            shutil.rmtree(wav_dir)
+
+        order, metrics = run('sjf', [(3 * clip_length, 0), (clip_length, 0)], max_wait_sec=0.05, wait_sec=0.2)
+        self.assertEqual(order, [0, 1])
+        self.assertEqual(metrics.num_starvation_promotions, 1)
+
+        scheduler = None
+        try:
+            scheduler = OctopusIngestionScheduler(
+                access_key=self._access_key,
+                num_workers=1,
+                library_path=default_library_path(self._relative),
+                model_path=get_model_path_by_language(self._relative, 'en'))
+            with self.assertRaises(OctopusIOError):
+                scheduler.submit_file(audio_path + '.missing')
+
+            gate = threading.Event()
+            scheduler.submit_data(GatedAudio(audio_data[:clip_length], gate))
+            while scheduler.metrics().num_running == 0:
+                time.sleep(0.01)
+            queued = scheduler.submit_data(audio_data[:clip_length])
+            threading.Timer(0.1, gate.set).start()
+            scheduler.delete()
+            self.assertTrue(queued.cancelled())
+            with self.assertRaises(OctopusInvalidStateError):
+                scheduler.submit_data(audio_data[:clip_length])
+            scheduler = None
+        finally:
+            if scheduler is not None:
+                scheduler.delete()
+
+        with self.assertRaises(OctopusInvalidArgumentError):
+            OctopusIngestionScheduler(access_key=self._access_key, num_workers=1, policy='lifo')
+
+    @unittest.skipUnless(hasattr(os, 'fork'), "Requires fork.")
+    def test_fork_server_pool(self):
+        audio_path = get_audio_path_by_language(self._relative)
+        phrases = ['alexa', 'porcupine']
+
+        octopus = None
+        try:
+            octopus = self._create_octopus()
+            expected_metadata = octopus.index_audio_file(audio_path)
+            expected_matches = octopus.search(expected_metadata, phrases)
+        finally:
+            if octopus is not None:
+                octopus.delete()
+
+        def create_pool(**kwargs: Any) -> OctopusForkServerPool:
+            return OctopusForkServerPool(
+                access_key=self._access_key,
+                num_workers=1,
+                library_path=default_library_path(self._relative),
+                model_path=get_model_path_by_language(self._relative, 'en'),
+                **kwargs)
+
+        pool = None
+        try:
+            pool = create_pool(max_jobs_per_worker=4)
+            for _ in range(3):
+                metadata = pool.index_audio_file(audio_path)
+                self.assertEqual(metadata.to_bytes(), expected_metadata.to_bytes())
+                self.assertEqual(pool.search(metadata, phrases), expected_matches)
+            # The first worker retired after four calls; the second has served two.
+            self.assertEqual(pool.num_live_workers, 1)
+
+            # A worker that dies is replaced on the next call.
+            pid = next(iter(pool._workers))
+            os.kill(pid, signal.SIGKILL)
+            with self.assertRaises(OctopusRuntimeError):
+                pool.search(metadata, phrases)
+            self.assertEqual(pool.search(metadata, phrases), expected_matches)
+
+            # A call that fails other than by the worker exiting discards the worker instead of leaking it.
+            pid = next(iter(pool._workers))
+            with self.assertRaises(Exception):
+                pool.index_audio_file(lambda: audio_path)
+            self.assertEqual(pool.num_live_workers, 0)
+            deadline = time.monotonic() + 5
+            while time.monotonic() < deadline:
+                try:
+                    os.kill(pid, 0)
+                except ProcessLookupError:
+                    break
+                time.sleep(0.01)
+            else:
+                self.fail("Worker process was not killed.")
+            self.assertEqual(pool.search(metadata, phrases), expected_matches)
+
+            # Deleting the pool kills workers in the middle of a call.
+            pid = next(iter(pool._workers))
+            os.kill(pid, signal.SIGSTOP)
+            errors = list()
+
+            def search() -> None:
+                try:
+                    pool.search(metadata, phrases)
+                except OctopusError as e:
+                    errors.append(e)
+
+            thread = threading.Thread(target=search)
+            thread.start()
+            while pool.num_live_workers > 0 and len(pool._idle) > 0:
+                time.sleep(0.01)
+            pool.delete()
+            thread.join()
+            self.assertEqual(len(errors), 1)
+            self.assertIsInstance(errors[0], OctopusRuntimeError)
+            with self.assertRaises(ProcessLookupError):
+                os.kill(pid, 0)
+            with self.assertRaises(OctopusInvalidStateError):
+                pool.search(metadata, phrases)
+            pool = None
+        finally:
+            if pool is not None:
+                pool.delete()
+
+        pool = None
+        try:
+            pool = create_pool(worker_start_timeout_sec=0.5)
+            os.kill(pool._zygote.pid, signal.SIGSTOP)
+            start = time.monotonic()
+            with self.assertRaises(OctopusRuntimeError):
+                pool.search(expected_metadata, phrases)
+            self.assertLess(time.monotonic() - start, 5)
+            os.kill(pool._zygote.pid, signal.SIGCONT)
+            self.assertEqual(pool.search(expected_metadata, phrases), expected_matches)
+        finally:
+            if pool is not None:
+                pool.delete()
+
+    def test_residency_manager(self):
+        octopus = None
+        spill_dir = tempfile.mkdtemp()
+
+        try:
+            octopus = self._create_octopus()
+            audio_path = get_audio_path_by_language(self._relative)
+            phrases = ['alexa', 'porcupine']
+            expected_matches = octopus.search(octopus.index_audio_file(audio_path), phrases)
+            metadata_size = octopus.index_audio_file(audio_path).size
+
+            for policy, touch_first, expected_resident in [
+                    ('lru', False, [False, True, True]),
+                    ('lru', True, [True, False, True]),
+                    ('clock', False, [False, True, True]),
+                    ('clock', True, [True, False, True])]:
+                manager = OctopusResidencyManager(budget_bytes=2 * metadata_size, policy=policy)
+                try:
+                    documents = [manager.add(octopus.index_audio_file(audio_path)) for _ in range(2)]
+                    if touch_first:
+                        self.assertEqual(octopus.search(documents[0], phrases), expected_matches)
+                    documents.append(manager.add(octopus.index_audio_file(audio_path)))
+
+                    self.assertEqual([x.is_resident for x in documents], expected_resident, policy)
+                    self.assertLessEqual(manager.resident_bytes, 2 * metadata_size)
+                    metrics = manager.metrics()
+                    self.assertEqual((metrics.num_spills, metrics.num_evictions, metrics.num_faults), (1, 1, 0))
+
+                    # Every document can still be searched; spilled ones are read back within the budget.
+                    for _ in range(2):
+                        for document in documents:
+                            self.assertEqual(octopus.search(document, phrases), expected_matches)
+                            self.assertTrue(document.is_resident)
+                            self.assertLessEqual(manager.resident_bytes, 2 * metadata_size)
+                    metrics = manager.metrics()
+                    self.assertEqual(metrics.num_resident, 2)
+                    self.assertGreater(metrics.num_faults, 0)
+                    # Metadata never changes, so each document is written to the spill file at most once.
+                    self.assertLessEqual(metrics.num_spills, len(documents))
+                    self.assertEqual(metrics.spill_file_bytes, metrics.num_spills * metadata_size)
+
+                    manager.remove(documents[0])
+                    self.assertEqual(manager.metrics().num_documents, 2)
+                    with self.assertRaises(OctopusInvalidStateError):
+                        octopus.search(documents[0], phrases)
+                finally:
+                    manager.close()
+
+            # A document larger than the budget stays in memory while it is the only one.
+            spill_path = os.path.join(spill_dir, 'spill.bin')
+            manager = OctopusResidencyManager(budget_bytes=1, spill_path=spill_path)
+            try:
+                documents = [manager.add(octopus.index_audio_file(audio_path)) for _ in range(2)]
+                self.assertEqual([x.is_resident for x in documents], [False, True])
+                self.assertEqual(octopus.search(documents[0], phrases), expected_matches)
+                self.assertEqual([x.is_resident for x in documents], [True, False])
+                self.assertTrue(os.path.exists(spill_path))
+            finally:
+                manager.close()
+            self.assertFalse(os.path.exists(spill_path))
+            with self.assertRaises(OctopusInvalidStateError):
+                octopus.search(documents[0], phrases)
+            with self.assertRaises(OctopusInvalidStateError):
+                manager.add(octopus.index_audio_file(audio_path))
+
+            with self.assertRaises(OctopusInvalidArgumentError):
+                OctopusResidencyManager(budget_bytes=0)
+        finally:
+            shutil.rmtree(spill_dir)
+            if octopus is not None:
+                octopus.delete()
+
+    def test_tiered_store(self):
+        octopus = None
+        store_path = tempfile.mkdtemp()
+
+        try:
+            octopus = self._create_octopus()
+            metadata = octopus.index_audio_file(get_audio_path_by_language(self._relative))
+            phrases = ['alexa']
+
+            store = OctopusTieredStore(store_path, hot_capacity_bytes=2 * metadata.size)
+            for document_id in ['a', 'b', 'c']:
+                store.add(document_id, metadata)
+            self.assertEqual(sorted(store.hot_ids), ['a', 'b'])
+
+            for _ in range(3):
+                self.assertEqual(store.get('c').to_bytes(), metadata.to_bytes())
+            store.get('b')
+            store.rebalance()
+            self.assertEqual(sorted(store.hot_ids), ['b', 'c'])
+            stats = store.stats()
+            self.assertEqual((stats.num_promotions, stats.num_demotions), (3, 1))
+            self.assertLessEqual(stats.hot_bytes, 2 * metadata.size)
+
+            # Documents are saved as they are added and removed, so a store that is not closed loses none of them.
+            store.add('d', metadata)
+            store.remove('d')
+            store = OctopusTieredStore(store_path, hot_capacity_bytes=2 * metadata.size)
+            self.assertEqual(len(store), 3)
+            self.assertNotIn('d', store)
+            self.assertEqual(sorted(store.hot_ids), ['b', 'c'])
+            for document_id in ['a', 'b', 'c']:
+                self.assertEqual(store.get(document_id).to_bytes(), metadata.to_bytes())
+
+            # A journal entry torn by a crash is dropped, and the journal is folded into the snapshot once it outgrows
+            # the list of documents.
+            journal_path = os.path.join(store_path, OctopusTieredStore.JOURNAL_FILE_NAME)
+            with open(journal_path, 'a', encoding='utf-8') as f:
+                f.write('{"id": "e", "docu')
+            store = OctopusTieredStore(store_path, hot_capacity_bytes=2 * metadata.size)
+            self.assertEqual(len(store), 3)
+            self.assertEqual(os.path.getsize(journal_path), 0)
+            store.MIN_JOURNAL_LENGTH = 0
+            for document_id in ['d', 'e', 'f', 'g']:
+                store.add(document_id, metadata)
+            with open(journal_path, 'r', encoding='utf-8') as f:
+                self.assertLessEqual(len(f.read().splitlines()), len(store))
+            for document_id in ['d', 'e', 'f', 'g']:
+                store.remove(document_id)
+            store = OctopusTieredStore(store_path, hot_capacity_bytes=2 * metadata.size)
+            self.assertEqual(len(store), 3)
+            self.assertNotIn('g', store)
+            self.assertEqual(sorted(store.hot_ids), ['b', 'c'])
+
+            # A search that is stopped early still rebalances.
+            for _ in range(5):
+                store.get('a')
+            results = store.search(octopus, phrases)
+            document_id, matches = next(results)
+            self.assertEqual(matches, octopus.search(metadata, phrases))
+            results.close()
+            self.assertEqual(sorted(store.hot_ids), ['a', 'c'])
+            store.close()
+
+            store = OctopusTieredStore(store_path, hot_capacity_bytes=2 * metadata.size)
+            self.assertEqual(sorted(store.hot_ids), ['a', 'c'])
+            self.assertEqual(sorted(x for x, _ in store.search(octopus, phrases)), ['a', 'b', 'c'])
+            with self.assertRaises(OctopusKeyError):
+                store.get('d')
+            store.close()
+        finally:
+            shutil.rmtree(store_path)
+            if octopus is not None:
+                octopus.delete()
+
+    def test_tailing_indexer(self):
+        octopus = None
+        recording_dir = tempfile.mkdtemp()
+
+        try:
+            octopus = self._create_octopus()
+            sample_rate = octopus.sample_rate
+            audio_data = array('h', read_wav_file(get_audio_path_by_language(self._relative), sample_rate))
+            phrases = ['alexa', 'porcupine']
+            expected_matches = octopus.search(octopus.index_audio_data(audio_data), phrases)
+
+            recording_path = os.path.join(recording_dir, 'recording.wav')
+            tailing_indexer = OctopusTailingIndexer(octopus, recording_path, segment_sec=10, overlap_sec=2)
+            self.assertEqual(tailing_indexer.update(), 0.)
+
+            # Written the way a recorder streams a file, with the length of the data chunk not known upfront.
+            fmt = struct.pack('<HHIIHH', 1, 1, sample_rate, sample_rate * 2, 2, 16)
+            header = b''.join([
+                b'RIFF', struct.pack('<I', 0xFFFFFFFF), b'WAVE',
+                b'fmt ', struct.pack('<I', len(fmt)), fmt,
+                b'data', struct.pack('<I', 0xFFFFFFFF)])
+            with open(recording_path, 'wb') as f:
+                f.write(header[:20])
+            self.assertEqual(tailing_indexer.update(), 0.)
+
+            little_endian_data = array('h', audio_data)
+            if sys.byteorder != 'little':
+                little_endian_data.byteswap()
+            pcm_bytes = little_endian_data.tobytes()
+            with open(recording_path, 'wb') as f:
+                f.write(header)
+            block_size = 7 * sample_rate * 2 + 1
+            for start in range(0, len(pcm_bytes), block_size):
+                with open(recording_path, 'ab') as f:
+                    f.write(pcm_bytes[start:start + block_size])
+                tailing_indexer.update()
+            self.assertEqual(tailing_indexer.duration_sec, len(audio_data) / sample_rate)
+            self.assertEqual(tailing_indexer.update(), 0.)
+
+            segments = tailing_indexer.segments
+            self.assertEqual(segments[0].start_sec, 0.)
+            self.assertEqual(segments[-1].end_sec, len(audio_data) / sample_rate)
+            for segment, next_segment in zip(segments[:-1], segments[1:]):
+                self.assertEqual(segment.end_sec - segment.start_sec, 10.)
+                self.assertEqual(next_segment.start_sec, segment.end_sec)
+                self.assertEqual(next_segment.audio_start_sec, segment.end_sec - 2.)
+
+            # Phrases are found once each, at their time in the recording, even when they cross a segment boundary.
+            matches = tailing_indexer.search(phrases)
+            self.assertEqual(set(matches.keys()), set(expected_matches.keys()))
+            for phrase, phrase_matches in expected_matches.items():
+                self.assertEqual(len(matches[phrase]), len(phrase_matches))
+                for match, expected_match in zip(matches[phrase], phrase_matches):
+                    self.assertAlmostEqual(match.start_sec, expected_match.start_sec, delta=0.1)
+
+            with open(recording_path, 'r+b') as f:
+                f.truncate(len(header) + 2 * sample_rate)
+            with self.assertRaises(OctopusIOError):
+                tailing_indexer.update()
+
+            with open(recording_path, 'wb') as f:
+                f.write(header.replace(struct.pack('<I', sample_rate), struct.pack('<I', sample_rate // 2), 1))
+            with self.assertRaises(OctopusInvalidArgumentError):
+                OctopusTailingIndexer(octopus, recording_path).update()
+        finally:
+            shutil.rmtree(recording_dir)
+            if octopus is not None:
+                octopus.delete()
+
+    def test_pipeline(self):
+        audio_path = get_audio_path_by_language(self._relative)
+        output_dir = tempfile.mkdtemp()
+
+        pool = None
+        try:
+            pool = OctopusPool(
+                access_key=self._access_key,
+                size=2,
+                library_path=default_library_path(self._relative),
+                model_path=get_model_path_by_language(self._relative, 'en'))
+            input_dir = os.path.join(output_dir, 'audio')
+            for sub_dir in ['a', 'b']:
+                os.makedirs(os.path.join(input_dir, sub_dir))
+                shutil.copy(audio_path, os.path.join(input_dir, sub_dir, 'clip.wav'))
+            wav_paths = [os.path.join(input_dir, x, 'clip.wav') for x in ['a', 'b']]
+
+            def pipeline(writer: OctopusMetadataWriter) -> OctopusPipeline:
+                with pool.acquire() as octopus:
+                    sample_rate = octopus.sample_rate
+                return (
+                    OctopusPipeline(read_wav_blocks(wav_paths, block_sec=0.3), queue_size=2)
+                    .map(downmix_block)
+                    .transform(OctopusResampler(sample_rate))
+                    .transform(concatenate_blocks)
+                    .map(OctopusPoolIndexer(pool), workers=2)
+                    .map(writer))
+
+            metadata_dir = os.path.join(output_dir, 'metadata')
+            paths = list(pipeline(OctopusMetadataWriter(metadata_dir, input_directory=input_dir)).run())
+            expected_paths = [os.path.join(metadata_dir, x, 'clip' + METADATA_FILE_EXTENSION) for x in ['a', 'b']]
+            self.assertEqual(paths, expected_paths)
+            with pool.acquire() as octopus:
+                expected_metadata = octopus.index_audio_data(read_wav_file(audio_path, octopus.sample_rate))
+            for path in paths:
+                with open(path, 'rb') as f:
+                    self.assertEqual(f.read(), expected_metadata.to_bytes())
+
+            # Recordings with the same name are not written over each other.
+            with self.assertRaises(OctopusInvalidArgumentError):
+                list(pipeline(OctopusMetadataWriter(os.path.join(output_dir, 'flat'))).run())
+            with self.assertRaises(OctopusInvalidArgumentError):
+                list(pipeline(OctopusMetadataWriter(metadata_dir, input_directory=metadata_dir)).run())
+        finally:
+            shutil.rmtree(output_dir)
+            if pool is not None:
+                pool.delete()
+
+    def test_pipeline_errors(self):
+        def fail_on(value: int) -> Callable[[int], int]:
+            def function(x: int) -> int:
+                if x == value:
+                    raise ValueError(x)
+                return x
+            return function
+
+        def failing_source() -> Iterator[int]:
+            yield 0
+            raise ValueError('source')
+
+        def failing_transform(items: Iterator[int]) -> Iterator[int]:
+            for x in items:
+                yield x
+                if x == 5:
+                    raise ValueError('transform')
+
+        self.assertEqual(list(OctopusPipeline(range(20)).map(fail_on(-1), workers=3).run()), list(range(20)))
+
+        for pipeline, message in [
+                (OctopusPipeline(range(100), queue_size=1).map(fail_on(7)), '7'),
+                (OctopusPipeline(range(100), queue_size=1).map(fail_on(7), workers=3), '7'),
+                (OctopusPipeline(failing_source()).map(fail_on(-1)), 'source'),
+                (OctopusPipeline(range(100)).transform(failing_transform).map(fail_on(-1)), 'transform')]:
+            with self.assertRaises(ValueError) as context:
+                list(pipeline.run())
+            self.assertEqual(str(context.exception), message)
+            with self.assertRaises(OctopusInvalidStateError):
+                list(pipeline.run())
+
+        # A consumer that stops early shuts down every stage.
+        pipeline = OctopusPipeline(range(1000), queue_size=1).map(fail_on(-1)).map(fail_on(-1))
+        results = pipeline.run()
+        self.assertEqual(next(results), 0)
+        results.close()
+        self.assertTrue(all(x.num_in < 1000 for x in pipeline.stats()))
+
+    def test_resampler(self):
+        def blocks(pcm: array, sample_rate: int, sizes: Sequence[int]) -> Iterator[OctopusAudioBlock]:
+            start = 0
+            for i, size in enumerate(sizes):
+                yield OctopusAudioBlock('key', pcm[start:start + size], sample_rate, 1, i == len(sizes) - 1)
+                start += size
+
+        for input_rate, output_rate in [(48000, 16000), (44100, 16000), (8000, 16000), (16000, 16000)]:
+            num_samples = input_rate + 123
+            pcm = array('h', (round(10000 * math.sin(i / 7)) for i in range(num_samples)))
+
+            whole = list(OctopusResampler(output_rate)(blocks(pcm, input_rate, [num_samples])))[0]
+            self.assertEqual(whole.sample_rate, output_rate)
+            self.assertLessEqual(abs(len(whole.pcm) - num_samples * output_rate / input_rate), 1)
+
+            # Splitting a recording into blocks of any size yields the same samples as resampling it in one go.
+            sizes = [1000, 1, 0, 4799, 3000, 7]
+            sizes.append(num_samples - sum(sizes))
+            resampled = array('h')
+            for block in OctopusResampler(output_rate)(blocks(pcm, input_rate, sizes)):
+                self.assertEqual(block.sample_rate, output_rate)
+                resampled.extend(block.pcm)
+            self.assertEqual(len(resampled), len(whole.pcm))
+            self.assertTrue(all(abs(x - y) <= 1 for x, y in zip(resampled, whole.pcm)))
+
+        with self.assertRaises(OctopusInvalidArgumentError):
+            list(OctopusResampler(16000)([OctopusAudioBlock('key', array('h', [0, 0]), 48000, 2, True)]))
+
+    def test_result_writers(self):
+        results = [
+            ('calls/1.wav', {
+                'alexa': [Octopus.Match(7.648, 8.352, 0.875)],
+                'porcupine': [Octopus.Match(5.728, 6.752, 1.), Octopus.Match(35.36, 36.416, 0.5)]}),
+            ('calls/2.wav', {'alexa': [], 'porcupine': []}),
+            ('calls/"3", ünïcode.wav', {'porcupine': [Octopus.Match(1e-05, 0.1, 0.25)], 'pico voice': []}),
+            ('calls/1.wav', {'pico voice': [Octopus.Match(100., 101.5, 0.75)]})]
+        expected_rows = [
+            (document_id, phrase, x.start_sec, x.end_sec, x.probability)
+            for document_id, matches in results for phrase, phrase_matches in matches.items() for x in phrase_matches]
+
+        for output_format in RESULT_FORMATS:
+            # A small buffer spreads the rows over several writes and, for the columnar format, several chunks.
+            for buffer_size in [1, OctopusResultWriter.DEFAULT_BUFFER_SIZE]:
+                f = io.BytesIO()
+                with create_result_writer(f, output_format, buffer_size=buffer_size) as writer:
+                    self.assertEqual(sum(writer.write(*x) for x in results), len(expected_rows))
+                    self.assertEqual(writer.num_rows, len(expected_rows))
+                with self.assertRaises(OctopusInvalidStateError):
+                    writer.write(*results[0])
+                f.seek(0)
+
+                if output_format == 'ndjson':
+                    rows = [json.loads(x) for x in f.read().decode('utf-8').splitlines()]
+                    rows = [tuple(x[y] for y in CSV_HEADER) for x in rows]
+                elif output_format == 'csv':
+                    reader = csv.reader(io.TextIOWrapper(f, encoding='utf-8', newline=''))
+                    self.assertEqual(tuple(next(reader)), CSV_HEADER)
+                    rows = [(x[0], x[1], float(x[2]), float(x[3]), float(x[4])) for x in reader]
+                else:
+                    rows = list()
+                    for chunk in read_columnar_results(f):
+                        rows.extend(
+                            (chunk.documents[x[0]], chunk.phrases[x[1]]) + tuple(x[2:])
+                            for x in zip(*chunk[2:]))
+                self.assertEqual(rows, expected_rows, output_format)
+
+        non_finite_results = ('calls/4.wav', {'alexa': [Octopus.Match(1., 2., float('nan'))]})
+        with self.assertRaises(OctopusInvalidArgumentError):
+            OctopusNDJSONResultWriter(io.BytesIO()).write(*non_finite_results)
+        f = io.BytesIO()
+        with OctopusCSVResultWriter(f) as writer:
+            writer.write(*non_finite_results)
+        self.assertEqual(f.getvalue().decode('utf-8').splitlines()[1], 'calls/4.wav,alexa,1.0,2.0,nan')
+
+        with self.assertRaises(OctopusIOError):
+            list(read_columnar_results(io.BytesIO(b'not a result file')))
+        f = io.BytesIO()
+        with OctopusColumnarResultWriter(f) as writer:
+            writer.write(*results[0])
+        with self.assertRaises(OctopusIOError):
+            list(read_columnar_results(io.BytesIO(f.getvalue()[:-1])))
+
+        with self.assertRaises(TypeError):
+            OctopusResultWriter(io.BytesIO())
+        with self.assertRaises(OctopusInvalidArgumentError):
+            create_result_writer(io.BytesIO(), 'xml')
+
+    def test_trace(self):
+        audio_path = get_audio_path_by_language(self._relative)
+        with wave.open(audio_path, 'rb') as f:
+            num_samples = f.getnframes()
+        trace_dir = tempfile.mkdtemp()
+
+        pool = None
+        try:
+            pool = OctopusPool(
+                access_key=self._access_key,
+                size=2,
+                library_path=default_library_path(self._relative),
+                model_path=get_model_path_by_language(self._relative, 'en'))
+            trace_path = os.path.join(trace_dir, 'trace.jsonl')
+            recorder = OctopusTraceRecorder(trace_path)
+            pool.set_trace_recorder(recorder)
+            with pool.acquire() as octopus:
+                metadata = octopus.index_audio_file(audio_path)
+                octopus.search(metadata, ['alexa'])
+                with self.assertRaises(OctopusInvalidArgumentError):
+                    octopus.search(metadata, ['12'])
+                sample_rate = octopus.sample_rate
+            pool.set_trace_recorder(None)
+            recorder.close()
+            self.assertEqual(recorder.num_events, 3)
+
+            events = list(read_trace(trace_path))
+            self.assertEqual([x['operation'] for x in events], ['index_audio_file', 'search', 'search'])
+            self.assertEqual(events[0]['num_samples'], num_samples)
+            self.assertAlmostEqual(events[0]['audio_sec'], num_samples / sample_rate)
+            self.assertEqual(events[0]['file_bytes'], os.path.getsize(audio_path))
+            self.assertEqual(events[0]['metadata_bytes'], metadata.size)
+            self.assertNotIn('path', events[0])
+            self.assertIsNone(events[1]['error'])
+            self.assertNotIn('phrases', events[1])
+            self.assertEqual(events[2]['error'], 'OctopusInvalidArgumentError')
+
+            # Without a recorded path, audio files are indexed from `audio` and skipped if there is none.
+            corpus = dict(clip=metadata)
+            audio = read_wav_file(audio_path, sample_rate)[:sample_rate]
+            stats = OctopusTraceReplayer(pool, corpus, events, audio=audio).replay(speed=2.)
+            self.assertEqual((stats.num_operations, stats.num_skipped, stats.num_errors), (3, 0, 0))
+            self.assertEqual(OctopusTraceReplayer(pool, corpus, events).replay().num_skipped, 1)
+
+            # Traces without the length of an audio file fall back to its size.
+            events_without_length = [dict(events[0], num_samples=None)]
+            stats = OctopusTraceReplayer(pool, corpus, events_without_length, audio=audio).replay()
+            self.assertEqual((stats.num_operations, stats.num_skipped, stats.num_errors), (1, 0, 0))
+
+            # A replay in which every operation fails is saturated.
+            failing_events = [dict(x, phrases=['12']) for x in events[1:]]
+            replayer = OctopusTraceReplayer(pool, corpus, failing_events)
+            stats = replayer.find_saturation([1., 2., 4.])
+            self.assertEqual(len(stats), 1)
+            self.assertEqual(stats[0].num_errors, stats[0].num_operations)
+            self.assertTrue(stats[0].is_saturated)
+
+            with self.assertRaises(OctopusInvalidArgumentError):
+                replayer.replay(speed=0.)
+            with self.assertRaises(OctopusInvalidStateError):
+                OctopusTraceReplayer(pool, corpus, events[:1]).replay()
+            with self.assertRaises(OctopusInvalidArgumentError):
+                OctopusTraceReplayer(pool, dict(), events)
+            with self.assertRaises(OctopusIOError):
+                list(read_trace(os.path.join(trace_dir, 'missing.jsonl')))
+        finally:
+            if pool is not None:
+                pool.delete()
+            shutil.rmtree(trace_dir)
+
+    def test_percentile(self):
+        values = [float(x) for x in range(11)]
+        self.assertEqual([percentile(values, x) for x in [0, 50, 90, 94, 96, 100]], [0., 5., 9., 9., 10., 10.])
+        self.assertEqual(percentile([3.], 99), 3.)
+        self.assertTrue(math.isnan(percentile([], 50)))
+
     def test_version(self):
         octopus = None
 
@@ -0,0 +1,200 @@
+#
+# Copyright 2023 Picovoice Inc.
+#
+# You may not use this file except in compliance with the license.
+# A copy of the license is located in the "LICENSE" file accompanying this
+# source.
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+import gc
+import os
+import platform
+import sys
+import time
+import tracemalloc
+import unittest
+from ctypes import *
+from typing import *
+
+from _octopus import *
+from _util import *
+from test_util import *
+
+
+class _MallInfo2(Structure):
+    _fields_ = [(x, c_size_t) for x in (
+        'arena',
+        'ordblks',
+        'smblks',
+        'hblks',
+        'hblkhd',
+        'usmblks',
+        'fsmblks',
+        'uordblks',
+        'fordblks',
+        'keepcost')]
+
+
+class _MemoryProbe(object):
+    """
+    Samples resident set size, Python heap (tracemalloc) and native heap (glibc `mallinfo2`) of the current process.
+    """
+
+    def __init__(self) -> None:
+        self._page_size = os.sysconf('SC_PAGE_SIZE') if hasattr(os, 'sysconf') else 4096
+
+        self._mallinfo2_func = None
+        if platform.system() == 'Linux':
+            try:
+                libc = CDLL(None)
+                self._mallinfo2_func = libc.mallinfo2
+                self._mallinfo2_func.argtypes = []
+                self._mallinfo2_func.restype = _MallInfo2
+            except (AttributeError, OSError):
+                self._mallinfo2_func = None
+
+    def rss_bytes(self) -> Optional[int]:
+        try:
+            with open('/proc/self/statm', 'r') as f:
+                return int(f.read().split()[1]) * self._page_size
+        except (OSError, IndexError, ValueError):
+            return None
+
+    @staticmethod
+    def python_heap_bytes() -> int:
+        current, _ = tracemalloc.get_traced_memory()
+        return current
+
+    def native_heap_bytes(self) -> Optional[int]:
+        if self._mallinfo2_func is None:
+            return None
+        info = self._mallinfo2_func()
+        return info.uordblks + info.hblkhd
+
+
+def _slope(xs: Sequence[float], ys: Sequence[float]) -> float:
+    n = len(xs)
+    mean_x = sum(xs) / n
+    mean_y = sum(ys) / n
+    var_x = sum((x - mean_x) ** 2 for x in xs)
+    if var_x == 0:
+        return 0.
+    return sum((x - mean_x) * (y - mean_y) for x, y in zip(xs, ys)) / var_x
+
+
+class OctopusSoakTestCase(unittest.TestCase):
+    SAMPLE_INTERVAL_CYCLES = 10
+    ENGINE_RECYCLE_INTERVAL_CYCLES = 50
+    WARMUP_FRACTION = 0.2
+    NUM_REPORTED_ALLOCATION_SITES = 10
+    SEARCH_PHRASES = ['alexa', 'porcupine', 'americano', 'avocado', 'picovoice']
+
+    @classmethod
+    def setUpClass(cls):
+        cls.access_key = sys.argv[1]
+        cls.relative = '../..'
+
+        cls.duration_sec = float(sys.argv[2])
+        cls.growth_threshold_bytes_per_cycle = float(sys.argv[3])
+
+        cls.probe = _MemoryProbe()
+
+    def _create_octopus(self) -> Octopus:
+        return Octopus(
+            access_key=self.access_key,
+            library_path=default_library_path(self.relative),
+            model_path=get_model_path_by_language(self.relative))
+
+    def _cycle(self, octopus: Octopus, audio: Sequence[int]) -> None:
+        metadata = octopus.index_audio_data(audio)
+        octopus.search(metadata, self.SEARCH_PHRASES)
+
+        restored_metadata = OctopusMetadata.from_bytes(metadata.to_bytes())
+        octopus.search(restored_metadata, self.SEARCH_PHRASES)
+
+    def _allocation_growth(self, start: tracemalloc.Snapshot, end: tracemalloc.Snapshot) -> str:
+        trace_filters = (tracemalloc.Filter(False, tracemalloc.__file__),)
+        stats = end.filter_traces(trace_filters).compare_to(start.filter_traces(trace_filters), 'lineno')
+        stats = [x for x in stats if x.size_diff > 0][:self.NUM_REPORTED_ALLOCATION_SITES]
+        return '\n'.join(["Python allocation sites that grew after warm-up:"] + [str(x) for x in stats])
+
+    def _check_growth(
+            self,
+            name: str,
+            cycles: Sequence[int],
+            samples: Sequence[Optional[int]],
+            details: Optional[str] = None) -> None:
+        start = int(len(samples) * self.WARMUP_FRACTION)
+        cycles = cycles[start:]
+        samples = samples[start:]
+        if len(samples) < 2:
+            self.fail("Not enough samples collected for `%s`. Increase the soak duration." % name)
+
+        if samples[0] is None:
+            print("%s: not available on this platform" % name)
+            return
+
+        slope = _slope(cycles, samples)
+        print("%s: %d -> %d bytes, growth %.1f bytes/cycle" % (name, samples[0], samples[-1], slope))
+        self.assertLess(slope, self.growth_threshold_bytes_per_cycle, msg=details)
+
+    def test_soak(self):
+        tracemalloc.start()
+        octopus = self._create_octopus()
+        audio = read_wav_file(get_audio_path_by_language(self.relative), octopus.sample_rate)
+
+        cycles = list()
+        rss = list()
+        python_heap = list()
+        native_heap = list()
+        warmup_snapshot = None
+
+        try:
+            num_cycles = 0
+            start = time.time()
+            while (time.time() - start) < self.duration_sec:
+                self._cycle(octopus, audio)
+                num_cycles += 1
+
+                if (num_cycles % self.ENGINE_RECYCLE_INTERVAL_CYCLES) == 0:
+                    octopus.delete()
+                    octopus = self._create_octopus()
+
+                if (num_cycles % self.SAMPLE_INTERVAL_CYCLES) == 0:
+                    gc.collect()
+                    cycles.append(num_cycles)
+                    rss.append(self.probe.rss_bytes())
+                    python_heap.append(self.probe.python_heap_bytes())
+                    native_heap.append(self.probe.native_heap_bytes())
+
+                    if warmup_snapshot is None and (time.time() - start) >= self.WARMUP_FRACTION * self.duration_sec:
+                        warmup_snapshot = tracemalloc.take_snapshot()
+
+            gc.collect()
+            final_snapshot = tracemalloc.take_snapshot()
+        finally:
+            octopus.delete()
+            tracemalloc.stop()
+
+        print("Soak cycles: %d in %.1f sec" % (num_cycles, time.time() - start))
+        self._check_growth('RSS', cycles, rss)
+        allocation_growth = None
+        if warmup_snapshot is not None:
+            allocation_growth = self._allocation_growth(warmup_snapshot, final_snapshot)
+            print(allocation_growth)
+        self._check_growth('Python heap', cycles, python_heap, details=allocation_growth)
+        self._check_growth('Native heap', cycles, native_heap)
+
+
+if __name__ == '__main__':
+    if len(sys.argv) != 4:
+        print("usage: test_octopus_soak.py ${ACCESS_KEY} ${DURATION_SEC} ${GROWTH_THRESHOLD_BYTES_PER_CYCLE}")
+        exit(1)
+
+    unittest.main(argv=sys.argv[:1])
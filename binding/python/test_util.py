@@ -9,12 +9,30 @@
 # specific language governing permissions and limitations under the License.
 #
 
+import importlib.util
 import os
 import struct
+import sys
 import wave
 from typing import Sequence
 
 
+def _import_binding() -> None:
+    # Modules of the binding import each other relatively, so tests import this directory as the `pvoctopus` package
+    # rather than module by module, whether or not a release is installed.
+    directory = os.path.dirname(os.path.abspath(__file__))
+    spec = importlib.util.spec_from_file_location(
+        'pvoctopus',
+        os.path.join(directory, '__init__.py'),
+        submodule_search_locations=[directory])
+    module = importlib.util.module_from_spec(spec)
+    sys.modules['pvoctopus'] = module
+    spec.loader.exec_module(module)
+
+
+_import_binding()
+
+
 def read_wav_file(file_name: str, sample_rate: int) -> Sequence[int]:
     wav_file = wave.open(file_name, mode="rb")
     channels = wav_file.getnchannels()
@@ -1,6 +1,7 @@
 #include <getopt.h>
 #include <stdio.h>
 #include <stdlib.h>
+#include <string.h>
 
 #if defined(_WIN32) || defined(_WIN64)
 
@@ -9,6 +10,11 @@
 #else
 
 #include <dlfcn.h>
+#include <fcntl.h>
+#include <sys/mman.h>
+#include <sys/stat.h>
+#include <time.h>
+#include <unistd.h>
 
 #endif
 
@@ -66,18 +72,177 @@ static void print_dl_error(const char *message) {
 #endif
 }
 
+static double get_time_sec(void) {
+
+#if defined(_WIN32) || defined(_WIN64)
+
+    LARGE_INTEGER frequency;
+    LARGE_INTEGER counter;
+    QueryPerformanceFrequency(&frequency);
+    QueryPerformanceCounter(&counter);
+    return (double) counter.QuadPart / (double) frequency.QuadPart;
+
+#else
+
+    struct timespec ts;
+    clock_gettime(CLOCK_MONOTONIC, &ts);
+    return (double) ts.tv_sec + ((double) ts.tv_nsec * 1e-9);
+
+#endif
+}
+
+typedef struct {
+    const void *data;
+    int32_t num_bytes;
+
+#if defined(_WIN32) || defined(_WIN64)
+
+    HANDLE file;
+    HANDLE mapping;
+
+#endif
+
+} mapped_index_t;
+
+static int map_index(const char *path, mapped_index_t *index) {
+
+#if defined(_WIN32) || defined(_WIN64)
+
+    index->file = CreateFileA(path, GENERIC_READ, FILE_SHARE_READ, NULL, OPEN_EXISTING, FILE_ATTRIBUTE_NORMAL, NULL);
+    if (index->file == INVALID_HANDLE_VALUE) {
+        return 0;
+    }
+    LARGE_INTEGER size;
+    if (!GetFileSizeEx(index->file, &size) || (size.QuadPart == 0) || (size.QuadPart > INT32_MAX)) {
+        CloseHandle(index->file);
+        return 0;
+    }
+    index->mapping = CreateFileMappingA(index->file, NULL, PAGE_READONLY, 0, 0, NULL);
+    if (!index->mapping) {
+        CloseHandle(index->file);
+        return 0;
+    }
+    index->data = MapViewOfFile(index->mapping, FILE_MAP_READ, 0, 0, 0);
+    if (!index->data) {
+        CloseHandle(index->mapping);
+        CloseHandle(index->file);
+        return 0;
+    }
+    index->num_bytes = (int32_t) size.QuadPart;
+
+#else
+
+    int fd = open(path, O_RDONLY);
+    if (fd < 0) {
+        return 0;
+    }
+    struct stat st;
+    if ((fstat(fd, &st) != 0) || (st.st_size == 0) || (st.st_size > INT32_MAX)) {
+        close(fd);
+        return 0;
+    }
+    void *data = mmap(NULL, (size_t) st.st_size, PROT_READ, MAP_PRIVATE, fd, 0);
+    close(fd);
+    if (data == MAP_FAILED) {
+        return 0;
+    }
+    index->data = data;
+    index->num_bytes = (int32_t) st.st_size;
+
+#endif
+
+    return 1;
+}
+
+static void unmap_index(mapped_index_t *index) {
+
+#if defined(_WIN32) || defined(_WIN64)
+
+    UnmapViewOfFile(index->data);
+    CloseHandle(index->mapping);
+    CloseHandle(index->file);
+
+#else
+
+    munmap((void *) index->data, (size_t) index->num_bytes);
+
+#endif
+}
+
+static void append_string(const char ***strings, int32_t *num_strings, const char *string) {
+    const char **resized = realloc((void *) *strings, (*num_strings + 1) * sizeof(const char *));
+    if (!resized) {
+        fprintf(stderr, "Failed to allocate memory for arguments.\n");
+        exit(EXIT_FAILURE);
+    }
+    resized[(*num_strings)++] = string;
+    *strings = resized;
+}
+
+static void read_phrase_file(const char *path, const char ***phrases, int32_t *num_phrases) {
+    FILE *f = fopen(path, "r");
+    if (!f) {
+        fprintf(stderr, "Failed to open phrase file at '%s'.\n", path);
+        exit(EXIT_FAILURE);
+    }
+
+    size_t capacity = 1024;
+    char *line = malloc(capacity);
+    if (!line) {
+        fprintf(stderr, "Failed to allocate memory for phrases.\n");
+        exit(EXIT_FAILURE);
+    }
+
+    while (fgets(line, (int) capacity, f)) {
+        // A line that does not fit in the buffer is read without its newline; grow the buffer and read the rest of it.
+        size_t length = strlen(line);
+        while ((length == (capacity - 1)) && (line[length - 1] != '\n')) {
+            capacity *= 2;
+            char *grown_line = realloc(line, capacity);
+            if (!grown_line) {
+                fprintf(stderr, "Failed to allocate memory for phrases.\n");
+                exit(EXIT_FAILURE);
+            }
+            line = grown_line;
+            if (!fgets(line + length, (int) (capacity - length), f)) {
+                break;
+            }
+            length += strlen(line + length);
+        }
+
+        length = strcspn(line, "\r\n");
+        line[length] = '\0';
+        if (length == 0) {
+            continue;
+        }
+        char *phrase = malloc(length + 1);
+        if (!phrase) {
+            fprintf(stderr, "Failed to allocate memory for phrases.\n");
+            exit(EXIT_FAILURE);
+        }
+        memcpy(phrase, line, length + 1);
+        append_string(phrases, num_phrases, phrase);
+    }
+
+    free(line);
+    fclose(f);
+}
+
 static struct option long_options[] = {
         {"library_path",  required_argument, NULL, 'l'},
         {"model_path",    required_argument, NULL, 'm'},
         {"access_key",    required_argument, NULL, 'a'},
         {"index_path",    required_argument, NULL, 'i'},
         {"search_phrase", required_argument, NULL, 's'},
+        {"phrase_file",   required_argument, NULL, 'f'},
+        {NULL,            0,                 NULL, 0},
 };
 
 static void print_usage(const char *program_name) {
     fprintf(
             stderr,
-            "usage : %s -l LIBRARY_PATH -m MODEL_PATH -a ACCESS_KEY -i INDEX_PATH -s SEARCH_PHRASE\n",
+            "usage : %s -l LIBRARY_PATH -m MODEL_PATH -a ACCESS_KEY -i INDEX_PATH [-i INDEX_PATH ...] "
+            "(-s SEARCH_PHRASE [-s SEARCH_PHRASE ...] | -f PHRASE_FILE)\n",
             program_name);
 }
 
@@ -91,11 +256,15 @@ int picovoice_main(int argc, char *argv[]) {
     const char *library_path = NULL;
     const char *model_path = NULL;
     const char *access_key = NULL;
-    const char *index_path = NULL;
-    const char *search_phrase = NULL;
+    const char **index_paths = NULL;
+    int32_t num_index_paths = 0;
+    const char **phrases = NULL;
+    int32_t num_phrases = 0;
+    int32_t num_phrase_arguments = 0;
+    const char *phrase_file_path = NULL;
 
     int c;
-    while ((c = getopt_long(argc, argv, "l:m:a:i:s:", long_options, NULL)) != -1) {
+    while ((c = getopt_long(argc, argv, "l:m:a:i:s:f:", long_options, NULL)) != -1) {
         switch (c) {
             case 'l':
                 library_path = optarg;
@@ -107,21 +276,32 @@ int picovoice_main(int argc, char *argv[]) {
                 access_key = optarg;
                 break;
             case 'i':
-                index_path = optarg;
+                append_string(&index_paths, &num_index_paths, optarg);
                 break;
             case 's':
-                search_phrase = optarg;
+                append_string(&phrases, &num_phrases, optarg);
+                num_phrase_arguments++;
+                break;
+            case 'f':
+                phrase_file_path = optarg;
                 break;
             default:
                 exit(EXIT_FAILURE);
         }
     }
 
-    if (!library_path || !model_path || !search_phrase || !access_key || !index_path) {
+    if (phrase_file_path) {
+        read_phrase_file(phrase_file_path, &phrases, &num_phrases);
+    }
+
+    if (!library_path || !model_path || !access_key || (num_index_paths == 0) || (num_phrases == 0)) {
         print_usage(argv[0]);
         exit(EXIT_FAILURE);
     }
 
+    // A single query prints its matches; anything more runs as a batch that prints the time taken by each query.
+    const int is_batch = (num_index_paths > 1) || (num_phrases > 1) || (phrase_file_path != NULL);
+
     void *dl = pv_open_dl(library_path);
     if (!dl) {
         print_dl_error("Failed to open library");
@@ -183,8 +363,10 @@ int picovoice_main(int argc, char *argv[]) {
         exit(EXIT_FAILURE);
     }
 
+    const double init_start_sec = get_time_sec();
     pv_octopus_t *o = NULL;
     pv_status_t status = pv_octopus_init_func(access_key, model_path, &o);
+    const double init_sec = get_time_sec() - init_start_sec;
     if (status != PV_STATUS_SUCCESS) {
         fprintf(stderr, "Failed to init with '%s'", pv_status_to_string_func(status));
         char **message_stack = NULL;
@@ -207,74 +389,128 @@ int picovoice_main(int argc, char *argv[]) {
         exit(EXIT_FAILURE);
     }
 
-    FILE *f = fopen(index_path, "rb");
-    if (!f) {
-        fprintf(stderr, "Failed to open index file at '%s'.\n", index_path);
-        exit(EXIT_FAILURE);
-    }
-
-    fseek(f, 0, SEEK_END);
-    const int32_t num_indices_byte = (int32_t) ftell(f);
-    fseek(f, 0, SEEK_SET);
-
-    void *indices = calloc(num_indices_byte, sizeof(char));
+    mapped_index_t *indices = calloc(num_index_paths, sizeof(mapped_index_t));
     if (!indices) {
-        fprintf(stderr, "Failed to allocate '%d' bytes of memory for indices.\n", num_indices_byte);
-        exit(EXIT_FAILURE);
-    }
-    if (fread(indices, 1, num_indices_byte, f) != (size_t) num_indices_byte) {
-        fprintf(stderr, "Failed to read indices from '%s'.\n", index_path);
+        fprintf(stderr, "Failed to allocate memory for indices.\n");
         exit(EXIT_FAILURE);
     }
 
-    fclose(f);
-
-    pv_octopus_match_t *matches = NULL;
-    int32_t num_matches = 0;
-
-    status = pv_octopus_search_func(
-            o,
-            indices,
-            num_indices_byte,
-            search_phrase,
-            &matches,
-            &num_matches);
-    if (status != PV_STATUS_SUCCESS) {
-        fprintf(stderr, "Failed to search with '%s'", pv_status_to_string_func(status));
-        char **message_stack = NULL;
-        int32_t message_stack_depth = 0;
-        pv_status_t error_status = pv_get_error_stack_func(&message_stack, &message_stack_depth);
-        if (error_status != PV_STATUS_SUCCESS) {
-            fprintf(
-                    stderr,
-                    ".\nUnable to get Octopus error state with '%s'.\n",
-                    pv_status_to_string_func(error_status));
+    int64_t num_indices_bytes = 0;
+    for (int32_t i = 0; i < num_index_paths; i++) {
+        if (!map_index(index_paths[i], &indices[i])) {
+            fprintf(stderr, "Failed to map index file at '%s'.\n", index_paths[i]);
             exit(EXIT_FAILURE);
         }
+        num_indices_bytes += indices[i].num_bytes;
+    }
 
-        if (message_stack_depth > 0) {
-            fprintf(stderr, ":\n");
-            print_error_message(message_stack, message_stack_depth);
-            pv_free_error_stack_func(message_stack);
+    int64_t total_matches = 0;
+    double total_search_sec = 0.;
+    double max_search_sec = 0.;
+
+    for (int32_t i = 0; i < num_index_paths; i++) {
+        for (int32_t j = 0; j < num_phrases; j++) {
+            pv_octopus_match_t *matches = NULL;
+            int32_t num_matches = 0;
+
+            const double search_start_sec = get_time_sec();
+            status = pv_octopus_search_func(
+                    o,
+                    indices[i].data,
+                    indices[i].num_bytes,
+                    phrases[j],
+                    &matches,
+                    &num_matches);
+            const double search_sec = get_time_sec() - search_start_sec;
+            if (status != PV_STATUS_SUCCESS) {
+                fprintf(
+                        stderr,
+                        "Failed to search '%s' for '%s' with '%s'",
+                        index_paths[i],
+                        phrases[j],
+                        pv_status_to_string_func(status));
+                char **message_stack = NULL;
+                int32_t message_stack_depth = 0;
+                pv_status_t error_status = pv_get_error_stack_func(&message_stack, &message_stack_depth);
+                if (error_status != PV_STATUS_SUCCESS) {
+                    fprintf(
+                            stderr,
+                            ".\nUnable to get Octopus error state with '%s'.\n",
+                            pv_status_to_string_func(error_status));
+                    exit(EXIT_FAILURE);
+                }
+
+                if (message_stack_depth > 0) {
+                    fprintf(stderr, ":\n");
+                    print_error_message(message_stack, message_stack_depth);
+                    pv_free_error_stack_func(message_stack);
+                }
+                exit(EXIT_FAILURE);
+            }
+
+            total_matches += num_matches;
+            total_search_sec += search_sec;
+            if (search_sec > max_search_sec) {
+                max_search_sec = search_sec;
+            }
+
+            if (is_batch) {
+                fprintf(
+                        stdout,
+                        "%s\t%s\t%d matches\t%.3f ms\n",
+                        index_paths[i],
+                        phrases[j],
+                        num_matches,
+                        search_sec * 1e3);
+            } else {
+                fprintf(stdout, "# matches: %d\n", num_matches);
+                for (int32_t k = 0; k < num_matches; k++) {
+                    fprintf(
+                            stdout,
+                            "[%d] .start_sec = %.1f .end_sec = %.1f .probability = %.2f\n",
+                            k,
+                            matches[k].start_sec,
+                            matches[k].end_sec,
+                            matches[k].probability);
+                }
+            }
+
+            pv_octopus_matches_delete_func(matches);
         }
-        exit(EXIT_FAILURE);
     }
 
-    free(indices);
-    pv_octopus_delete_func(o);
-
-    fprintf(stdout, "# matches: %d\n", num_matches);
-    for (int32_t i = 0; i < num_matches; i++) {
+    if (is_batch) {
+        const int32_t num_queries = num_index_paths * num_phrases;
+        fprintf(stdout, "init: %.3f ms\n", init_sec * 1e3);
         fprintf(
                 stdout,
-                "[%d] .start_sec = %.1f .end_sec = %.1f .probability = %.2f\n",
-                i,
-                matches[i].start_sec,
-                matches[i].end_sec,
-                matches[i].probability);
+                "%d queries (%d indices, %.1f MB x %d phrases), %lld matches in %.3f sec: "
+                "%.1f queries/sec, %.3f ms/query mean, %.3f ms/query max, %.1f MB/sec\n",
+                num_queries,
+                num_index_paths,
+                (double) num_indices_bytes / (1024. * 1024.),
+                num_phrases,
+                (long long) total_matches,
+                total_search_sec,
+                (total_search_sec > 0.) ? ((double) num_queries / total_search_sec) : 0.,
+                (total_search_sec * 1e3) / num_queries,
+                max_search_sec * 1e3,
+                (total_search_sec > 0.)
+                        ? (((double) num_indices_bytes * num_phrases) / (1024. * 1024.) / total_search_sec)
+                        : 0.);
+    }
+
+    for (int32_t i = 0; i < num_index_paths; i++) {
+        unmap_index(&indices[i]);
     }
+    free(indices);
+    for (int32_t j = num_phrase_arguments; j < num_phrases; j++) {
+        free((void *) phrases[j]);
+    }
+    free((void *) phrases);
+    free((void *) index_paths);
 
-    pv_octopus_matches_delete_func(matches);
+    pv_octopus_delete_func(o);
     pv_close_dl(dl);
 
     return 0;
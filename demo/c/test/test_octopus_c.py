@@ -12,6 +12,7 @@
 import os.path
 import subprocess
 import sys
+import tempfile
 import unittest
 
 from test_util import *
@@ -73,10 +74,58 @@ class OctopusCTestCase(unittest.TestCase):
         self.assertEqual(process.poll(), 0)
         self.assertEqual(stderr.decode('utf-8'), '')
 
-    
+    def run_octopus_batch(self, language, phrases):
+        args = [
+            os.path.join(os.path.dirname(__file__), "../build/octopus_index_demo"),
+            "-a", self._access_key,
+            "-l", self._get_library_file(),
+            "-m", self._get_model_path_by_language(language),
+            "-w", self._get_audio_file_by_language(language),
+            "-i", self._index_path
+        ]
+        process = subprocess.Popen(args, stderr=subprocess.PIPE, stdout=subprocess.PIPE)
+        stdout, stderr = process.communicate()
+        self.assertEqual(process.poll(), 0)
+
+        with tempfile.NamedTemporaryFile('w', suffix='.txt', delete=False) as f:
+            f.write('\n'.join(phrases[1:]) + '\n')
+            phrase_file_path = f.name
+
+        try:
+            args = [
+                os.path.join(os.path.dirname(__file__), "../build/octopus_search_demo"),
+                "-a", self._access_key,
+                "-l", self._get_library_file(),
+                "-m", self._get_model_path_by_language(language),
+                "-i", self._index_path,
+                "-i", self._index_path,
+                "-s", phrases[0],
+                "-f", phrase_file_path
+            ]
+            process = subprocess.Popen(args, stderr=subprocess.PIPE, stdout=subprocess.PIPE)
+            stdout, stderr = process.communicate()
+            self.assertEqual(process.poll(), 0)
+            self.assertEqual(stderr.decode('utf-8'), '')
+        finally:
+            os.remove(phrase_file_path)
+
+        lines = stdout.decode('utf-8').splitlines()
+        query_lines = [x for x in lines if x.startswith(self._index_path + '\t')]
+        self.assertEqual(len(query_lines), 2 * len(phrases))
+        self.assertEqual([x.split('\t')[1] for x in query_lines], phrases * 2)
+        self.assertIn('queries/sec', lines[-1])
+
     def test_octopus(self):
         self.run_octopus(language="en")
 
+    def test_octopus_batch(self):
+        self.run_octopus_batch(language="en", phrases=["picovoice", "alexa", "porcupine"])
+
+    def test_octopus_batch_long_phrase(self):
+        # Longer than the initial line buffer of the phrase file reader, so the line is read in several pieces.
+        long_phrase = ' '.join(["porcupine"] * 200)
+        self.run_octopus_batch(language="en", phrases=["picovoice", long_phrase, "alexa"])
+
 
 if __name__ == '__main__':
     if len(sys.argv) < 3 or len(sys.argv) > 4:
@@ -0,0 +1,611 @@
+#
+# Copyright 2023 Picovoice Inc.
+#
+# You may not use this file except in compliance with the license. A copy of the license is located in the "LICENSE"
+# file accompanying this source.
+#
+# Unless required by applicable law or agreed to in writing, software distributed under the License is distributed on
+# an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the License for the
+# specific language governing permissions and limitations under the License.
+#
+
+import argparse
+import math
+import multiprocessing
+import os
+import pickle
+import random
+import sys
+import tempfile
+import time
+import wave
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+from typing import *
+
+import pvoctopus
+
+
+def read_wav_file(path: str, sample_rate: int) -> array:
+    with wave.open(path, 'rb') as f:
+        if f.getframerate() != sample_rate:
+            raise ValueError("Audio file should have a sample rate of %d, got %d" % (sample_rate, f.getframerate()))
+        if f.getsampwidth() != 2:
+            raise ValueError("Audio file should be 16-bit")
+        channels = f.getnchannels()
+        frames = f.readframes(f.getnframes())
+
+    pcm = array('h')
+    pcm.frombytes(frames)
+    if sys.byteorder != 'little':
+        pcm.byteswap()
+    return pcm[::channels]
+
+
+def create_octopus(args: argparse.Namespace) -> pvoctopus.Octopus:
+    return pvoctopus.create(access_key=args.access_key, library_path=args.library_path, model_path=args.model_path)
+
+
+def print_result(name: str, elapsed_sec: float, num_jobs: int, audio_sec: float) -> None:
+    print("%-16s %8.3f sec %10.2f ms/job %8.1fx realtime" % (
+        name,
+        elapsed_sec,
+        elapsed_sec * 1000 / num_jobs,
+        audio_sec / elapsed_sec))
+
+
+_octopus = None
+
+
+def _init_pickle_worker(access_key: str, library_path: Optional[str], model_path: Optional[str]) -> None:
+    global _octopus
+    _octopus = pvoctopus.create(access_key=access_key, library_path=library_path, model_path=model_path)
+
+
+def _index_pickled(pcm: Sequence[int]) -> bytes:
+    return _octopus.index_audio_data(pcm).to_bytes()
+
+
+def benchmark_shared_memory(args: argparse.Namespace) -> None:
+    octopus = create_octopus(args)
+    sample_rate = octopus.sample_rate
+    octopus.delete()
+
+    pcm = read_wav_file(args.audio_path, sample_rate) * args.repeat
+    audio_sec = len(pcm) * args.num_jobs / sample_rate
+    pcm_tuple = tuple(pcm)
+    print("%d jobs of %.1f sec audio on %d workers, %d bytes pickled per job" % (
+        args.num_jobs,
+        len(pcm) / sample_rate,
+        args.num_workers,
+        len(pickle.dumps(pcm_tuple))))
+
+    with ProcessPoolExecutor(
+            max_workers=args.num_workers,
+            initializer=_init_pickle_worker,
+            initargs=(args.access_key, args.library_path, args.model_path)) as executor:
+        list(executor.map(_index_pickled, [pcm_tuple] * args.num_workers))
+
+        start = time.perf_counter()
+        pickled_results = list(executor.map(_index_pickled, [pcm_tuple] * args.num_jobs))
+        print_result('pickle', time.perf_counter() - start, args.num_jobs, audio_sec)
+
+    indexer = pvoctopus.OctopusSharedMemoryIndexer(
+        access_key=args.access_key,
+        num_workers=args.num_workers,
+        library_path=args.library_path,
+        model_path=args.model_path)
+    try:
+        indexer.index([pcm] * args.num_workers)
+
+        start = time.perf_counter()
+        shared_results = indexer.index([pcm] * args.num_jobs)
+        print_result('shared memory', time.perf_counter() - start, args.num_jobs, audio_sec)
+    finally:
+        indexer.delete()
+
+    if any(x != y.to_bytes() for x, y in zip(pickled_results, shared_results)):
+        print("Metadata produced through shared memory differs from pickled transport")
+        sys.exit(1)
+
+
+def benchmark_prepared_search(args: argparse.Namespace) -> None:
+    octopus = create_octopus(args)
+    try:
+        metadata = octopus.index_audio_data(read_wav_file(args.audio_path, octopus.sample_rate) * args.repeat)
+        prepared_query = octopus.prepare(args.phrases)
+        print("%d searches for %d phrases" % (args.num_jobs, len(args.phrases)))
+
+        results = dict()
+        for name, search in (
+                ('search', lambda: octopus.search(metadata, args.phrases)),
+                ('prepared', lambda: prepared_query.search(metadata))):
+            search()
+            start = time.perf_counter()
+            for _ in range(args.num_jobs):
+                results[name] = search()
+            elapsed_sec = time.perf_counter() - start
+            print("%-16s %8.3f sec %10.2f us/document" % (name, elapsed_sec, elapsed_sec * 1e6 / args.num_jobs))
+    finally:
+        octopus.delete()
+
+    if results['search'] != results['prepared']:
+        print("Prepared query returned different matches")
+        sys.exit(1)
+
+
+COMPRESSION_LEVELS = {
+    'zlib': (1, 6, 9),
+    'bz2': (1, 9),
+    'lzma': (0, 6, 9),
+}
+
+
+def benchmark_compression(args: argparse.Namespace) -> None:
+    octopus = create_octopus(args)
+    try:
+        metadata = octopus.index_audio_data(read_wav_file(args.audio_path, octopus.sample_rate) * args.repeat)
+        prepared_query = octopus.prepare(args.phrases)
+
+        start = time.perf_counter()
+        for _ in range(args.num_jobs):
+            expected = prepared_query.search(metadata)
+        search_ms = (time.perf_counter() - start) * 1000 / args.num_jobs
+        print("%d bytes of metadata, %.3f ms/search uncompressed" % (metadata.size, search_ms))
+        print("%-8s %5s %8s %14s %16s %14s" % (
+            'codec',
+            'level',
+            'ratio',
+            'compress (ms)',
+            'decompress (ms)',
+            'overhead'))
+
+        buffer = pvoctopus.OctopusDecompressionBuffer()
+        for codec in pvoctopus.COMPRESSION_CODECS:
+            for level in COMPRESSION_LEVELS[codec]:
+                start = time.perf_counter()
+                compressed = pvoctopus.OctopusCompressedMetadata.compress(metadata, codec=codec, level=level)
+                compress_ms = (time.perf_counter() - start) * 1000
+
+                start = time.perf_counter()
+                for _ in range(args.num_jobs):
+                    matches = prepared_query.search(compressed.decompress(buffer))
+                decompress_ms = (time.perf_counter() - start) * 1000 / args.num_jobs - search_ms
+
+                if matches != expected:
+                    print("Search on decompressed metadata returned different matches")
+                    sys.exit(1)
+
+                print("%-8s %5d %7.2fx %14.2f %16.3f %13.1f%%" % (
+                    codec,
+                    level,
+                    metadata.size / compressed.compressed_size,
+                    compress_ms,
+                    decompress_ms,
+                    decompress_ms * 100 / search_ms))
+    finally:
+        octopus.delete()
+
+
+def benchmark_clips(args: argparse.Namespace) -> None:
+    octopus = create_octopus(args)
+    try:
+        sample_rate = octopus.sample_rate
+        metadata = octopus.index_audio_file(args.audio_path)
+        matches = [x for y in octopus.search(metadata, args.phrases).values() for x in y]
+    finally:
+        octopus.delete()
+    print("%d clips from %s" % (len(matches), args.audio_path))
+
+    pad_sec = 0.5
+    start = time.perf_counter()
+    for _ in range(args.num_jobs):
+        pcm = read_wav_file(args.audio_path, sample_rate)
+        decoded_clips = [
+            pcm[max(0, math.floor((x.start_sec - pad_sec) * sample_rate)):
+                math.ceil((x.end_sec + pad_sec) * sample_rate)]
+            for x in matches]
+    print("%-16s %10.3f ms/page" % ('decode file', (time.perf_counter() - start) * 1000 / args.num_jobs))
+
+    start = time.perf_counter()
+    for _ in range(args.num_jobs):
+        clips = pvoctopus.extract_clips(args.audio_path, matches, pad_sec=pad_sec)
+    print("%-16s %10.3f ms/page" % ('extract clips', (time.perf_counter() - start) * 1000 / args.num_jobs))
+
+    if clips != decoded_clips:
+        print("Extracted clips differ from slices of the decoded file")
+        sys.exit(1)
+
+
+def benchmark_dedup(args: argparse.Namespace) -> None:
+    octopus = create_octopus(args)
+    try:
+        pcm = read_wav_file(args.audio_path, octopus.sample_rate) * args.repeat
+        # Every job is the same audio starting at a different point, like a broadcast recorded at different times.
+        offsets = random.Random(0).sample(range(len(pcm)), args.num_jobs)
+        jobs = [pcm[x:] + pcm[:x] for x in offsets]
+        audio_sec = len(pcm) * args.num_jobs / octopus.sample_rate
+        print("%d jobs of %.1f sec audio" % (args.num_jobs, len(pcm) / octopus.sample_rate))
+
+        start = time.perf_counter()
+        metadata_list = [octopus.index_audio_data(x) for x in jobs]
+        print_result('index', time.perf_counter() - start, args.num_jobs, audio_sec)
+
+        with tempfile.TemporaryDirectory() as store_path:
+            indexer = pvoctopus.OctopusDeduplicatingIndexer(octopus, pvoctopus.OctopusChunkStore(store_path))
+            start = time.perf_counter()
+            chunked_metadata_list = [indexer.index_audio_data(x) for x in jobs]
+            print_result('deduplicated', time.perf_counter() - start, args.num_jobs, audio_sec)
+            print("%.1f%% of audio reused" % (indexer.reused_fraction * 100))
+
+            num_matches = sum(len(y) for x in metadata_list for y in octopus.search(x, args.phrases).values())
+            num_chunked_matches = sum(
+                len(y) for x in chunked_metadata_list for y in indexer.search(x, args.phrases).values())
+            print("%d matches, %d on deduplicated metadata" % (num_matches, num_chunked_matches))
+    finally:
+        octopus.delete()
+
+
+def benchmark_scheduler(args: argparse.Namespace) -> None:
+    octopus = create_octopus(args)
+    sample_rate = octopus.sample_rate
+    short_pcm = read_wav_file(args.audio_path, sample_rate)
+    octopus.delete()
+    long_pcm = short_pcm * args.repeat
+
+    # One long archive for every three short clips, all queued at once.
+    jobs = [(long_pcm, False) if i % 4 == 0 else (short_pcm, True) for i in range(args.num_jobs)]
+    print("%d jobs (%d short of %.1f sec, %d long of %.1f sec) on %d workers" % (
+        len(jobs),
+        sum(x[1] for x in jobs),
+        len(short_pcm) / sample_rate,
+        sum(not x[1] for x in jobs),
+        len(long_pcm) / sample_rate,
+        args.num_workers))
+
+    for policy in ('fifo', 'sjf'):
+        scheduler = pvoctopus.OctopusIngestionScheduler(
+            access_key=args.access_key,
+            num_workers=args.num_workers,
+            policy=policy,
+            library_path=args.library_path,
+            model_path=args.model_path)
+        try:
+            latencies = [list(), list()]
+            start = time.perf_counter()
+            futures = list()
+            for pcm, is_short in jobs:
+                future = scheduler.submit_data(pcm)
+                future.add_done_callback(
+                    lambda _, x=is_short: latencies[x].append(time.perf_counter() - start))
+                futures.append(future)
+            for future in futures:
+                future.result()
+            elapsed_sec = time.perf_counter() - start
+            # Callbacks of the last futures may still be running.
+            while sum(len(x) for x in latencies) < len(jobs):
+                time.sleep(0.001)
+        finally:
+            scheduler.delete()
+
+        short_latencies = sorted(latencies[True])
+        print("%-6s total %8.3f sec, short clips done after %8.3f sec (mean) %8.3f sec (max)" % (
+            policy,
+            elapsed_sec,
+            sum(short_latencies) / len(short_latencies),
+            short_latencies[-1]))
+
+
+SCALING_PHRASES = (
+    'account', 'address', 'agent', 'amount', 'answer', 'balance', 'billing', 'booking',
+    'cancel', 'card', 'change', 'charge', 'check', 'complaint', 'confirm', 'contract',
+    'credit', 'customer', 'damage', 'delivery', 'discount', 'email', 'error', 'expired',
+    'family', 'feedback', 'flight', 'help', 'hotel', 'insurance', 'invoice', 'issue',
+    'lawyer', 'limit', 'manager', 'message', 'mobile', 'money', 'number', 'offer',
+    'order', 'package', 'password', 'payment', 'phone', 'premium', 'price', 'problem',
+    'receipt', 'refund', 'renewal', 'repair', 'return', 'service', 'shipping', 'support',
+    'survey', 'ticket', 'transfer', 'travel', 'update', 'upgrade', 'warranty', 'weather',
+)
+
+
+def benchmark_export(args: argparse.Namespace) -> None:
+    rng = random.Random(0)
+    phrases = args.phrases
+    documents = list()
+    for i in range(args.num_jobs):
+        matches = {x: list() for x in phrases}
+        for _ in range(10000):
+            start_sec = rng.uniform(0, 3600)
+            matches[rng.choice(phrases)].append(
+                pvoctopus.Octopus.Match(start_sec, start_sec + rng.uniform(0.2, 2), rng.random()))
+        documents.append(('/path/to/recording_%04d.wav' % i, matches))
+    num_rows = sum(len(y) for _, x in documents for y in x.values())
+
+    for output_format in pvoctopus.RESULT_FORMATS:
+        with tempfile.TemporaryFile() as f:
+            start = time.perf_counter()
+            with pvoctopus.create_result_writer(f, output_format) as writer:
+                for document_id, matches in documents:
+                    writer.write(document_id, matches)
+            elapsed_sec = time.perf_counter() - start
+            print("%-10s %8.3f sec %12.0f rows/sec %8.1f bytes/row" % (
+                output_format,
+                elapsed_sec,
+                num_rows / elapsed_sec,
+                f.tell() / num_rows))
+
+
+def benchmark_pipeline(args: argparse.Namespace) -> None:
+    paths = [args.audio_path] * args.num_jobs
+
+    octopus = create_octopus(args)
+    sample_rate = octopus.sample_rate
+    try:
+        start = time.perf_counter()
+        audio_sec = 0.
+        for path in paths:
+            pcm = read_wav_file(path, sample_rate)
+            audio_sec += len(pcm) / sample_rate
+            octopus.index_audio_data(pcm)
+        print_result('sequential', time.perf_counter() - start, len(paths), audio_sec)
+    finally:
+        octopus.delete()
+
+    pool = pvoctopus.OctopusPool(
+        access_key=args.access_key,
+        size=args.num_workers,
+        model_path=args.model_path,
+        library_path=args.library_path)
+    try:
+        pipeline = (
+            pvoctopus.OctopusPipeline(pvoctopus.read_wav_blocks(paths, block_sec=1.))
+            .map(pvoctopus.downmix_block, name='downmix')
+            .transform(pvoctopus.OctopusResampler(sample_rate), name='resample')
+            .transform(pvoctopus.concatenate_blocks, name='concatenate')
+            .map(pvoctopus.OctopusPoolIndexer(pool), name='index', workers=args.num_workers))
+        start = time.perf_counter()
+        for _ in pipeline.run():
+            pass
+        print_result('pipeline', time.perf_counter() - start, len(paths), audio_sec)
+
+        print("%-12s %8s %8s %8s %12s %10s" % ('stage', 'in', 'out', 'busy', 'items/sec', 'max queue'))
+        for stats in pipeline.stats():
+            print("%-12s %8d %8d %7.0f%% %12.1f %10d" % (
+                stats.name,
+                stats.num_in,
+                stats.num_out,
+                stats.utilization * 100,
+                stats.items_per_sec,
+                stats.max_queue_depth))
+    finally:
+        pool.delete()
+
+
+def benchmark_index_many(args: argparse.Namespace) -> None:
+    octopus = create_octopus(args)
+    try:
+        sample_rate = octopus.sample_rate
+        pcm = read_wav_file(args.audio_path, sample_rate)
+        rng = random.Random(0)
+        clips = list()
+        for _ in range(args.num_jobs):
+            length = min(len(pcm), rng.randint(3 * sample_rate, 10 * sample_rate))
+            start = rng.randint(0, len(pcm) - length)
+            clips.append(pcm[start:start + length])
+        audio_sec = sum(len(x) for x in clips) / sample_rate
+        print("%d clips of %.1f sec on average" % (len(clips), audio_sec / len(clips)))
+
+        start = time.perf_counter()
+        metadata_list = [octopus.index_audio_data(x) for x in clips]
+        elapsed_sec = time.perf_counter() - start
+        print("%-16s %8.3f sec %10.1f clips/sec" % ('one per call', elapsed_sec, len(clips) / elapsed_sec))
+
+        start = time.perf_counter()
+        packed_metadata = octopus.index_many(clips)
+        elapsed_sec = time.perf_counter() - start
+        print("%-16s %8.3f sec %10.1f clips/sec" % ('index_many', elapsed_sec, len(clips) / elapsed_sec))
+
+        num_matches = sum(len(y) for x in metadata_list for y in octopus.search(x, args.phrases).values())
+        num_packed_matches = sum(len(y) for x in octopus.search_many(packed_metadata, args.phrases) for y in x.values())
+        print("%d matches, %d on packed clips" % (num_matches, num_packed_matches))
+    finally:
+        octopus.delete()
+
+
+def benchmark_parallel_search(args: argparse.Namespace) -> None:
+    octopus = create_octopus(args)
+    try:
+        metadata = octopus.index_audio_data(read_wav_file(args.audio_path, octopus.sample_rate) * args.repeat)
+        print("%d searches per phrase count, %d bytes of metadata" % (args.num_jobs, metadata.size))
+        print("%-8s %14s %14s %8s" % ('phrases', '1 worker (ms)', '%d workers (ms)' % args.num_workers, 'speedup'))
+
+        num_phrases = 1
+        while num_phrases <= len(SCALING_PHRASES):
+            phrases = SCALING_PHRASES[:num_phrases]
+            latencies_ms = list()
+            for workers in (1, args.num_workers):
+                octopus.search(metadata, phrases, workers=workers)
+                start = time.perf_counter()
+                for _ in range(args.num_jobs):
+                    matches = octopus.search(metadata, phrases, workers=workers)
+                latencies_ms.append((time.perf_counter() - start) * 1000 / args.num_jobs)
+                if workers == 1:
+                    expected = matches
+                elif matches != expected:
+                    print("Parallel search returned different matches")
+                    sys.exit(1)
+
+            print("%-8d %14.3f %14.3f %7.2fx" % (
+                num_phrases,
+                latencies_ms[0],
+                latencies_ms[1],
+                latencies_ms[0] / latencies_ms[1]))
+            num_phrases *= 2
+    finally:
+        octopus.delete()
+
+
+def benchmark_tiered(args: argparse.Namespace) -> None:
+    octopus = create_octopus(args)
+    try:
+        pcm = read_wav_file(args.audio_path, octopus.sample_rate) * args.repeat
+        rng = random.Random(0)
+        offsets = rng.sample(range(len(pcm)), args.num_jobs)
+        metadata_list = [octopus.index_audio_data(pcm[x:] + pcm[:x]) for x in offsets]
+        total_bytes = sum(x.size for x in metadata_list)
+
+        # Zipf distributed: the document of rank `i` is queried in proportion to `1 / (i + 1)`.
+        num_queries = 20 * args.num_jobs
+        queries = rng.choices(range(args.num_jobs), weights=[1 / (i + 1) for i in range(args.num_jobs)], k=num_queries)
+        print("%d queries over %d documents (%d bytes), hot tier of 10%%" % (num_queries, args.num_jobs, total_bytes))
+        print("%-8s %10s %10s %10s %10s %10s" % ('store', 'p50 (ms)', 'p90 (ms)', 'p99 (ms)', 'max (ms)', 'hot reads'))
+
+        for name, hot_capacity_bytes in (('cold', 0), ('tiered', total_bytes // 10)):
+            with tempfile.TemporaryDirectory() as store_path:
+                store = pvoctopus.OctopusTieredStore(store_path, hot_capacity_bytes=hot_capacity_bytes)
+                for i, metadata in enumerate(metadata_list):
+                    store.add(str(i), metadata)
+
+                latencies = list()
+                for i, document_id in enumerate(queries):
+                    start = time.perf_counter()
+                    octopus.search(store.get(str(document_id)), args.phrases)
+                    latencies.append(time.perf_counter() - start)
+                    if i % 100 == 99:
+                        store.rebalance()
+
+                stats = store.stats()
+                store.close()
+
+            latencies.sort()
+            print("%-8s %10.3f %10.3f %10.3f %10.3f %9.1f%%" % (
+                name,
+                pvoctopus.percentile(latencies, 50) * 1000,
+                pvoctopus.percentile(latencies, 90) * 1000,
+                pvoctopus.percentile(latencies, 99) * 1000,
+                pvoctopus.percentile(latencies, 100) * 1000,
+                stats.num_hot_reads * 100 / (stats.num_hot_reads + stats.num_cold_reads)))
+    finally:
+        octopus.delete()
+
+
+def benchmark_fork_server(args: argparse.Namespace) -> None:
+    octopus = create_octopus(args)
+    sample_rate = octopus.sample_rate
+    octopus.delete()
+
+    pcm = read_wav_file(args.audio_path, sample_rate)
+    print("Time to first result of %d new workers, each indexing %.1f sec of audio" % (
+        args.num_jobs,
+        len(pcm) / sample_rate))
+
+    # A fresh process initializes Octopus and pays for the cold first call.
+    start = time.perf_counter()
+    for _ in range(args.num_jobs):
+        with ProcessPoolExecutor(
+                max_workers=1,
+                mp_context=multiprocessing.get_context('spawn'),
+                initializer=_init_pickle_worker,
+                initargs=(args.access_key, args.library_path, args.model_path)) as executor:
+            cold_results = executor.submit(_index_pickled, pcm).result()
+    print_result('cold start', time.perf_counter() - start, args.num_jobs, len(pcm) * args.num_jobs / sample_rate)
+
+    # Retiring every worker after one job forks a new one from the warm template for each job.
+    pool = pvoctopus.OctopusForkServerPool(
+        access_key=args.access_key,
+        num_workers=1,
+        max_jobs_per_worker=1,
+        library_path=args.library_path,
+        model_path=args.model_path)
+    try:
+        start = time.perf_counter()
+        for _ in range(args.num_jobs):
+            forked_results = pool.index_audio_data(pcm).to_bytes()
+        print_result('fork server', time.perf_counter() - start, args.num_jobs, len(pcm) * args.num_jobs / sample_rate)
+    finally:
+        pool.delete()
+
+    if cold_results != forked_results:
+        print("Metadata produced by a forked worker differs from a cold started one")
+        sys.exit(1)
+
+
+BENCHMARKS = {
+    'export': (
+        benchmark_export,
+        'Rows per second and bytes per row when exporting synthetic matches as NDJSON, CSV and columnar binary'),
+    'pipeline': (
+        benchmark_pipeline,
+        'Indexing `--num_jobs` WAV files one after the other versus streamed through an `OctopusPipeline` that reads, '
+        'downmixes and resamples blocks while `--num_workers` engine instances index, with per-stage utilization'),
+    'index_many': (
+        benchmark_index_many,
+        'Clips per second when indexing short clips one per call versus packed together with `Octopus.index_many`'),
+    'parallel_search': (
+        benchmark_parallel_search,
+        'Latency of searching for 1 to 64 phrases on one thread versus spread over `--num_workers` engine instances'),
+    'tiered': (
+        benchmark_tiered,
+        'Latency percentiles of skewed per-document queries on an `OctopusTieredStore` versus a compressed-only store'),
+    'fork_server': (
+        benchmark_fork_server,
+        'Time to first result of a new worker process, cold started versus forked from a warm template'),
+    'scheduler': (
+        benchmark_scheduler,
+        'Completion time of short clips queued with long archives, first come first served versus shortest job first'),
+    'dedup': (
+        benchmark_dedup,
+        'Indexing recordings that repeat the same audio with and without `OctopusDeduplicatingIndexer`'),
+    'clips': (
+        benchmark_clips,
+        'Loading the audio of every match in a file by decoding the whole file versus `extract_clips`'),
+    'compression': (
+        benchmark_compression,
+        'Compression ratio of metadata versus the search latency added by decompression, per codec and level'),
+    'prepared_search': (
+        benchmark_prepared_search,
+        'Per-document overhead of searching with `Octopus.search` versus a prepared query'),
+    'shared_memory': (
+        benchmark_shared_memory,
+        'Multi-process indexing with shared memory transport versus pickling'),
+}
+
+
+def main():
+    parser = argparse.ArgumentParser()
+
+    parser.add_argument(
+        '--access_key',
+        help='AccessKey provided by Picovoice Console (https://console.picovoice.ai/)',
+        required=True)
+
+    parser.add_argument('--library_path', help='Absolute path to dynamic library')
+
+    parser.add_argument('--model_path', help='Absolute path to the file containing model parameters')
+
+    parser.add_argument('--audio_path', help='Absolute path to a 16-bit WAV file used as input', required=True)
+
+    parser.add_argument('--repeat', type=int, default=1, help='Number of times the audio is repeated per job')
+
+    parser.add_argument('--num_jobs', type=int, default=32, help='Number of jobs')
+
+    parser.add_argument('--num_workers', type=int, default=os.cpu_count(), help='Number of workers')
+
+    parser.add_argument(
+        '--phrases',
+        nargs='+',
+        default=['alexa', 'siri', 'google', 'picovoice', 'octopus'],
+        help='Phrases to search for')
+
+    parser.add_argument(
+        'benchmark',
+        choices=sorted(BENCHMARKS.keys()),
+        help='Benchmark to run. %s' % ' '.join('`%s`: %s.' % (x, y[1]) for x, y in sorted(BENCHMARKS.items())))
+
+    args = parser.parse_args()
+
+    BENCHMARKS[args.benchmark][0](args)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,459 @@
+#
+# Copyright 2023 Picovoice Inc.
+#
+# You may not use this file except in compliance with the license. A copy of the license is located in the "LICENSE"
+# file accompanying this source.
+#
+# Unless required by applicable law or agreed to in writing, software distributed under the License is distributed on
+# an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the License for the
+# specific language governing permissions and limitations under the License.
+#
+
+import argparse
+import heapq
+import http.client
+import json
+import os
+import queue
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import *
+
+import pvoctopus
+
+Matches = Dict[str, Dict[str, List[List[float]]]]
+
+
+class RequestError(Exception):
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+
+
+def prune_top_k(matches: Matches, top_k: int) -> Matches:
+    """Keeps the `top_k` most probable matches of a `{document: {phrase: [[start, end, probability]]}}` result."""
+
+    flat = ((x[2], document_id, phrase, x) for document_id, y in matches.items() for phrase, z in y.items() for x in z)
+    pruned = dict()
+    for _, document_id, phrase, match in heapq.nlargest(top_k, flat, key=lambda x: x[0]):
+        pruned.setdefault(document_id, dict()).setdefault(phrase, list()).append(match)
+    for document_matches in pruned.values():
+        for phrase_matches in document_matches.values():
+            phrase_matches.sort()
+    return pruned
+
+
+class Shard(object):
+    """
+    A worker (`octopus_server_demo`) owning part of the corpus. Connections to it are kept alive between requests.
+    """
+
+    def __init__(self, host: str, port: int):
+        self.host = host
+        self.port = port
+        self.documents = set()
+        self.num_bytes = 0
+        self.healthy = False
+        self._connections = queue.LifoQueue()
+
+    @property
+    def address(self) -> str:
+        return '%s:%d' % (self.host, self.port)
+
+    def request(self, method: str, path: str, body: Optional[Dict[str, Any]], timeout: float) -> Dict[str, Any]:
+        try:
+            connection = self._connections.get_nowait()
+        except queue.Empty:
+            connection = http.client.HTTPConnection(self.host, self.port)
+
+        try:
+            connection.timeout = timeout
+            if connection.sock is not None:
+                connection.sock.settimeout(timeout)
+            payload = None if body is None else json.dumps(body).encode('utf-8')
+            connection.request(method, path, body=payload, headers={'Content-Type': 'application/json'})
+            response = connection.getresponse()
+            result = json.loads(response.read())
+        except Exception:
+            connection.close()
+            raise
+
+        self._connections.put(connection)
+        if response.status != 200:
+            raise RequestError(response.status, result.get('error', ''))
+        return result
+
+
+class Coordinator(object):
+    """
+    Spreads the documents of a corpus over a set of shards, fans search requests out to them and merges the results.
+    """
+
+    SHARD_DEADLINE_FRACTION = 0.8
+
+    def __init__(
+            self,
+            paths: Dict[str, str],
+            shards: Sequence[Shard],
+            shard_timeout_sec: float,
+            balance_slack: float = 0.1):
+        self._paths = dict(paths)
+        self._sizes = {document_id: os.path.getsize(path) for document_id, path in paths.items()}
+        self._shards = list(shards)
+        self._shard_timeout_sec = shard_timeout_sec
+        self._balance_slack = balance_slack
+
+        self._owners = dict()
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=max(4, 4 * len(shards)))
+
+    def status(self) -> Dict[str, Any]:
+        return dict(shards=[dict(
+            address=x.address,
+            healthy=x.healthy,
+            num_documents=len(x.documents),
+            num_bytes=x.num_bytes) for x in self._shards])
+
+    def check_health(self) -> bool:
+        """Probes every shard and returns `True` if the set of healthy shards changed."""
+
+        changed = False
+        for shard in self._shards:
+            try:
+                shard.request('GET', '/health', None, timeout=self._shard_timeout_sec)
+                healthy = True
+            except Exception:
+                healthy = False
+            changed |= healthy != shard.healthy
+            shard.healthy = healthy
+        return changed
+
+    def rebalance(self) -> Dict[str, Any]:
+        """
+        Reassigns documents so that every healthy shard holds roughly the same number of metadata bytes. Documents stay
+        on their current shard unless it is unhealthy or overloaded, so only orphaned and excess documents move.
+        """
+
+        with self._lock:
+            self.check_health()
+            while True:
+                healthy = [x for x in self._shards if x.healthy]
+                if len(healthy) == 0:
+                    raise RequestError(503, "No healthy shards.")
+
+                target_bytes = (1 + self._balance_slack) * sum(self._sizes.values()) / len(healthy)
+                assignment = {x: set() for x in healthy}
+                num_bytes = {x: 0 for x in healthy}
+
+                orphans = list()
+                for document_id in sorted(self._sizes, key=lambda x: -self._sizes[x]):
+                    owner = self._owners.get(document_id)
+                    size = self._sizes[document_id]
+                    if owner in assignment and (num_bytes[owner] + size) <= target_bytes:
+                        assignment[owner].add(document_id)
+                        num_bytes[owner] += size
+                    else:
+                        orphans.append(document_id)
+
+                for document_id in orphans:
+                    owner = min(healthy, key=lambda x: num_bytes[x])
+                    assignment[owner].add(document_id)
+                    num_bytes[owner] += self._sizes[document_id]
+
+                if self._apply(assignment):
+                    break
+
+            for shard in self._shards:
+                if not shard.healthy:
+                    shard.documents = set()
+                    shard.num_bytes = 0
+            for shard in assignment:
+                shard.num_bytes = num_bytes[shard]
+
+        return self.status()
+
+    def _update_documents(self, shard: Shard, request: Dict[str, Any]) -> bool:
+        try:
+            shard.request('POST', '/documents', request, timeout=self._shard_timeout_sec)
+        except Exception:
+            shard.healthy = False
+            return False
+        return True
+
+    def _apply(self, assignment: Dict[Shard, Set[str]]) -> bool:
+        # Documents are loaded on their new shard before searches are routed to it and unloaded from their old shard
+        # only afterwards, so searches that run during a rebalance still find every document.
+        for shard, documents in assignment.items():
+            load = documents - shard.documents
+            if len(load) > 0:
+                if not self._update_documents(shard, dict(load={x: self._paths[x] for x in load})):
+                    return False
+                shard.documents |= load
+
+        self._owners = {document_id: shard for shard, documents in assignment.items() for document_id in documents}
+
+        for shard, documents in assignment.items():
+            unload = shard.documents - documents
+            if len(unload) > 0:
+                if not self._update_documents(shard, dict(unload=sorted(unload))):
+                    return False
+                shard.documents -= unload
+        return True
+
+    def search(self, request: Dict[str, Any]) -> Dict[str, Any]:
+        start = time.monotonic()
+
+        queries = request['queries'] if 'queries' in request else [request]
+        if not isinstance(queries, list) or len(queries) == 0:
+            raise RequestError(400, "`queries` should be a non-empty list.")
+        for query in queries:
+            if not isinstance(query, dict):
+                raise RequestError(400, "Each query should be a JSON object.")
+            phrases = query.get('phrases')
+            if not isinstance(phrases, list) or len(phrases) == 0 or not all(isinstance(x, str) for x in phrases):
+                raise RequestError(400, "`phrases` should be a non-empty list of strings.")
+            document_ids = query.get('documents', [])
+            if not isinstance(document_ids, list) or not all(isinstance(x, str) for x in document_ids):
+                raise RequestError(400, "`documents` should be a list of strings.")
+            for document_id in document_ids:
+                if document_id not in self._sizes:
+                    raise RequestError(404, "Unknown document `%s`." % document_id)
+            top_k = query.get('top_k')
+            if top_k is not None and (not isinstance(top_k, int) or isinstance(top_k, bool) or top_k < 1):
+                raise RequestError(400, "`top_k` should be a positive integer.")
+
+        timeout_sec = self._shard_timeout_sec
+        deadline_ms = request.get('deadline_ms')
+        if deadline_ms is not None:
+            if not isinstance(deadline_ms, (int, float)) or isinstance(deadline_ms, bool) or not deadline_ms >= 0:
+                raise RequestError(400, "`deadline_ms` should be a non-negative number.")
+            timeout_sec = min(timeout_sec, deadline_ms / 1000)
+
+        # A rebalance replaces the ownership map as a whole, so the request is routed with a consistent snapshot.
+        owners = self._owners
+
+        # Every shard receives one batched request holding its slice of each query.
+        shard_queries = dict()
+        for i, query in enumerate(queries):
+            for document_id in query.get('documents', self._sizes.keys()):
+                shard = owners.get(document_id)
+                if shard is None:
+                    continue
+                shard_query = shard_queries.setdefault(shard, dict()).setdefault(i, dict(query, documents=list()))
+                shard_query['documents'].append(document_id)
+
+        # Shards stop early enough for their partial results to arrive before the coordinator gives up on them.
+        shard_deadline_ms = self.SHARD_DEADLINE_FRACTION * timeout_sec * 1000
+        futures = dict()
+        for shard, indexed_queries in shard_queries.items():
+            shard_request = dict(queries=list(indexed_queries.values()), deadline_ms=shard_deadline_ms)
+            future = self._executor.submit(shard.request, 'POST', '/search', shard_request, timeout_sec)
+            futures[future] = (shard, list(indexed_queries.keys()))
+        done, _ = wait(futures, timeout=timeout_sec)
+
+        results = [dict(matches=dict(), complete=True) for _ in queries]
+        failed_shards = list()
+        for future, (shard, query_indices) in futures.items():
+            if future not in done or future.exception() is not None:
+                failed_shards.append(shard.address)
+                for i in query_indices:
+                    results[i]['complete'] = False
+                continue
+
+            for i, shard_result in zip(query_indices, future.result()['results']):
+                results[i]['matches'].update(shard_result['matches'])
+                results[i]['complete'] &= shard_result['complete']
+
+        num_owned = len(owners)
+        for i, query in enumerate(queries):
+            if query.get('top_k') is not None:
+                results[i]['matches'] = prune_top_k(results[i]['matches'], query['top_k'])
+            if num_owned < len(self._sizes):
+                results[i]['complete'] = False
+
+        return dict(results=results, failed_shards=failed_shards, elapsed_ms=(time.monotonic() - start) * 1000)
+
+
+class CoordinatorRequestHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+
+    def _send_json(self, status: int, body: Dict[str, Any]) -> None:
+        payload = json.dumps(body).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def do_GET(self):  # noqa: N802
+        if self.path == '/health':
+            self._send_json(200, dict(status='ok'))
+        elif self.path == '/shards':
+            self._send_json(200, self.server.coordinator.status())
+        else:
+            self._send_json(404, dict(error="Unknown path `%s`." % self.path))
+
+    def do_POST(self):  # noqa: N802
+        length = int(self.headers.get('Content-Length', 0))
+        body = self.rfile.read(length)
+
+        try:
+            if self.path == '/rebalance':
+                self._send_json(200, self.server.coordinator.rebalance())
+            elif self.path == '/search':
+                try:
+                    request = json.loads(body)
+                except ValueError:
+                    raise RequestError(400, "Request body should be a JSON object.")
+                if not isinstance(request, dict):
+                    raise RequestError(400, "Request body should be a JSON object.")
+                self._send_json(200, self.server.coordinator.search(request))
+            else:
+                self._send_json(404, dict(error="Unknown path `%s`." % self.path))
+        except RequestError as e:
+            self._send_json(e.status, dict(error=str(e)))
+
+    def log_message(self, format, *args):
+        if not self.server.quiet:
+            super().log_message(format, *args)
+
+
+class CoordinatorServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address: Tuple[str, int], coordinator: Coordinator, quiet: bool = False):
+        super().__init__(address, CoordinatorRequestHandler)
+        self.coordinator = coordinator
+        self.quiet = quiet
+
+
+class HealthMonitor(threading.Thread):
+    def __init__(self, coordinator: Coordinator, interval_sec: float):
+        self._coordinator = coordinator
+        self._interval_sec = interval_sec
+        self._stop_event = threading.Event()
+        super().__init__(daemon=True)
+
+    def run(self):
+        while not self._stop_event.wait(self._interval_sec):
+            if self._coordinator.check_health():
+                try:
+                    self._coordinator.rebalance()
+                except RequestError as e:
+                    print(e)
+
+    def stop(self):
+        self._stop_event.set()
+
+
+def spawn_local_workers(args: argparse.Namespace) -> List[subprocess.Popen]:
+    server_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'octopus_server_demo.py')
+    workers = list()
+    for i in range(args.num_local_workers):
+        command = [
+            sys.executable,
+            server_path,
+            '--access_key', args.access_key,
+            '--port', str(args.base_port + i),
+            '--num_engines', str(args.num_engines),
+            '--quiet']
+        if args.library_path is not None:
+            command += ['--library_path', args.library_path]
+        if args.model_path is not None:
+            command += ['--model_path', args.model_path]
+        workers.append(subprocess.Popen(command))
+    return workers
+
+
+def main():
+    parser = argparse.ArgumentParser()
+
+    parser.add_argument(
+        '--corpus_path',
+        help='Absolute path to a directory of metadata files (`.oif`) reachable by every worker',
+        required=True)
+
+    parser.add_argument('--workers', nargs='+', default=list(), help='Worker addresses as `HOST:PORT`')
+
+    parser.add_argument('--host', default='127.0.0.1', help='Address to listen on')
+
+    parser.add_argument('--port', type=int, default=8000, help='Port to listen on')
+
+    parser.add_argument('--shard_timeout_ms', type=float, default=1000., help='Time to wait for each shard')
+
+    parser.add_argument('--health_interval_sec', type=float, default=2., help='Interval between shard health checks')
+
+    parser.add_argument('--quiet', action='store_true', help='Do not log requests')
+
+    local_group = parser.add_argument_group('local workers', 'Spawn `octopus_server_demo` workers on this machine')
+
+    local_group.add_argument('--num_local_workers', type=int, default=0, help='Number of workers to spawn')
+
+    local_group.add_argument('--base_port', type=int, default=8100, help='Port of the first spawned worker')
+
+    local_group.add_argument('--num_engines', type=int, default=1, help='Octopus instances per spawned worker')
+
+    local_group.add_argument(
+        '--access_key',
+        help='AccessKey provided by Picovoice Console (https://console.picovoice.ai/)')
+
+    local_group.add_argument('--library_path', help='Absolute path to dynamic library')
+
+    local_group.add_argument('--model_path', help='Absolute path to the file containing model parameters')
+
+    args = parser.parse_args()
+
+    if args.num_local_workers > 0 and args.access_key is None:
+        parser.error("`--access_key` is required to spawn local workers")
+
+    try:
+        paths = pvoctopus.find_metadata_files(args.corpus_path)
+    except pvoctopus.OctopusError as e:
+        print(e)
+        sys.exit(1)
+    paths = {document_id: os.path.abspath(path) for document_id, path in paths.items()}
+
+    local_workers = spawn_local_workers(args)
+    addresses = list(args.workers) + ['127.0.0.1:%d' % (args.base_port + i) for i in range(args.num_local_workers)]
+    shards = [Shard(x.rsplit(':', 1)[0], int(x.rsplit(':', 1)[1])) for x in addresses]
+
+    coordinator = Coordinator(paths, shards, shard_timeout_sec=args.shard_timeout_ms / 1000)
+    monitor = HealthMonitor(coordinator, args.health_interval_sec)
+    server = CoordinatorServer((args.host, args.port), coordinator, quiet=args.quiet)
+
+    try:
+        while True:
+            try:
+                coordinator.rebalance()
+                break
+            except RequestError:
+                print("Waiting for workers ...")
+                time.sleep(1)
+
+        for shard in coordinator.status()['shards']:
+            print("%s: %s, %d documents (%d bytes)" % (
+                shard['address'],
+                'healthy' if shard['healthy'] else 'unreachable',
+                shard['num_documents'],
+                shard['num_bytes']))
+        print("Coordinating %d documents on http://%s:%d" % (len(paths), args.host, args.port))
+
+        monitor.start()
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print('Stopping ...')
+    finally:
+        monitor.stop()
+        server.server_close()
+        for worker in local_workers:
+            worker.terminate()
+            worker.wait()
+
+
+if __name__ == '__main__':
+    main()
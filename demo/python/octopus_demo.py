@@ -20,8 +20,9 @@ from tabulate import tabulate
 
 
 class LoadingAnimation(threading.Thread):
-    def __init__(self, sleep_time_sec=0.1):
+    def __init__(self, sleep_time_sec=0.1, stream=sys.stdout):
         self._sleep_time_sec = sleep_time_sec
+        self._stream = stream
         self._frames = [
             ".  ",
             ".. ",
@@ -39,7 +40,7 @@ class LoadingAnimation(threading.Thread):
             for frame in self._frames:
                 if self._done:
                     break
-                sys.stdout.write('\r' + frame)
+                self._stream.write('\r' + frame)
                 time.sleep(self._sleep_time_sec)
 
     def stop(self):
@@ -64,45 +65,78 @@ def main():
         '--search_phrase',
         help='Phrase to search in the provided audio paths')
 
+    parser.add_argument(
+        '--memory_budget_mb',
+        type=float,
+        help='Keep at most this much metadata in memory and spill the rest to a temporary file')
+
+    parser.add_argument(
+        '--output_format',
+        choices=('table',) + pvoctopus.RESULT_FORMATS,
+        default='table',
+        help='Print matches as a table, or export them as NDJSON, CSV or columnar binary')
+
+    parser.add_argument('--output_path', help='Path of the file matches are exported to. Defaults to standard output')
+
     args = parser.parse_args()
 
+    # Keep standard output clean when matches are exported to it.
+    status_stream = sys.stderr if args.output_format != 'table' and args.output_path is None else sys.stdout
+
     try:
         octopus = pvoctopus.create(
             access_key=args.access_key,
             library_path=args.library_path,
             model_path=args.model_path)
-        print("Octopus version: %s" % octopus.version)
+        print("Octopus version: %s" % octopus.version, file=status_stream)
     except pvoctopus.OctopusError as e:
-        print(e)
+        print(e, file=status_stream)
         sys.exit(1)
 
-    indexing_animation = LoadingAnimation()
+    residency_manager = None
+    if args.memory_budget_mb is not None:
+        residency_manager = pvoctopus.OctopusResidencyManager(budget_bytes=int(args.memory_budget_mb * 1024 * 1024))
+
+    indexing_animation = LoadingAnimation(stream=status_stream)
     metadata_list = list()
     indexing_animation.start()
     for audio_file in args.audio_paths:
         try:
-            print("\rindexing '%s'" % os.path.basename(audio_file))
-            metadata_list.append(octopus.index_audio_file(os.path.abspath(audio_file)))
+            print("\rindexing '%s'" % os.path.basename(audio_file), file=status_stream)
+            metadata = octopus.index_audio_file(os.path.abspath(audio_file))
+            if residency_manager is not None:
+                metadata = residency_manager.add(metadata)
+            metadata_list.append(metadata)
         except pvoctopus.OctopusError as e:
-            print("Failed to process '%s' with '%s'" % (os.path.basename(audio_file), e))
+            print("Failed to process '%s' with '%s'" % (os.path.basename(audio_file), e), file=status_stream)
             octopus.delete()
             sys.exit(1)
         finally:
             indexing_animation.stop()
 
+    result_writer = None
+    output_file = None
+    if args.output_format != 'table':
+        output_file = open(args.output_path, 'wb') if args.output_path is not None else sys.stdout.buffer
+        result_writer = pvoctopus.create_result_writer(output_file, args.output_format)
+
     try:
         search_phrase = args.search_phrase
         while True:
             if args.search_phrase is None:
-                search_phrase = input("\rEnter search phrase (Ctrl+c to exit): ")
+                status_stream.write("\rEnter search phrase (Ctrl+c to exit): ")
+                status_stream.flush()
+                search_phrase = input()
             search_phrase = search_phrase.strip()
             for i, metadata in enumerate(metadata_list):
                 try:
                     matches = octopus.search(metadata, [str(search_phrase)])
                 except pvoctopus.OctopusError as e:
-                    print(e)
+                    print(e, file=status_stream)
                     continue
-                if len(matches) != 0:
+                if result_writer is not None:
+                    result_writer.write(args.audio_paths[i], matches)
+                elif len(matches) != 0:
                     print("Matches in '%s':" % (os.path.basename(args.audio_paths[i])))
                     results = matches[str(search_phrase)]
                     result_table = list()
@@ -111,14 +145,23 @@ def main():
                     print(tabulate(result_table, headers=['Start time (s)', 'End time (s)', 'Probability']))
                 else:
                     print("Nothing found!")
-            print("\n")
+            if result_writer is not None:
+                result_writer.flush()
+            else:
+                print("\n")
 
             if args.search_phrase is not None:
                 break
 
     except KeyboardInterrupt:
-        print('Stopping ...')
+        print('Stopping ...', file=status_stream)
     finally:
+        if result_writer is not None:
+            result_writer.close()
+        if output_file is not None and args.output_path is not None:
+            output_file.close()
+        if residency_manager is not None:
+            residency_manager.close()
         octopus.delete()
 
 
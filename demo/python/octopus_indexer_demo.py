@@ -0,0 +1,276 @@
+#
+# Copyright 2023 Picovoice Inc.
+#
+# You may not use this file except in compliance with the license. A copy of the license is located in the "LICENSE"
+# file accompanying this source.
+#
+# Unless required by applicable law or agreed to in writing, software distributed under the License is distributed on
+# an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the License for the
+# specific language governing permissions and limitations under the License.
+#
+
+import argparse
+import hashlib
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import *
+
+import pvoctopus
+
+DEFAULT_EXTENSIONS = ('.flac', '.mp3', '.ogg', '.opus', '.wav', '.webm')
+
+MANIFEST_FILE_NAME = 'manifest.jsonl'
+
+
+class Manifest(object):
+    """
+    Append-only record of indexed files. Each line describes one file that has been fully indexed and whose metadata has
+    been written, so a run that is killed loses at most the files that were in flight. Later lines override earlier ones
+    for the same path.
+    """
+
+    def __init__(self, path: str):
+        self._path = path
+        self._records = dict()
+
+        if os.path.exists(path):
+            with open(path, 'r') as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        # A partially written last line from an interrupted run.
+                        continue
+                    self._records[record['path']] = record
+
+        self._compact()
+        self._file = open(path, 'a')
+
+    def _compact(self) -> None:
+        tmp_path = self._path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            for record in self._records.values():
+                f.write(json.dumps(record) + '\n')
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self._path)
+
+    def get(self, path: str) -> Optional[Dict[str, Any]]:
+        return self._records.get(path)
+
+    def add(self, record: Dict[str, Any]) -> None:
+        self._records[record['path']] = record
+        self._file.write(json.dumps(record) + '\n')
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+    def close(self) -> None:
+        self._file.close()
+
+
+def content_hash(path: str, block_size: int = 1 << 20) -> str:
+    sha = hashlib.sha256()
+    with open(path, 'rb') as f:
+        while True:
+            block = f.read(block_size)
+            if len(block) == 0:
+                break
+            sha.update(block)
+    return sha.hexdigest()
+
+
+def write_atomically(path: str, data: bytes) -> None:
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+_octopus = None
+
+
+def _init_worker(access_key: str, library_path: Optional[str], model_path: Optional[str]) -> None:
+    global _octopus
+    _octopus = pvoctopus.create(access_key=access_key, library_path=library_path, model_path=model_path)
+
+
+def _index_file(path: str, metadata_path: str, size: int, mtime_ns: int, sha256: Optional[str]) -> Dict[str, Any]:
+    if sha256 is None:
+        sha256 = content_hash(path)
+    metadata = _octopus.index_audio_file(path)
+    write_atomically(metadata_path, metadata.to_bytes())
+    return dict(
+        path=path,
+        size=size,
+        mtime_ns=mtime_ns,
+        sha256=sha256,
+        version=_octopus.version,
+        metadata_path=metadata_path)
+
+
+def find_audio_files(input_paths: Sequence[str], extensions: Sequence[str]) -> List[Tuple[str, str]]:
+    """Returns `(audio path, path relative to the common root of all inputs)` pairs."""
+
+    input_paths = [os.path.abspath(x) for x in input_paths]
+    root = os.path.commonpath([x if os.path.isdir(x) else os.path.dirname(x) for x in input_paths])
+
+    files = list()
+    for input_path in input_paths:
+        if os.path.isfile(input_path):
+            files.append(input_path)
+            continue
+        for directory, _, file_names in os.walk(input_path):
+            for file_name in sorted(file_names):
+                if os.path.splitext(file_name)[1].lower() in extensions:
+                    files.append(os.path.join(directory, file_name))
+
+    return [(x, os.path.relpath(x, root)) for x in sorted(set(files))]
+
+
+class ProgressReport(object):
+    def __init__(self, num_files: int, num_bytes: int, min_interval_sec: float = 0.5):
+        self._num_files = num_files
+        self._num_bytes = num_bytes
+        self._min_interval_sec = min_interval_sec
+        self._done_files = 0
+        self._done_bytes = 0
+        self._start = time.monotonic()
+        self._last_print = 0.
+
+    def update(self, size: int) -> None:
+        self._done_files += 1
+        self._done_bytes += size
+
+        now = time.monotonic()
+        if (now - self._last_print) < self._min_interval_sec and self._done_files < self._num_files:
+            return
+        self._last_print = now
+
+        elapsed_sec = max(now - self._start, 1e-6)
+        bytes_per_sec = self._done_bytes / elapsed_sec
+        eta_sec = (self._num_bytes - self._done_bytes) / bytes_per_sec if bytes_per_sec > 0 else 0.
+        sys.stderr.write('\r[%d/%d] %.2f files/s %.2f MB/s ETA %s ' % (
+            self._done_files,
+            self._num_files,
+            self._done_files / elapsed_sec,
+            bytes_per_sec / 1e6,
+            time.strftime('%H:%M:%S', time.gmtime(eta_sec))))
+        if self._done_files == self._num_files:
+            sys.stderr.write('\n')
+        sys.stderr.flush()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+
+    parser.add_argument(
+        '--access_key',
+        help='AccessKey provided by Picovoice Console (https://console.picovoice.ai/)',
+        required=True)
+
+    parser.add_argument('--input_paths', nargs='+', help='Audio files or directories to index', required=True)
+
+    parser.add_argument(
+        '--output_path',
+        help='Directory to store metadata files (`.oif`) and the manifest. The directory structure of the inputs is '
+             'mirrored',
+        required=True)
+
+    parser.add_argument('--library_path', help='Absolute path to dynamic library')
+
+    parser.add_argument('--model_path', help='Absolute path to the file containing model parameters')
+
+    parser.add_argument('--num_workers', type=int, default=os.cpu_count(), help='Number of indexing processes')
+
+    parser.add_argument(
+        '--extensions',
+        nargs='+',
+        default=DEFAULT_EXTENSIONS,
+        help='Extensions of audio files to index when walking directories')
+
+    args = parser.parse_args()
+
+    try:
+        octopus = pvoctopus.create(
+            access_key=args.access_key,
+            library_path=args.library_path,
+            model_path=args.model_path)
+        version = octopus.version
+        octopus.delete()
+    except pvoctopus.OctopusError as e:
+        print(e)
+        sys.exit(1)
+
+    os.makedirs(args.output_path, exist_ok=True)
+    manifest = Manifest(os.path.join(args.output_path, MANIFEST_FILE_NAME))
+
+    extensions = set(x.lower() if x.startswith('.') else ('.' + x.lower()) for x in args.extensions)
+    jobs = list()
+    num_unchanged = 0
+    for path, relative_path in find_audio_files(args.input_paths, extensions):
+        stat = os.stat(path)
+        metadata_path = os.path.join(
+            os.path.abspath(args.output_path),
+            relative_path + pvoctopus.METADATA_FILE_EXTENSION)
+
+        record = manifest.get(path)
+        sha256 = None
+        if record is not None and record['version'] == version and os.path.exists(record['metadata_path']):
+            if record['size'] == stat.st_size and record['mtime_ns'] == stat.st_mtime_ns:
+                num_unchanged += 1
+                continue
+            # Touched but possibly identical; only re-index when the content changed.
+            sha256 = content_hash(path)
+            if sha256 == record['sha256']:
+                manifest.add(dict(record, size=stat.st_size, mtime_ns=stat.st_mtime_ns))
+                num_unchanged += 1
+                continue
+
+        jobs.append(dict(
+            path=path,
+            metadata_path=metadata_path,
+            size=stat.st_size,
+            mtime_ns=stat.st_mtime_ns,
+            sha256=sha256))
+
+    sys.stderr.write('%d files up to date, %d to index\n' % (num_unchanged, len(jobs)))
+    if len(jobs) == 0:
+        manifest.close()
+        return
+
+    report = ProgressReport(len(jobs), sum(x['size'] for x in jobs))
+    num_failed = 0
+    interrupted = False
+    executor = ProcessPoolExecutor(
+        max_workers=args.num_workers,
+        initializer=_init_worker,
+        initargs=(args.access_key, args.library_path, args.model_path))
+    try:
+        futures = {executor.submit(_index_file, **job): job for job in jobs}
+        for future in as_completed(futures):
+            job = futures[future]
+            try:
+                manifest.add(future.result())
+            except (pvoctopus.OctopusError, OSError) as e:
+                num_failed += 1
+                sys.stderr.write("\nFailed to index '%s' with '%s'\n" % (job['path'], e))
+            report.update(job['size'])
+    except KeyboardInterrupt:
+        sys.stderr.write('\nStopping ... finished files are recorded and will be skipped on the next run.\n')
+        interrupted = True
+    finally:
+        executor.shutdown(wait=not interrupted, cancel_futures=True)
+        manifest.close()
+
+    if interrupted or num_failed > 0:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,331 @@
+#
+# Copyright 2023 Picovoice Inc.
+#
+# You may not use this file except in compliance with the license. A copy of the license is located in the "LICENSE"
+# file accompanying this source.
+#
+# Unless required by applicable law or agreed to in writing, software distributed under the License is distributed on
+# an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the License for the
+# specific language governing permissions and limitations under the License.
+#
+
+import argparse
+import heapq
+import json
+import os
+import sys
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import *
+
+import pvoctopus
+
+
+class RequestError(Exception):
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+
+
+Matches = Dict[str, Dict[str, List[List[float]]]]
+
+
+def prune_top_k(matches: Matches, top_k: int) -> Matches:
+    """Keeps the `top_k` most probable matches of a `{document: {phrase: [[start, end, probability]]}}` result."""
+
+    flat = ((x[2], document_id, phrase, x) for document_id, y in matches.items() for phrase, z in y.items() for x in z)
+    pruned = dict()
+    for _, document_id, phrase, match in heapq.nlargest(top_k, flat, key=lambda x: x[0]):
+        pruned.setdefault(document_id, dict()).setdefault(phrase, list()).append(match)
+    for document_matches in pruned.values():
+        for phrase_matches in document_matches.values():
+            phrase_matches.sort()
+    return pruned
+
+
+class SearchService(object):
+    """
+    Answers search queries against an in-memory corpus using a pool of warm Octopus instances.
+    """
+
+    def __init__(
+            self,
+            corpus: pvoctopus.OctopusCorpus,
+            pool: pvoctopus.OctopusPool,
+            default_deadline_sec: Optional[float] = None):
+        self._corpus = corpus
+        self._pool = pool
+        self._default_deadline_sec = default_deadline_sec
+
+    @property
+    def corpus(self) -> pvoctopus.OctopusCorpus:
+        return self._corpus
+
+    def search(self, request: Dict[str, Any]) -> Dict[str, Any]:
+        start = time.monotonic()
+
+        queries = request['queries'] if 'queries' in request else [request]
+        if not isinstance(queries, list) or len(queries) == 0:
+            raise RequestError(400, "`queries` should be a non-empty list.")
+
+        for query in queries:
+            if not isinstance(query, dict):
+                raise RequestError(400, "Each query should be a JSON object.")
+            phrases = query.get('phrases')
+            if not isinstance(phrases, list) or len(phrases) == 0 or not all(isinstance(x, str) for x in phrases):
+                raise RequestError(400, "`phrases` should be a non-empty list of strings.")
+            document_ids = query.get('documents', [])
+            if not isinstance(document_ids, list) or not all(isinstance(x, str) for x in document_ids):
+                raise RequestError(400, "`documents` should be a list of strings.")
+            for document_id in document_ids:
+                if document_id not in self._corpus:
+                    raise RequestError(404, "Unknown document `%s`." % document_id)
+            top_k = query.get('top_k')
+            if top_k is not None and (not isinstance(top_k, int) or isinstance(top_k, bool) or top_k < 1):
+                raise RequestError(400, "`top_k` should be a positive integer.")
+
+        deadline_sec = self._default_deadline_sec
+        deadline_ms = request.get('deadline_ms')
+        if deadline_ms is not None:
+            if not isinstance(deadline_ms, (int, float)) or isinstance(deadline_ms, bool) or not deadline_ms >= 0:
+                raise RequestError(400, "`deadline_ms` should be a non-negative number.")
+            deadline_sec = deadline_ms / 1000
+        deadline = None if deadline_sec is None else (start + deadline_sec)
+
+        def remaining_sec() -> Optional[float]:
+            return None if deadline is None else max(0., deadline - time.monotonic())
+
+        try:
+            # The whole batch runs on a single borrowed instance so the pool is visited once per request.
+            with self._pool.acquire(timeout=remaining_sec()) as octopus:
+                results = [self._search_query(octopus, query, deadline) for query in queries]
+        except TimeoutError:
+            raise RequestError(503, "No search engine became available before the deadline.")
+        except pvoctopus.OctopusInvalidArgumentError as e:
+            raise RequestError(400, str(e))
+
+        return dict(results=results, elapsed_ms=(time.monotonic() - start) * 1000)
+
+    def _search_query(
+            self,
+            octopus: pvoctopus.Octopus,
+            query: Dict[str, Any],
+            deadline: Optional[float]) -> Dict[str, Any]:
+        document_ids = query.get('documents', self._corpus.ids)
+        prepared_query = octopus.prepare(query['phrases'])
+
+        matches = dict()
+        complete = True
+        for document_id in document_ids:
+            if deadline is not None and time.monotonic() >= deadline:
+                complete = False
+                break
+
+            metadata = self._corpus.get(document_id)
+            if metadata is None:
+                # Unloaded while the request was in flight.
+                complete = False
+                continue
+
+            document_matches = prepared_query.search(metadata)
+            if len(document_matches) > 0:
+                matches[document_id] = {
+                    phrase: [[x.start_sec, x.end_sec, x.probability] for x in phrase_matches]
+                    for phrase, phrase_matches in document_matches.items()
+                }
+
+        if query.get('top_k') is not None:
+            matches = prune_top_k(matches, query['top_k'])
+
+        return dict(matches=matches, complete=complete)
+
+    def update_documents(self, request: Dict[str, Any]) -> Dict[str, Any]:
+        load = request.get('load', dict())
+        unload = request.get('unload', list())
+        if not isinstance(load, dict) or not all(isinstance(x, str) for x in load.values()) or \
+                not isinstance(unload, list) or not all(isinstance(x, str) for x in unload):
+            raise RequestError(400, "`load` should map document IDs to paths and `unload` should list document IDs.")
+
+        for document_id in unload:
+            self._corpus.remove(document_id)
+        for document_id, path in load.items():
+            try:
+                self._corpus.add(document_id, path)
+            except pvoctopus.OctopusIOError as e:
+                raise RequestError(404, str(e))
+
+        return dict(documents=self._corpus.ids)
+
+
+class SearchRequestHandler(BaseHTTPRequestHandler):
+    # HTTP/1.1 keeps client connections alive between requests. Headers and body are written separately, so Nagle's
+    # algorithm is disabled to avoid stalling each response on the client's delayed ACK.
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+
+    def _send_json(self, status: int, body: Dict[str, Any]) -> None:
+        payload = json.dumps(body).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        if self.close_connection:
+            self.send_header('Connection', 'close')
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def _read_body(self) -> bytes:
+        length = self.headers.get('Content-Length')
+        if length is None:
+            raise RequestError(411, "Request should have a `Content-Length` header.")
+        try:
+            length = int(length)
+        except ValueError:
+            length = -1
+        if length < 0:
+            raise RequestError(400, "`Content-Length` should be a non-negative integer.")
+        return self.rfile.read(length)
+
+    def do_GET(self):  # noqa: N802
+        if self.path == '/health':
+            self._send_json(200, dict(status='ok'))
+        elif self.path == '/documents':
+            self._send_json(200, dict(documents=self.server.service.corpus.ids))
+        else:
+            self._send_json(404, dict(error="Unknown path `%s`." % self.path))
+
+    def do_POST(self):  # noqa: N802
+        try:
+            body = self._read_body()
+        except RequestError as e:
+            # Without a valid length the end of the body is unknown, so the rest of the connection cannot be read.
+            self.close_connection = True
+            self._send_json(e.status, dict(error=str(e)))
+            return
+
+        routes = {
+            '/search': self.server.service.search,
+            '/documents': self.server.service.update_documents,
+        }
+        if self.path not in routes:
+            self._send_json(404, dict(error="Unknown path `%s`." % self.path))
+            return
+
+        try:
+            try:
+                request = json.loads(body)
+            except ValueError:
+                raise RequestError(400, "Request body should be a JSON object.")
+            if not isinstance(request, dict):
+                raise RequestError(400, "Request body should be a JSON object.")
+            self._send_json(200, routes[self.path](request))
+        except RequestError as e:
+            self._send_json(e.status, dict(error=str(e)))
+        except pvoctopus.OctopusError as e:
+            self._send_json(500, dict(error=str(e)))
+
+    def log_message(self, format, *args):
+        if not self.server.quiet:
+            super().log_message(format, *args)
+
+
+class SearchServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address: Tuple[str, int], service: SearchService, quiet: bool = False):
+        super().__init__(address, SearchRequestHandler)
+        self.service = service
+        self.quiet = quiet
+
+
+def main():
+    parser = argparse.ArgumentParser()
+
+    parser.add_argument(
+        '--access_key',
+        help='AccessKey provided by Picovoice Console (https://console.picovoice.ai/)',
+        required=True)
+
+    parser.add_argument(
+        '--corpus_path',
+        help='Absolute path to a directory of metadata files (`.oif`) to serve. If not set the server starts empty and '
+             'documents are loaded through `POST /documents`')
+
+    parser.add_argument('--library_path', help='Absolute path to dynamic library')
+
+    parser.add_argument('--model_path', help='Absolute path to the file containing model parameters')
+
+    parser.add_argument('--host', default='127.0.0.1', help='Address to listen on')
+
+    parser.add_argument('--port', type=int, default=8000, help='Port to listen on')
+
+    parser.add_argument(
+        '--num_engines',
+        type=int,
+        default=os.cpu_count(),
+        help='Number of warm Octopus instances serving concurrent requests')
+
+    parser.add_argument(
+        '--deadline_ms',
+        type=float,
+        help='Default per-request deadline. Requests can override it with a `deadline_ms` field')
+
+    parser.add_argument('--quiet', action='store_true', help='Do not log requests')
+
+    parser.add_argument('--trace_path', help='Record the timing and sizes of every search to this file for replay')
+
+    parser.add_argument('--trace_content', action='store_true', help='Also record search phrases in the trace')
+
+    args = parser.parse_args()
+
+    try:
+        if args.corpus_path is not None:
+            corpus = pvoctopus.OctopusCorpus.from_directory(args.corpus_path)
+        else:
+            corpus = pvoctopus.OctopusCorpus(dict())
+    except pvoctopus.OctopusError as e:
+        print(e)
+        sys.exit(1)
+
+    try:
+        pool = pvoctopus.OctopusPool(
+            access_key=args.access_key,
+            size=args.num_engines,
+            library_path=args.library_path,
+            model_path=args.model_path)
+    except pvoctopus.OctopusError as e:
+        print(e)
+        corpus.close()
+        sys.exit(1)
+
+    trace_recorder = None
+    if args.trace_path is not None:
+        trace_recorder = pvoctopus.OctopusTraceRecorder(args.trace_path, record_content=args.trace_content)
+        pool.set_trace_recorder(trace_recorder)
+
+    service = SearchService(
+        corpus=corpus,
+        pool=pool,
+        default_deadline_sec=None if args.deadline_ms is None else (args.deadline_ms / 1000))
+    server = SearchServer((args.host, args.port), service, quiet=args.quiet)
+
+    print("Serving %d documents (%d bytes) with %d engines on http://%s:%d" % (
+        len(corpus),
+        corpus.num_bytes,
+        pool.size,
+        args.host,
+        args.port))
+
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print('Stopping ...')
+    finally:
+        server.server_close()
+        if trace_recorder is not None:
+            trace_recorder.close()
+        pool.delete()
+        corpus.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,105 @@
+#
+# Copyright 2023 Picovoice Inc.
+#
+# You may not use this file except in compliance with the license. A copy of the license is located in the "LICENSE"
+# file accompanying this source.
+#
+# Unless required by applicable law or agreed to in writing, software distributed under the License is distributed on
+# an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the License for the
+# specific language governing permissions and limitations under the License.
+#
+
+import argparse
+import http.client
+import json
+import threading
+import time
+from typing import *
+
+import pvoctopus
+
+
+class LoadClient(threading.Thread):
+    def __init__(self, host: str, port: int, body: bytes, stop_time: float):
+        self._host = host
+        self._port = port
+        self._body = body
+        self._stop_time = stop_time
+        self.latencies = list()
+        self.num_errors = 0
+        self.num_partial = 0
+        super().__init__()
+
+    def run(self):
+        # A single connection per client exercises the server's keep-alive path.
+        connection = http.client.HTTPConnection(self._host, self._port)
+        try:
+            while time.monotonic() < self._stop_time:
+                start = time.monotonic()
+                try:
+                    connection.request('POST', '/search', body=self._body, headers={'Content-Type': 'application/json'})
+                    response = connection.getresponse()
+                    payload = response.read()
+                except (OSError, http.client.HTTPException):
+                    self.num_errors += 1
+                    connection.close()
+                    connection = http.client.HTTPConnection(self._host, self._port)
+                    continue
+                self.latencies.append(time.monotonic() - start)
+
+                if response.status != 200:
+                    self.num_errors += 1
+                elif not all(x['complete'] for x in json.loads(payload)['results']):
+                    self.num_partial += 1
+        finally:
+            connection.close()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+
+    parser.add_argument('--host', default='127.0.0.1', help='Address of `octopus_server_demo`')
+
+    parser.add_argument('--port', type=int, default=8000, help='Port of `octopus_server_demo`')
+
+    parser.add_argument('--phrases', nargs='+', required=True, help='Phrases searched by every request')
+
+    parser.add_argument('--documents', nargs='+', help='Documents searched by every request. Defaults to all')
+
+    parser.add_argument('--num_clients', type=int, default=8, help='Number of concurrent keep-alive clients')
+
+    parser.add_argument('--duration_sec', type=float, default=10., help='Duration of the load test')
+
+    parser.add_argument('--deadline_ms', type=float, help='Per-request deadline')
+
+    args = parser.parse_args()
+
+    request = dict(phrases=args.phrases)
+    if args.documents is not None:
+        request['documents'] = args.documents
+    if args.deadline_ms is not None:
+        request['deadline_ms'] = args.deadline_ms
+    body = json.dumps(request).encode('utf-8')
+
+    start = time.monotonic()
+    clients = [LoadClient(args.host, args.port, body, start + args.duration_sec) for _ in range(args.num_clients)]
+    for client in clients:
+        client.start()
+    for client in clients:
+        client.join()
+    elapsed_sec = time.monotonic() - start
+
+    latencies = sorted(x for client in clients for x in client.latencies)
+    num_errors = sum(x.num_errors for x in clients)
+    num_partial = sum(x.num_partial for x in clients)
+
+    print("requests: %d (errors: %d, partial: %d)" % (len(latencies), num_errors, num_partial))
+    print("QPS: %.1f" % (len(latencies) / elapsed_sec))
+    for q in (50, 90, 99, 99.9):
+        print("p%s latency: %.2f ms" % (q, pvoctopus.percentile(latencies, q) * 1000))
+    if len(latencies) > 0:
+        print("max latency: %.2f ms" % (latencies[-1] * 1000))
+
+
+if __name__ == '__main__':
+    main()
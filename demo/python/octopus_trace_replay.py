@@ -0,0 +1,154 @@
+#
+# Copyright 2023 Picovoice Inc.
+#
+# You may not use this file except in compliance with the license. A copy of the license is located in the "LICENSE"
+# file accompanying this source.
+#
+# Unless required by applicable law or agreed to in writing, software distributed under the License is distributed on
+# an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the License for the
+# specific language governing permissions and limitations under the License.
+#
+
+import argparse
+import os
+import sys
+import wave
+from array import array
+from typing import *
+
+import pvoctopus
+
+
+def read_wav_file(path: str) -> array:
+    with wave.open(path, 'rb') as f:
+        if f.getsampwidth() != 2:
+            raise ValueError("Audio file should be 16-bit")
+        channels = f.getnchannels()
+        frames = f.readframes(f.getnframes())
+
+    pcm = array('h')
+    pcm.frombytes(frames)
+    if sys.byteorder != 'little':
+        pcm.byteswap()
+    return pcm[::channels]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+
+    parser.add_argument(
+        '--access_key',
+        help='AccessKey provided by Picovoice Console (https://console.picovoice.ai/)',
+        required=True)
+
+    parser.add_argument('--library_path', help='Absolute path to dynamic library')
+
+    parser.add_argument('--model_path', help='Absolute path to the file containing model parameters')
+
+    parser.add_argument('--trace_path', help='Trace recorded with `OctopusTraceRecorder`', required=True)
+
+    parser.add_argument('--corpus_path', help='Directory of cached metadata files that searches run against')
+
+    parser.add_argument(
+        '--audio_path',
+        help='16-bit WAV file at the engine sample rate used to replay index operations of audio that was not recorded')
+
+    parser.add_argument(
+        '--phrases',
+        nargs='+',
+        default=['alexa', 'siri', 'google', 'picovoice', 'octopus'],
+        help='Words from which phrases are drawn when the trace does not contain them')
+
+    parser.add_argument(
+        '--num_engines',
+        type=int,
+        default=os.cpu_count(),
+        help='Number of Octopus instances serving the replay')
+
+    parser.add_argument(
+        '--concurrency',
+        type=int,
+        help='Maximum number of operations in flight. Defaults to `--num_engines`')
+
+    parser.add_argument(
+        '--speeds',
+        type=float,
+        nargs='+',
+        default=[1, 2, 4, 8, 16, 32],
+        help='Speed factors to replay the trace at, in increasing order. Stops at the first one that saturates')
+
+    args = parser.parse_args()
+
+    try:
+        events = list(pvoctopus.read_trace(args.trace_path))
+        if args.corpus_path is not None:
+            corpus = pvoctopus.OctopusCorpus.from_directory(args.corpus_path)
+        else:
+            corpus = pvoctopus.OctopusCorpus(dict())
+    except pvoctopus.OctopusError as e:
+        print(e)
+        sys.exit(1)
+
+    audio = read_wav_file(args.audio_path) if args.audio_path is not None else None
+
+    pool = None
+    try:
+        pool = pvoctopus.OctopusPool(
+            access_key=args.access_key,
+            size=args.num_engines,
+            library_path=args.library_path,
+            model_path=args.model_path)
+
+        replayer = pvoctopus.OctopusTraceReplayer(
+            pool=pool,
+            corpus=corpus,
+            events=events,
+            phrases=args.phrases,
+            audio=audio,
+            concurrency=args.concurrency)
+
+        print("%d operations, %d documents, %d engines" % (len(events), len(corpus), pool.size))
+        print("%6s %10s %10s %9s %9s %9s %9s %11s %7s" % (
+            'speed', 'offered/s', 'done/s', 'p50 ms', 'p90 ms', 'p99 ms', 'max ms', 'service p50', 'errors'))
+
+        stats = replayer.find_saturation(args.speeds)
+        for x in stats:
+            print("%5gx %10.1f %10.1f %9.2f %9.2f %9.2f %9.2f %11.2f %7d%s" % (
+                x.speed,
+                x.offered_per_sec,
+                x.completed_per_sec,
+                x.latency_p50_sec * 1000,
+                x.latency_p90_sec * 1000,
+                x.latency_p99_sec * 1000,
+                x.latency_max_sec * 1000,
+                x.service_p50_sec * 1000,
+                x.num_errors,
+                ' saturated' if x.is_saturated else ''))
+
+        if stats[0].num_skipped > 0:
+            print("%d index operations skipped: replaying them needs `--audio_path`, or for audio files a trace "
+                  "recorded with content" % stats[0].num_skipped)
+
+        unsaturated = [x for x in stats if not x.is_saturated]
+        if stats[-1].num_errors == stats[-1].num_operations:
+            print("Every operation failed at %gx" % stats[-1].speed)
+        elif len(unsaturated) == len(stats):
+            print("Not saturated up to %gx (%.1f operations/sec)" % (stats[-1].speed, stats[-1].offered_per_sec))
+        elif len(unsaturated) > 0:
+            print("Saturated between %gx and %gx: capacity is about %.1f operations/sec" % (
+                unsaturated[-1].speed,
+                stats[-1].speed,
+                unsaturated[-1].completed_per_sec))
+        else:
+            print("Saturated at %gx; replay at lower speeds or with more engines" % stats[-1].speed)
+    except pvoctopus.OctopusError as e:
+        print(e)
+        sys.exit(1)
+    finally:
+        if pool is not None:
+            pool.delete()
+        corpus.close()
+
+
+if __name__ == '__main__':
+    main()
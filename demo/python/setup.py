@@ -10,13 +10,22 @@ os.mkdir(package_folder)
 
 shutil.copy(os.path.join(os.path.dirname(__file__), '../../LICENSE'), package_folder)
 
-shutil.copy(
-    os.path.join(os.path.dirname(__file__), 'octopus_demo.py'),
-    os.path.join(package_folder, 'octopus_demo.py'))
+INCLUDE_FILES = (
+    'octopus_benchmark.py',
+    'octopus_coordinator_demo.py',
+    'octopus_demo.py',
+    'octopus_indexer_demo.py',
+    'octopus_server_demo.py',
+    'octopus_server_loadtest.py',
+    'octopus_trace_replay.py')
+
+for rel_path in INCLUDE_FILES:
+    shutil.copy(os.path.join(os.path.dirname(__file__), rel_path), os.path.join(package_folder, rel_path))
 
 with open(os.path.join(os.path.dirname(__file__), 'MANIFEST.in'), 'w') as f:
     f.write('include pvoctopusdemo/LICENSE\n')
-    f.write('include pvoctopusdemo/octopus_demo.py\n')
+    for rel_path in INCLUDE_FILES:
+        f.write('include pvoctopusdemo/%s\n' % rel_path)
 
 with open(os.path.join(os.path.dirname(__file__), 'README.md'), 'r') as f:
     long_description = f.read()
@@ -46,7 +55,13 @@ setuptools.setup(
     ],
     entry_points=dict(
         console_scripts=[
+            'octopus_benchmark=pvoctopusdemo.octopus_benchmark:main',
+            'octopus_coordinator_demo=pvoctopusdemo.octopus_coordinator_demo:main',
             'octopus_demo=pvoctopusdemo.octopus_demo:main',
+            'octopus_indexer_demo=pvoctopusdemo.octopus_indexer_demo:main',
+            'octopus_server_demo=pvoctopusdemo.octopus_server_demo:main',
+            'octopus_server_loadtest=pvoctopusdemo.octopus_server_loadtest:main',
+            'octopus_trace_replay=pvoctopusdemo.octopus_trace_replay:main',
         ],
     ),
     python_requires='>=3.9',
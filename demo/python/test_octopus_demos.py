@@ -0,0 +1,356 @@
+#
+# Copyright 2023 Picovoice Inc.
+#
+# You may not use this file except in compliance with the license. A copy of the license is located in the "LICENSE"
+# file accompanying this source.
+#
+# Unless required by applicable law or agreed to in writing, software distributed under the License is distributed on
+# an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the License for the
+# specific language governing permissions and limitations under the License.
+#
+
+import http.client
+import json
+import os
+import re
+import shutil
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import unittest
+from typing import *
+
+import pvoctopus
+
+import octopus_server_demo
+
+SEARCH_PHRASES = ['alexa', 'porcupine']
+
+
+def find_free_port() -> int:
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def request_json(port: int, method: str, path: str, body: Optional[Any] = None) -> Tuple[int, Dict[str, Any]]:
+    connection = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+    try:
+        payload = None if body is None else json.dumps(body).encode('utf-8')
+        connection.request(method, path, body=payload, headers={'Content-Type': 'application/json'})
+        response = connection.getresponse()
+        return response.status, json.loads(response.read())
+    finally:
+        connection.close()
+
+
+class OctopusIndexerTestCase(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls._access_key = sys.argv[1]
+        cls._demo_dir = os.path.dirname(os.path.abspath(__file__))
+        cls._audio_dir = os.path.join(cls._demo_dir, '../../res/audio')
+
+    def setUp(self):
+        self._input_path = tempfile.mkdtemp()
+        self._output_path = tempfile.mkdtemp()
+        os.makedirs(os.path.join(self._input_path, 'nested'))
+        self._audio_paths = [
+            os.path.join(self._input_path, 'en.wav'),
+            os.path.join(self._input_path, 'de.wav'),
+            os.path.join(self._input_path, 'nested', 'es.wav')]
+        for path, file in zip(self._audio_paths, ['multiple_keywords', 'multiple_keywords_de', 'multiple_keywords_es']):
+            shutil.copy(os.path.join(self._audio_dir, file + '.wav'), path)
+
+    def tearDown(self):
+        shutil.rmtree(self._input_path)
+        shutil.rmtree(self._output_path)
+
+    def _run_indexer(self) -> Tuple[int, int]:
+        process = subprocess.run(
+            [
+                sys.executable,
+                os.path.join(self._demo_dir, 'octopus_indexer_demo.py'),
+                '--access_key', self._access_key,
+                '--input_paths', self._input_path,
+                '--output_path', self._output_path,
+                '--num_workers', '2'],
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE)
+        self.assertEqual(process.returncode, 0, process.stderr.decode('utf-8'))
+
+        summary = re.match(r'(\d+) files up to date, (\d+) to index', process.stderr.decode('utf-8'))
+        self.assertIsNotNone(summary)
+        return int(summary.group(1)), int(summary.group(2))
+
+    def _metadata_path(self, audio_path: str) -> str:
+        relative_path = os.path.relpath(audio_path, self._input_path)
+        return os.path.join(self._output_path, relative_path + pvoctopus.METADATA_FILE_EXTENSION)
+
+    def _read_manifest(self) -> List[str]:
+        with open(os.path.join(self._output_path, 'manifest.jsonl'), 'r') as f:
+            return f.read().splitlines()
+
+    def test_skip(self):
+        self.assertEqual(self._run_indexer(), (0, 3))
+        self.assertEqual(len(self._read_manifest()), 3)
+        for path in self._audio_paths:
+            with open(self._metadata_path(path), 'rb') as f:
+                self.assertGreater(pvoctopus.OctopusMetadata.from_bytes(f.read()).size, 0)
+
+        metadata_mtime_ns = os.stat(self._metadata_path(self._audio_paths[0])).st_mtime_ns
+        self.assertEqual(self._run_indexer(), (3, 0))
+        self.assertEqual(os.stat(self._metadata_path(self._audio_paths[0])).st_mtime_ns, metadata_mtime_ns)
+
+        # Touched files are only re-indexed if their content changed.
+        stat = os.stat(self._audio_paths[0])
+        os.utime(self._audio_paths[0], ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+        self.assertEqual(self._run_indexer(), (3, 0))
+
+        shutil.copy(os.path.join(self._audio_dir, 'multiple_keywords_fr.wav'), self._audio_paths[1])
+        stat = os.stat(self._audio_paths[1])
+        os.utime(self._audio_paths[1], ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+        self.assertEqual(self._run_indexer(), (2, 1))
+        self.assertEqual(self._run_indexer(), (3, 0))
+
+    def test_resume(self):
+        self.assertEqual(self._run_indexer(), (0, 3))
+
+        # Simulates a run that was killed after recording one file and while appending the next.
+        lines = self._read_manifest()
+        with open(os.path.join(self._output_path, 'manifest.jsonl'), 'w') as f:
+            f.write(lines[0] + '\n' + lines[1][:len(lines[1]) // 2])
+
+        self.assertEqual(self._run_indexer(), (1, 2))
+        self.assertEqual(len(self._read_manifest()), 3)
+        self.assertEqual(self._run_indexer(), (3, 0))
+
+
+class OctopusServerTestCase(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls._access_key = sys.argv[1]
+
+    def setUp(self):
+        self._corpus = pvoctopus.OctopusCorpus(dict())
+        self._pool = pvoctopus.OctopusPool(access_key=self._access_key, size=1)
+        self._server = None
+
+    def tearDown(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+        self._pool.delete()
+        self._corpus.close()
+
+    def _start(self, service_class: Type[octopus_server_demo.SearchService]) -> http.client.HTTPConnection:
+        self._server = octopus_server_demo.SearchServer(
+            ('127.0.0.1', 0),
+            service_class(self._corpus, self._pool),
+            quiet=True)
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return http.client.HTTPConnection('127.0.0.1', self._server.server_address[1], timeout=30)
+
+    @staticmethod
+    def _post(
+            connection: http.client.HTTPConnection,
+            headers: Dict[str, str],
+            body: bytes) -> Tuple[int, Dict[str, Any], Optional[str]]:
+        connection.putrequest('POST', '/search', skip_accept_encoding=True)
+        for name, value in headers.items():
+            connection.putheader(name, value)
+        connection.endheaders(body)
+        response = connection.getresponse()
+        return response.status, json.loads(response.read()), response.getheader('Connection')
+
+    def test_content_length(self):
+        body = json.dumps(dict(phrases=SEARCH_PHRASES)).encode('utf-8')
+        connection = self._start(octopus_server_demo.SearchService)
+        try:
+            status, response, _ = self._post(connection, {'Content-Length': str(len(body))}, body)
+            self.assertEqual(status, 200)
+            self.assertEqual(response['results'], [dict(matches=dict(), complete=True)])
+
+            for headers, expected_status in [
+                    (dict(), 411),
+                    ({'Content-Length': 'many'}, 400),
+                    ({'Content-Length': '-1'}, 400)]:
+                connection.close()
+                status, response, connection_header = self._post(connection, headers, body)
+                self.assertEqual(status, expected_status)
+                self.assertIn('error', response)
+                self.assertEqual(connection_header, 'close')
+        finally:
+            connection.close()
+
+    def test_engine_error(self):
+        class FailingSearchService(octopus_server_demo.SearchService):
+            def _search_query(self, octopus, query, deadline):
+                raise pvoctopus.OctopusRuntimeError("Search failed.")
+
+        body = json.dumps(dict(phrases=SEARCH_PHRASES)).encode('utf-8')
+        connection = self._start(FailingSearchService)
+        try:
+            # The connection stays usable after an engine error.
+            for _ in range(2):
+                status, response, _ = self._post(connection, {'Content-Length': str(len(body))}, body)
+                self.assertEqual(status, 500)
+                self.assertEqual(response['error'], "Search failed.")
+        finally:
+            connection.close()
+
+
+class OctopusCoordinatorTestCase(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls._access_key = sys.argv[1]
+        cls._demo_dir = os.path.dirname(os.path.abspath(__file__))
+        audio_dir = os.path.join(cls._demo_dir, '../../res/audio')
+
+        cls._corpus_path = tempfile.mkdtemp()
+        cls._expected_matches = dict()
+        octopus = pvoctopus.create(access_key=cls._access_key)
+        try:
+            for file in sorted(os.listdir(audio_dir)):
+                document_id = os.path.splitext(file)[0]
+                metadata = octopus.index_audio_file(os.path.join(audio_dir, file))
+                with open(os.path.join(cls._corpus_path, document_id + pvoctopus.METADATA_FILE_EXTENSION), 'wb') as f:
+                    f.write(metadata.to_bytes())
+
+                matches = octopus.search(metadata, SEARCH_PHRASES)
+                if len(matches) > 0:
+                    cls._expected_matches[document_id] = {
+                        phrase: [[x.start_sec, x.end_sec, x.probability] for x in phrase_matches]
+                        for phrase, phrase_matches in matches.items()
+                    }
+            cls._num_documents = len(os.listdir(audio_dir))
+        finally:
+            octopus.delete()
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls._corpus_path)
+
+    def setUp(self):
+        self._processes = list()
+
+    def tearDown(self):
+        for process in self._processes:
+            if hasattr(signal, 'SIGCONT') and process.poll() is None:
+                os.kill(process.pid, signal.SIGCONT)
+            process.terminate()
+            process.wait()
+
+    def _start(self, script: str, *args: str) -> subprocess.Popen:
+        process = subprocess.Popen(
+            [sys.executable, os.path.join(self._demo_dir, script)] + list(args),
+            stdout=subprocess.DEVNULL)
+        self._processes.append(process)
+        return process
+
+    def _start_cluster(self, health_interval_sec: float) -> Tuple[int, List[subprocess.Popen], List[str]]:
+        worker_ports = [find_free_port() for _ in range(2)]
+        workers = [
+            self._start(
+                'octopus_server_demo.py',
+                '--access_key', self._access_key,
+                '--port', str(x),
+                '--num_engines', '1',
+                '--quiet') for x in worker_ports]
+        worker_addresses = ['127.0.0.1:%d' % x for x in worker_ports]
+
+        port = find_free_port()
+        self._start(
+            'octopus_coordinator_demo.py',
+            '--corpus_path', self._corpus_path,
+            '--workers', *worker_addresses,
+            '--port', str(port),
+            '--shard_timeout_ms', '1000',
+            '--health_interval_sec', str(health_interval_sec),
+            '--quiet')
+
+        self._wait_for_shards(port, lambda shards: all(x['num_documents'] > 0 for x in shards))
+        return port, workers, worker_addresses
+
+    def _wait_for_shards(self, port: int, condition: Callable[[List[Dict[str, Any]]], bool]) -> None:
+        deadline = time.time() + 60
+        while time.time() < deadline:
+            try:
+                _, status = request_json(port, 'GET', '/shards')
+                shards = status['shards']
+                if sum(x['num_documents'] for x in shards) == self._num_documents and condition(shards):
+                    return
+            except OSError:
+                pass
+            time.sleep(0.1)
+        self.fail("Coordinator did not assign the corpus in time.")
+
+    def test_merge(self):
+        port, _, _ = self._start_cluster(health_interval_sec=3600)
+
+        status, response = request_json(port, 'POST', '/search', dict(phrases=SEARCH_PHRASES))
+        self.assertEqual(status, 200)
+        self.assertEqual(response['failed_shards'], [])
+        self.assertTrue(response['results'][0]['complete'])
+        self.assertEqual(response['results'][0]['matches'], self._expected_matches)
+
+        status, response = request_json(port, 'POST', '/search', dict(phrases=SEARCH_PHRASES, top_k=1))
+        self.assertEqual(status, 200)
+        matches = response['results'][0]['matches']
+        top = [x for document_matches in matches.values() for y in document_matches.values() for x in y]
+        self.assertEqual(len(top), 1)
+        self.assertEqual(
+            top[0][2],
+            max(x[2] for y in self._expected_matches.values() for z in y.values() for x in z))
+
+        for body in [
+                dict(phrases=SEARCH_PHRASES, deadline_ms='soon'),
+                dict(phrases=SEARCH_PHRASES, documents='multiple_keywords'),
+                dict(phrases=SEARCH_PHRASES, top_k=0),
+                dict(phrases='alexa')]:
+            status, _ = request_json(port, 'POST', '/search', body)
+            self.assertEqual(status, 400)
+
+    @unittest.skipUnless(hasattr(signal, 'SIGSTOP'), "Requires suspending processes.")
+    def test_shard_timeout(self):
+        port, workers, worker_addresses = self._start_cluster(health_interval_sec=3600)
+
+        os.kill(workers[0].pid, signal.SIGSTOP)
+        start = time.time()
+        status, response = request_json(port, 'POST', '/search', dict(phrases=SEARCH_PHRASES))
+        elapsed_sec = time.time() - start
+        os.kill(workers[0].pid, signal.SIGCONT)
+
+        self.assertEqual(status, 200)
+        self.assertLess(elapsed_sec, 10)
+        self.assertEqual(response['failed_shards'], [worker_addresses[0]])
+        self.assertFalse(response['results'][0]['complete'])
+        for document_id, matches in response['results'][0]['matches'].items():
+            self.assertEqual(matches, self._expected_matches[document_id])
+
+    def test_rebalance(self):
+        port, workers, worker_addresses = self._start_cluster(health_interval_sec=0.2)
+
+        workers[0].terminate()
+        workers[0].wait()
+        self._wait_for_shards(
+            port,
+            lambda shards: [x['num_documents'] > 0 for x in shards] == [False, True] and not shards[0]['healthy'])
+
+        status, response = request_json(port, 'POST', '/search', dict(phrases=SEARCH_PHRASES))
+        self.assertEqual(status, 200)
+        self.assertEqual(response['failed_shards'], [])
+        self.assertTrue(response['results'][0]['complete'])
+        self.assertEqual(response['results'][0]['matches'], self._expected_matches)
+
+
+if __name__ == '__main__':
+    if len(sys.argv) != 2:
+        print("usage: test_octopus_demos.py ${ACCESS_KEY}")
+        exit(1)
+
+    unittest.main(argv=sys.argv[:1])
@@ -9,15 +9,16 @@
 # specific language governing permissions and limitations under the License.
 #
 
+import hashlib
 import os
 import sys
+import tempfile
 import time
 from argparse import ArgumentParser
-from threading import Thread
+from threading import Lock, Thread
 from typing import *
 
 import pvoctopus
-from yt_dlp import YoutubeDL
 
 
 class ProgressAnimation(Thread):
@@ -50,6 +51,9 @@ class ProgressAnimation(Thread):
 
 
 def download(url: str, output_dir: str) -> str:
+    # Imported here so that local media files can be indexed without `yt-dlp` installed.
+    from yt_dlp import YoutubeDL
+
     ydl_opts = {
         'outtmpl': "%(id)s.%(ext)s",
         'format': 'bestaudio',
@@ -64,18 +68,129 @@ def download(url: str, output_dir: str) -> str:
         return os.path.join(output_dir, f"{info['id']}.webm")
 
 
-def main():
-    parser = ArgumentParser()
-    parser.add_argument('--access-key', required=True)
-    parser.add_argument('--url', required=True)
-    parser.add_argument('--phrases', nargs='+', required=True)
-    parser.add_argument('--min-prob', type=float, default=0.25)
-    parser.add_argument('--work-folder', default=os.path.expanduser('~/'))
-    args = parser.parse_args()
+MEDIA_EXTENSIONS = ('.flac', '.m4a', '.mp3', '.ogg', '.opus', '.wav', '.webm')
+
+
+def content_hash(path: str, block_size: int = 1024 * 1024) -> str:
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        while True:
+            block = f.read(block_size)
+            if len(block) == 0:
+                break
+            h.update(block)
+    return h.hexdigest()
+
+
+class BatchIndexer(object):
+    """
+    Fetches and indexes a batch of videos or local media files. Fetching (downloading, or reading local files to hash
+    them) runs on its own workers and feeds a bounded queue, so the next files are fetched while the current ones are
+    indexed. Metadata is cached under the SHA-256 of the media file, so a file is indexed once however it was obtained
+    and the cache can be shared by any number of runs.
+    """
+
+    def __init__(
+            self,
+            access_key: str,
+            work_folder: str,
+            cache_folder: str,
+            num_fetchers: int,
+            num_indexers: int) -> None:
+        self._work_folder = work_folder
+        self._cache_folder = cache_folder
+        self._num_fetchers = num_fetchers
+        self._num_indexers = num_indexers
+        os.makedirs(cache_folder, exist_ok=True)
+
+        self._pool = pvoctopus.OctopusPool(access_key=access_key, size=num_indexers)
+        self._lock = Lock()
+        # Files with the same content are indexed once even when they are fetched at the same time.
+        self._hash_locks = dict()
+        self.num_cache_hits = 0
+        self.stats = list()
+
+    def _fetch(self, source: str) -> Tuple[str, str, str]:
+        if os.path.isfile(source):
+            media_path = source
+        else:
+            media_path = download(url=source, output_dir=self._work_folder)
+        return source, media_path, content_hash(media_path)
+
+    def _index(self, item: Tuple[str, str, str]) -> Tuple[str, pvoctopus.OctopusMetadata]:
+        source, media_path, media_hash = item
+        with self._lock:
+            hash_lock = self._hash_locks.setdefault(media_hash, Lock())
+
+        with hash_lock:
+            try:
+                return source, self._index_once(media_path, media_hash)
+            finally:
+                # Once the metadata is in the cache, later fetches of the same content find it there without the lock.
+                with self._lock:
+                    if self._hash_locks.get(media_hash) is hash_lock:
+                        del self._hash_locks[media_hash]
+
+    def _index_once(self, media_path: str, media_hash: str) -> pvoctopus.OctopusMetadata:
+        metadata_path = os.path.join(self._cache_folder, media_hash + '.oif')
+        if os.path.exists(metadata_path):
+            with self._lock:
+                self.num_cache_hits += 1
+            with open(metadata_path, 'rb') as f:
+                return pvoctopus.OctopusMetadata.from_bytes(f.read())
+
+        with self._pool.acquire() as o:
+            metadata = o.index_audio_file(os.path.abspath(media_path))
+        # Other runs may share the cache, so the file is written under a unique name and renamed into place.
+        fd, tmp_path = tempfile.mkstemp(dir=self._cache_folder, suffix='.tmp')
+        with os.fdopen(fd, 'wb') as f:
+            f.write(metadata.to_bytes())
+        os.replace(tmp_path, metadata_path)
+        return metadata
 
-    webm_path = download(url=args.url, output_dir=args.work_folder)
+    def index(self, sources: Sequence[str]) -> List[Tuple[str, pvoctopus.OctopusMetadata]]:
+        pipeline = (
+            pvoctopus.OctopusPipeline(sources, queue_size=2 * self._num_indexers)
+            .map(self._fetch, name='fetch', workers=self._num_fetchers)
+            .map(self._index, name='index', workers=self._num_indexers))
 
-    o = pvoctopus.create(access_key=args.access_key)
+        results = list()
+        for source, metadata in pipeline.run():
+            print('indexed %s' % source)
+            results.append((source, metadata))
+        self.stats = pipeline.stats()
+        return results
+
+    def search(
+            self,
+            documents: Sequence[Tuple[str, pvoctopus.OctopusMetadata]],
+            phrases: Sequence[str]) -> Iterator[Tuple[str, Dict[str, Sequence[pvoctopus.Octopus.Match]]]]:
+        with self._pool.acquire() as o:
+            prepared_query = o.prepare(phrases)
+            for source, metadata in documents:
+                yield source, prepared_query.search(metadata)
+
+    def delete(self) -> None:
+        self._pool.delete()
+
+
+def list_sources(urls: Sequence[str], url_file: Optional[str], local_folder: Optional[str]) -> List[str]:
+    sources = list(urls)
+    if url_file is not None:
+        with open(url_file, 'r') as f:
+            sources.extend(x.strip() for x in f if len(x.strip()) > 0 and not x.startswith('#'))
+    if local_folder is not None:
+        for root, _, files in os.walk(local_folder):
+            for file in sorted(files):
+                if os.path.splitext(file)[1].lower() in MEDIA_EXTENSIONS:
+                    sources.append(os.path.join(root, file))
+    return sources
+
+
+def search_video(access_key: str, url: str, phrases: Sequence[str], min_prob: float, work_folder: str) -> None:
+    webm_path = download(url=url, output_dir=work_folder)
+
+    o = pvoctopus.create(access_key=access_key)
 
     metadata_path = webm_path.replace('.webm', '.oif')
     if not os.path.exists(metadata_path):
@@ -89,13 +204,75 @@ def main():
     with open(metadata_path, 'rb') as f:
         metadata = pvoctopus.OctopusMetadata.from_bytes(f.read())
 
-    matches = o.search(metadata, phrases=args.phrases)
+    matches = o.search(metadata, phrases=phrases)
     for phrase, phrase_matches in matches.items():
-        phrase_matches = [x for x in phrase_matches if x.probability >= args.min_prob]
+        phrase_matches = [x for x in phrase_matches if x.probability >= min_prob]
         if len(phrase_matches) > 0:
             print('%s >>>' % phrase)
             for phrase_match in phrase_matches:
-                print('[%d%%] %s&t=%d' % (int(phrase_match.probability * 100), args.url, int(phrase_match.start_sec)))
+                print('[%d%%] %s&t=%d' % (int(phrase_match.probability * 100), url, int(phrase_match.start_sec)))
+
+
+def main():
+    parser = ArgumentParser()
+    parser.add_argument('--access-key', required=True)
+    parser.add_argument('--url', nargs='+', default=list(), help='Video URLs or paths to local media files')
+    parser.add_argument('--url-file', help='File with one video URL or local media path per line')
+    parser.add_argument('--local-folder', help='Folder of local media files to index in place of downloads')
+    parser.add_argument('--phrases', nargs='+', required=True)
+    parser.add_argument('--min-prob', type=float, default=0.25)
+    parser.add_argument('--work-folder', default=os.path.expanduser('~/'))
+    parser.add_argument(
+        '--cache-folder',
+        default=os.path.expanduser('~/.octotube'),
+        help='Folder of metadata cached by content hash, shared across runs')
+    parser.add_argument('--num-fetchers', type=int, default=2, help='Number of concurrent downloads or file reads')
+    parser.add_argument('--num-indexers', type=int, default=os.cpu_count(), help='Number of indexing workers')
+    args = parser.parse_args()
+
+    # A single video is searched as before batch mode existed, with its metadata cached in `--work-folder`.
+    if len(args.url) == 1 and args.url_file is None and args.local_folder is None and not os.path.isfile(args.url[0]):
+        search_video(args.access_key, args.url[0], args.phrases, args.min_prob, args.work_folder)
+        return
+
+    sources = list_sources(args.url, args.url_file, args.local_folder)
+    if len(sources) == 0:
+        parser.error('at least one of --url, --url-file or --local-folder is required')
+
+    batch_indexer = BatchIndexer(
+        access_key=args.access_key,
+        work_folder=args.work_folder,
+        cache_folder=args.cache_folder,
+        num_fetchers=args.num_fetchers,
+        num_indexers=min(args.num_indexers, len(sources)))
+    try:
+        start_sec = time.perf_counter()
+        documents = batch_indexer.index(sources)
+        print('indexed %d sources (%d from cache) in %.2f seconds' % (
+            len(documents),
+            batch_indexer.num_cache_hits,
+            time.perf_counter() - start_sec))
+
+        start_sec = time.perf_counter()
+        results = list(batch_indexer.search(documents, args.phrases))
+        print('searched %d sources for %d phrases in %.5f seconds' % (
+            len(documents),
+            len(args.phrases),
+            time.perf_counter() - start_sec))
+    finally:
+        batch_indexer.delete()
+
+    for source, matches in results:
+        for phrase, phrase_matches in matches.items():
+            phrase_matches = [x for x in phrase_matches if x.probability >= args.min_prob]
+            if len(phrase_matches) > 0:
+                print('%s >>>' % phrase)
+                for phrase_match in phrase_matches:
+                    if os.path.isfile(source):
+                        location = '%s @ %.1fs' % (source, phrase_match.start_sec)
+                    else:
+                        location = '%s&t=%d' % (source, int(phrase_match.start_sec))
+                    print('[%d%%] %s' % (int(phrase_match.probability * 100), location))
 
 
 if __name__ == '__main__':
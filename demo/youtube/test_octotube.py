@@ -0,0 +1,103 @@
+#
+# Copyright 2023 Picovoice Inc.
+#
+# You may not use this file except in compliance with the license. A copy of the license is located in the "LICENSE"
+# file accompanying this source.
+#
+# Unless required by applicable law or agreed to in writing, software distributed under the License is distributed on
+# an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the License for the
+# specific language governing permissions and limitations under the License.
+#
+
+import os
+import re
+import shutil
+import subprocess
+import sys
+import tempfile
+import unittest
+
+import octotube
+
+AUDIO_FILES = ['multiple_keywords', 'multiple_keywords_de', 'multiple_keywords_es']
+
+
+class OctotubeBatchTestCase(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls._access_key = sys.argv[1]
+        cls._demo_dir = os.path.dirname(os.path.abspath(__file__))
+        cls._audio_dir = os.path.join(cls._demo_dir, '../../res/audio')
+
+    def setUp(self):
+        self._local_folder = tempfile.mkdtemp()
+        self._cache_folder = tempfile.mkdtemp()
+        for file in AUDIO_FILES:
+            shutil.copy(os.path.join(self._audio_dir, file + '.wav'), self._local_folder)
+        # Same content as another file under a different name, which should be indexed once.
+        os.makedirs(os.path.join(self._local_folder, 'copies'))
+        shutil.copy(
+            os.path.join(self._audio_dir, AUDIO_FILES[0] + '.wav'),
+            os.path.join(self._local_folder, 'copies', 'copy.wav'))
+
+    def tearDown(self):
+        shutil.rmtree(self._local_folder)
+        shutil.rmtree(self._cache_folder)
+
+    def _run_octotube(self) -> str:
+        process = subprocess.run(
+            [
+                sys.executable,
+                os.path.join(self._demo_dir, 'octotube.py'),
+                '--access-key', self._access_key,
+                '--local-folder', self._local_folder,
+                '--cache-folder', self._cache_folder,
+                '--phrases', 'alexa', 'porcupine',
+                '--num-indexers', '2'],
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE)
+        self.assertEqual(process.returncode, 0, process.stderr.decode('utf-8'))
+        return process.stdout.decode('utf-8')
+
+    def _num_indexed(self, output: str) -> tuple:
+        summary = re.search(r'indexed (\d+) sources \((\d+) from cache\)', output)
+        self.assertIsNotNone(summary)
+        return int(summary.group(1)), int(summary.group(2))
+
+    def test_local_folder(self):
+        output = self._run_octotube()
+        self.assertEqual(self._num_indexed(output), (4, 1))
+        self.assertEqual(len([x for x in os.listdir(self._cache_folder) if x.endswith('.oif')]), 3)
+        self.assertIn('alexa >>>', output)
+        self.assertIn('%s @ ' % os.path.join(self._local_folder, AUDIO_FILES[0] + '.wav'), output)
+
+        self.assertEqual(self._num_indexed(self._run_octotube()), (4, 4))
+
+    def test_hash_locks(self):
+        batch_indexer = octotube.BatchIndexer(
+            access_key=self._access_key,
+            work_folder=self._local_folder,
+            cache_folder=self._cache_folder,
+            num_fetchers=2,
+            num_indexers=2)
+        try:
+            sources = octotube.list_sources(list(), None, self._local_folder)
+            documents = batch_indexer.index(sources)
+            self.assertEqual([x for x, _ in documents], sources)
+            self.assertEqual(batch_indexer.num_cache_hits, 1)
+            self.assertEqual(len(batch_indexer._hash_locks), 0)
+
+            results = dict(batch_indexer.search(documents, ['alexa']))
+            self.assertEqual(
+                results[os.path.join(self._local_folder, 'copies', 'copy.wav')],
+                results[os.path.join(self._local_folder, AUDIO_FILES[0] + '.wav')])
+        finally:
+            batch_indexer.delete()
+
+
+if __name__ == '__main__':
+    if len(sys.argv) != 2:
+        print("usage: test_octotube.py ${ACCESS_KEY}")
+        exit(1)
+
+    unittest.main(argv=sys.argv[:1])